@@ -5,18 +5,23 @@ import csv
 import json
 import hashlib
 import logging
+import os
+import tempfile
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass
 from urllib.parse import urljoin, urlparse
 import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 import urllib.robotparser as robotparser
-import requests
-import pdfplumber
+import httpx
 from bs4 import BeautifulSoup
-import shutil
-import subprocess
+import sys
+import urllib.request
+from urllib.error import HTTPError
 
 from playwright.async_api import async_playwright, BrowserContext, Page
 
@@ -24,13 +29,24 @@ from playwright.async_api import async_playwright, BrowserContext, Page
 # CONFIG
 # =============================
 BASE = Path(__file__).resolve().parents[2]
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+from src.utils.frontier import Frontier, ListCursor
+from src.utils.http_cache import HttpCache
+from src.utils.doc_identity import DocIdentity, so_hieu_from_meta
+from src.utils.doc_extract import ExtractTimeout, append_manifest, extract_to_file
+from src.utils.office_convert import OfficeServerPool, native_doc_tool, unoserver_available
+
 OUT_PDF_DIR = BASE / "outputs" / "raw" / "pdf"
 OUT_TXT_DIR = BASE / "outputs" / "raw" / "txt"
 OUT_LOGS   = BASE / "outputs" / "logs"
 OUT_CSV    = BASE / "outputs" / "raw" / "csv" / "all.csv"
-
-for d in [OUT_PDF_DIR, OUT_TXT_DIR, OUT_LOGS, OUT_CSV.parent]:
-    d.mkdir(parents=True, exist_ok=True)
+OUT_STATE  = BASE / "outputs" / "state"
+FRONTIER_DB = OUT_STATE / "frontier.sqlite"
+HTTP_CACHE_DB = OUT_STATE / "http_cache.sqlite"
+DOC_IDENTITY_DB = OUT_STATE / "doc_identity.sqlite"
+SEEDS_JSON   = BASE / "config" / "seeds.json"
+DOMAINS_JSON = BASE / "config" / "allow_domains.json"
 
 DATE_MIN = datetime(2022, 1, 1, tzinfo=timezone.utc)
 LOG_FILE = OUT_LOGS / "crawl.log"
@@ -41,6 +57,8 @@ WAIT_NET      = "networkidle"  # điều kiện chờ Playwright
 WAIT_MS       = 1200           # chờ thêm sau AJAX
 MAX_QH_PAGES  = 200            # upper bound an toàn cho QH mỗi tab/type
 MAX_CP_PAGES  = 500            # upper bound an toàn cho Chinhphu
+DETAIL_WORKERS = 6             # số page Playwright mở sẵn cho trang chi tiết
+PER_HOST_LIMIT = 3             # số trang chi tiết tải đồng thời tối đa trên 1 host
 
 UA = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 15_6_1) "
       "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -51,6 +69,17 @@ NAV_TIMEOUT_MS   = 90_000        # 90s cho điều hướng nặng (QH detail)
 SEL_TIMEOUT_MS   = 45_000        # 45s chờ selector
 RETRY_ATTEMPTS   = 3
 RETRY_BACKOFF_S  = 2.0
+ROBOTS_MAX_AGE_S = 24 * 3600     # robots.txt lưu trong frontier, tải lại sau 1 ngày
+
+# Tải file đính kèm (httpx async, pool kết nối dùng chung)
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # process trích xuất text (CPU-bound)
+EXTRACT_TIMEOUT_S = 300          # quá thời gian này thì bỏ file (worker tự ngắt bằng SIGALRM)
+LO_SERVERS = 1                   # LibreOffice (unoserver) giữ ấm cho .doc, nếu cài unoserver
+EXTRACT_GRACE_S = 30             # chờ thêm phía event loop trước khi coi worker là treo
+DOWNLOAD_CONCURRENCY = 8         # số kết nối tải đồng thời tối đa
+DOWNLOAD_TIMEOUT_S   = 60
+DOWNLOAD_CHUNK       = 1 << 16   # 64 KiB mỗi lần ghi + cập nhật SHA-1
+RETRY_STATUS         = {429, 500, 502, 503, 504}
 
 # domains ồn, chặn để vào trang nhanh hơn
 BLOCKED_RES = [
@@ -58,146 +87,29 @@ BLOCKED_RES = [
     "analytics.google.com", "fonts.googleapis.com", "fonts.gstatic.com",
 ]
 
-# HTTP session với retry
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-def make_http_session() -> requests.Session:
-    s = requests.Session()
-    retries = Retry(
-        total=4, backoff_factor=0.8,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "HEAD"]
-    )
-    s.mount("http://", HTTPAdapter(max_retries=retries))
-    s.mount("https://", HTTPAdapter(max_retries=retries))
-    s.headers.update({"User-Agent": UA})
-    return s
-
-HTTP = make_http_session()
-
 # =============================
 # LOGGER
 # =============================
 logger = logging.getLogger("crawler")
 logger.setLevel(logging.INFO)
 fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s")
-fh = RotatingFileHandler(LOG_FILE, maxBytes=10_000_000, backupCount=3, encoding="utf-8")
-fh.setFormatter(fmt)
 sh = logging.StreamHandler()
 sh.setFormatter(fmt)
 logger.handlers.clear()
-logger.addHandler(fh)
 logger.addHandler(sh)
 
+def setup_outputs():
+    """Tạo thư mục outputs và log file khi bắt đầu chạy (import module không ghi gì ra đĩa)."""
+    for d in [OUT_PDF_DIR, OUT_TXT_DIR, OUT_LOGS, OUT_CSV.parent, OUT_STATE]:
+        d.mkdir(parents=True, exist_ok=True)
+    if not any(isinstance(h, RotatingFileHandler) for h in logger.handlers):
+        fh = RotatingFileHandler(LOG_FILE, maxBytes=10_000_000, backupCount=3, encoding="utf-8")
+        fh.setFormatter(fmt)
+        logger.addHandler(fh)
+
 # =============================
 # HELPERS
 # =============================
-def sha1_bytes(b: bytes) -> str:
-    h = hashlib.sha1(); h.update(b); return h.hexdigest()
-
-def pdf_to_text(pdf_path: Path) -> str:
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        return text.strip()
-    except Exception as e:
-        logger.warning(f"PDF to text failed for {pdf_path.name}: {e}")
-        return ""
-
-def docx_to_text(docx_path: Path) -> str:
-    try:
-        from docx import Document
-        doc = Document(str(docx_path))
-        parts = []
-        for p in doc.paragraphs:
-            if p.text:
-                parts.append(p.text)
-        # bảng (table) – lấy text từng ô (tuỳ file có thể bỏ)
-        for table in doc.tables:
-            for row in table.rows:
-                row_txt = "\t".join(cell.text.strip() for cell in row.cells)
-                if row_txt.strip():
-                    parts.append(row_txt)
-        text = "\n".join(parts)
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        return text.strip()
-    except Exception as e:
-        logger.warning(f"DOCX to text failed for {docx_path.name}: {e}")
-        return ""
-
-def doc_to_text_via_antiword(doc_path: Path) -> Optional[str]:
-    """Dùng antiword nếu có."""
-    if shutil.which("antiword"):
-        try:
-            res = subprocess.run(
-                ["antiword", "-m", "UTF-8.txt", str(doc_path)],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
-            )
-            return res.stdout.decode("utf-8", errors="ignore").strip()
-        except Exception as e:
-            logger.warning(f"antiword failed for {doc_path.name}: {e}")
-    return None
-
-def doc_to_text_via_catdoc(doc_path: Path) -> Optional[str]:
-    """Dùng catdoc nếu có."""
-    if shutil.which("catdoc"):
-        try:
-            res = subprocess.run(
-                ["catdoc", "-w", str(doc_path)],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
-            )
-            return res.stdout.decode("utf-8", errors="ignore").strip()
-        except Exception as e:
-            logger.warning(f"catdoc failed for {doc_path.name}: {e}")
-    return None
-
-def doc_to_text_via_libreoffice(doc_path: Path) -> Optional[str]:
-    """
-    Dự phòng cuối: dùng LibreOffice để convert .doc -> .txt.
-    Tạo file .txt cạnh file gốc rồi đọc vào.
-    """
-    soffice = shutil.which("soffice") or shutil.which("libreoffice")
-    if not soffice:
-        return None
-    try:
-        out_dir = doc_path.parent
-        # convert ra .txt (Text) – trên macOS/LO thường dùng filter "Text"
-        subprocess.run(
-            [soffice, "--headless", "--convert-to", "txt:Text", "--outdir", str(out_dir), str(doc_path)],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
-        )
-        txt_path = doc_path.with_suffix(".txt")
-        if txt_path.exists():
-            return txt_path.read_text(encoding="utf-8", errors="ignore").strip()
-    except Exception as e:
-        logger.warning(f"LibreOffice convert-to txt failed for {doc_path.name}: {e}")
-    return None
-
-def doc_to_text(doc_path: Path) -> str:
-    """
-    Chiến lược: antiword -> catdoc -> (dự phòng) LibreOffice.
-    """
-    for fn in (doc_to_text_via_antiword, doc_to_text_via_catdoc, doc_to_text_via_libreoffice):
-        txt = fn(doc_path)
-        if txt:
-            return txt
-    logger.warning(f"No available tool to extract .doc for {doc_path.name}")
-    return ""
-
-def extract_text_generic(local_path: Path) -> str:
-    suf = local_path.suffix.lower()
-    if suf == ".pdf":
-        return pdf_to_text(local_path)
-    if suf == ".docx":
-        return docx_to_text(local_path)
-    if suf == ".doc":
-        return doc_to_text(local_path)
-    # có thể mở rộng .rtf/.zip... nếu cần
-    return ""
-
 def append_csv(rec: Dict[str, Any], path: Path):
     keys = [
         "source_label", "list_url", "detail_url", "download_url",
@@ -224,14 +136,30 @@ def dedup_order(seq: List[str]) -> List[str]:
             seen.add(x); out.append(x)
     return out
 
-def extract_pdf_links(html: str, base_url: str) -> List[str]:
-    soup = BeautifulSoup(html, "lxml")
-    pdfs = []
-    for a in soup.select("a[href]"):
-        href = a["href"].strip()
-        if re.search(r"\.pdf(\?|$)", href, re.I):
-            pdfs.append(abs_url(base_url, href))
-    return dedup_order(pdfs)
+DATE_PAT = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b")
+
+def listing_date(a, card_selector: str) -> Optional[datetime]:
+    """
+    Ngày mới nhất (dd/mm/yyyy) trong khối card chứa link `a` trên trang danh sách.
+    Leo lên tối đa 4 cấp nhưng dừng trước khi khối chứa link của card khác.
+    """
+    node = a
+    for _ in range(4):
+        parent = node.parent
+        if parent is None or len({x.get("href") for x in parent.select(card_selector)}) > 1:
+            break
+        node = parent
+    dates = []
+    for d, m, y in DATE_PAT.findall(node.get_text(" ", strip=True)):
+        try:
+            dates.append(datetime(int(y), int(m), int(d), tzinfo=timezone.utc))
+        except ValueError:
+            pass
+    return max(dates) if dates else None
+
+def incremental_stop(cards: List[str], too_old: int, known: Set[str]) -> bool:
+    """Chế độ incremental: trang chỉ còn item đã crawl (hoặc cũ hơn DATE_MIN) → dừng phân trang."""
+    return bool(cards or too_old) and all(c in known for c in cards)
 
 def is_pdf_bytes(b: bytes) -> bool:
     # PDF luôn bắt đầu bằng "%PDF-"
@@ -240,80 +168,370 @@ def is_pdf_bytes(b: bytes) -> bool:
 # ====== ROBOTS ======
 ROBOTS_CACHE: Dict[str, robotparser.RobotFileParser] = {}
 
-def robots_allow(url: str) -> bool:
-    """Enforce robots.txt (đang chỉ dùng cho QH vì bạn yêu cầu)."""
+def _fetch_robots_body(robots_url: str) -> str:
+    """Tải robots.txt; quy ước giống RobotFileParser.read(): 401/403 → cấm hết, 4xx khác → cho hết."""
+    try:
+        req = urllib.request.Request(robots_url, headers={"User-Agent": UA})
+        with urllib.request.urlopen(req, timeout=30) as f:
+            return f.read().decode("utf-8", errors="ignore")
+    except HTTPError as err:
+        if err.code in (401, 403):
+            return "User-agent: *\nDisallow: /\n"
+        if 400 <= err.code < 500:
+            return ""
+        raise
+
+def robots_allow(url: str, frontier: Frontier) -> bool:
+    """Enforce robots.txt (đang chỉ dùng cho QH vì bạn yêu cầu); body lưu trong frontier."""
     parsed = urlparse(url)
     base = f"{parsed.scheme}://{parsed.netloc}"
     rp = ROBOTS_CACHE.get(base)
     if rp is None:
         rp = robotparser.RobotFileParser()
         rp.set_url(urljoin(base, "/robots.txt"))
-        try:
-            rp.read()
-        except Exception as e:
-            logger.warning(f"[ROBOTS] fetch failed {base}: {e} -> disallow")
-            ROBOTS_CACHE[base] = rp
-            return False
+        body = frontier.get_robots(base, ROBOTS_MAX_AGE_S)
+        if body is None:
+            try:
+                body = _fetch_robots_body(rp.url)
+            except Exception as e:
+                logger.warning(f"[ROBOTS] fetch failed {base}: {e} -> disallow")
+                ROBOTS_CACHE[base] = rp
+                return False
+            frontier.put_robots(base, body)
+        rp.parse(body.splitlines())
         ROBOTS_CACHE[base] = rp
     try:
         return rp.can_fetch(UA, url)
     except Exception:
         return False
 
-# ====== Missing helpers used by main() ======
-def save_pdf(bytes_data: bytes) -> tuple[str, str]:
-    """Lưu bytes thành .pdf (giữ nguyên hành vi main() hiện tại)."""
-    sha1 = sha1_bytes(bytes_data)
-    p = OUT_PDF_DIR / f"{sha1}.pdf"
-    if not p.exists():
-        p.write_bytes(bytes_data)
-        logger.info(f"Saved PDF: {p}")
-    else:
-        logger.info(f"PDF exists (dedup): {p}")
-    return str(p), sha1
-
 def not_seen(sha1: str, seen: Set[str]) -> bool:
     if sha1 in seen:
         return False
     seen.add(sha1)
     return True
 
-def http_download_to_path(url: str, out_dir: Path, referer: Optional[str] = None, insecure: bool = False) -> Optional[Path]:
-    """Tải bằng requests rồi lưu file, trả về Path. insecure=True => verify=False (dành cho QH gateway)."""
-    out_dir.mkdir(parents=True, exist_ok=True)
-    try:
-        headers = {"User-Agent": UA}
-        if referer:
-            headers["Referer"] = referer
-        r = HTTP.get(url, headers=headers, timeout=60, verify=not insecure)
-        if r.status_code != 200 or not r.content:
-            logger.warning(f"HTTP {r.status_code} on {url}")
-            return None
-        name = Path(urlparse(url).path).name or "download.bin"
-        dest = out_dir / name
-        dest.write_bytes(r.content)
-        return dest
-    except Exception as e:
-        logger.warning(f"requests download failed {url}: {e}")
-        return None
-
 def is_file_url(u: str) -> bool:
     return bool(re.search(r"\.(pdf|docx?|zip)$", u, re.I))
 
-# ============ HTTP download (không dùng Crawl4AI .download) ============
-def http_download(url: str, referer: Optional[str] = None, timeout: int = 60) -> Optional[bytes]:
+# ============ HTTP download (httpx async, stream thẳng vào kho SHA-1) ============
+ALLOWED_INSECURE_HOSTS = {"gatewayduthaoonline.quochoi.vn"}  # chỉ QH gateway
+
+class _RetryableStatus(Exception):
+    pass
+
+class AsyncDownloader:
+    """
+    Hai httpx.AsyncClient dùng chung cho cả lượt crawl (giữ keep-alive):
+    một client verify SSL, một client verify=False chỉ cho ALLOWED_INSECURE_HOSTS.
+    `cache` (nếu có) giữ ETag/Last-Modified để gửi request có điều kiện.
+    """
+
+    def __init__(self, max_connections: int = DOWNLOAD_CONCURRENCY, cache: Optional[HttpCache] = None):
+        self.cache = cache
+        common = dict(
+            headers={"User-Agent": UA},
+            timeout=httpx.Timeout(DOWNLOAD_TIMEOUT_S),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            follow_redirects=True,
+        )
+        self._secure = httpx.AsyncClient(**common)
+        self._insecure = httpx.AsyncClient(verify=False, **common)
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        return self._insecure if urlparse(url).netloc in ALLOWED_INSECURE_HOSTS else self._secure
+
+    async def aclose(self):
+        await self._secure.aclose()
+        await self._insecure.aclose()
+        if self.cache:
+            self.cache.close()
+
+def stored_ext(src_url: str, is_pdf: bool) -> str:
+    if is_pdf or src_url.lower().endswith(".pdf"):
+        return ".pdf"
+    return Path(urlparse(src_url).path).suffix or ".bin"
+
+async def http_download_stream(dl: AsyncDownloader, url: str,
+                               referer: Optional[str] = None) -> Optional[Tuple[Path, str]]:
+    """
+    Stream body ra file tạm trong OUT_PDF_DIR, tính SHA-1 theo từng chunk, rồi rename nguyên tử
+    thành {sha1}{ext}. Trả về (path, sha1); file trùng nội dung thì chỉ xoá file tạm.
+    URL đã có trong cache → gửi If-None-Match/If-Modified-Since, 304 thì trả lại file cũ.
+    """
+    headers = {"Referer": referer} if referer else {}
+    cached = dl.cache.get(url) if dl.cache else None
+    if cached is not None:
+        headers.update(dl.cache.conditional_headers(url))
+    client = dl.client_for(url)
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        tmp_path: Optional[str] = None
+        try:
+            async with client.stream("GET", url, headers=headers) as r:
+                if r.status_code in RETRY_STATUS:
+                    raise _RetryableStatus(f"HTTP {r.status_code}")
+                if r.status_code == 304 and cached is not None:
+                    dl.cache.touch(url)
+                    logger.info(f"HTTP 304 (not modified): {url}")
+                    return Path(cached["local_path"]), cached["sha1"]
+                if r.status_code != 200:
+                    logger.warning(f"HTTP {r.status_code} on {url}")
+                    return None
+                h = hashlib.sha1()
+                head = b""
+                size = 0
+                fd, tmp_path = tempfile.mkstemp(dir=OUT_PDF_DIR, suffix=".part")
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK):
+                        if len(head) < 5:
+                            head += chunk[:5 - len(head)]
+                        h.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+            if size == 0:
+                logger.warning(f"Empty body on {url}")
+                os.unlink(tmp_path)
+                return None
+
+            sha1 = h.hexdigest()
+            dest = OUT_PDF_DIR / f"{sha1}{stored_ext(url, is_pdf_bytes(head))}"
+            if dest.exists():
+                os.unlink(tmp_path)
+                logger.info(f"BIN exists (dedup): {dest}")
+            else:
+                os.replace(tmp_path, dest)
+                logger.info(f"Saved BIN: {dest}")
+            if dl.cache:
+                dl.cache.put(url, r.headers.get("etag"), r.headers.get("last-modified"),
+                              size, sha1, str(dest))
+            return dest, sha1
+        except (httpx.TransportError, _RetryableStatus) as e:
+            logger.warning(f"download failed {url} (attempt {attempt}): {e}")
+        except Exception as e:
+            logger.warning(f"download failed {url}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        await asyncio.sleep(RETRY_BACKOFF_S * attempt)
+    return None
+
+# ============ EXTRACT STAGE (ProcessPoolExecutor, tách khỏi event loop) ============
+class ExtractStage:
+    """
+    Hàng đợi các file đã tải (theo SHA-1) → `workers` consumer đẩy sang ProcessPoolExecutor.
+    Tải file (I/O trên event loop) và trích xuất text (CPU, process riêng) chạy chồng lên nhau;
+    PDF vài trăm trang không còn chặn crawl.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout_s: int = EXTRACT_TIMEOUT_S):
+        self.workers = max(1, workers)
+        self.timeout_s = timeout_s
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._consumers: List[asyncio.Task] = []
+        self._lo_pool: Optional[OfficeServerPool] = None
+        self._jobs: Dict[str, asyncio.Future] = {}     # sha1 đang trích → kết quả chung
+
+    def start(self) -> "ExtractStage":
+        # antiword/catdoc có sẵn thì .doc không đi qua LibreOffice → không dựng unoserver
+        if LO_SERVERS and unoserver_available() and not native_doc_tool():
+            # phải chạy trước khi tạo ProcessPoolExecutor: worker đọc LO_UNO_PORTS từ môi trường
+            self._lo_pool = OfficeServerPool(LO_SERVERS).start()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        return self
+
+    def running(self, sha1: str) -> bool:
+        return sha1 in self._jobs
+
+    async def extract(self, sha1: str, local_path: Path, txt_path: Path) -> int:
+        """
+        Xếp hàng một file; chờ worker ghi xong txt và trả về độ dài text.
+        Cùng sha1 đang được trích (file trùng từ URL/nguồn khác) → chờ chung job đó, không trích lần hai.
+        """
+        fut = self._jobs.get(sha1)
+        if fut is None:
+            fut = self._jobs[sha1] = asyncio.get_running_loop().create_future()
+            fut.add_done_callback(lambda _: self._jobs.pop(sha1, None))
+            await self._queue.put((sha1, local_path, txt_path, fut))
+        return await asyncio.shield(fut)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            sha1, local_path, txt_path, fut = await self._queue.get()
+            t0 = time.perf_counter()
+            try:
+                n = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, extract_to_file,
+                                         str(local_path), str(txt_path), self.timeout_s),
+                    self.timeout_s + EXTRACT_GRACE_S,
+                )
+                dt = time.perf_counter() - t0
+                logger.info(f"[EXTRACT] {sha1[:10]} {Path(local_path).suffix} len={n} in {dt:.1f}s")
+                append_manifest(Path(txt_path).parent, sha1, str(local_path), n, round(dt, 3))
+                if not fut.done():
+                    fut.set_result(n)
+            except (Exception, ExtractTimeout) as e:
+                if isinstance(e, (asyncio.TimeoutError, ExtractTimeout)):
+                    e = TimeoutError(f"extract timeout after {self.timeout_s}s")
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        for t in self._consumers:
+            t.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._lo_pool:
+            self._lo_pool.stop()
+
+# =============================
+# DETAIL WORKER POOL — N page mở sẵn, giới hạn theo host
+# =============================
+class PagePool:
+    """Giữ sẵn `size` page trong cùng context và tái sử dụng chúng cho các detail URL."""
+
+    def __init__(self, ctx: BrowserContext, size: int = DETAIL_WORKERS):
+        self.ctx = ctx
+        self.size = size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._pages: List[Page] = []
+
+    async def start(self) -> "PagePool":
+        for _ in range(self.size):
+            page = await self.ctx.new_page()
+            self._pages.append(page)
+            self._idle.put_nowait(page)
+        return self
+
+    async def _ensure_open(self, page: Page) -> Page:
+        # page bị crash/đóng giữa chừng → thay bằng page mới để pool không bị hụt
+        if not page.is_closed():
+            return page
+        fresh = await self.ctx.new_page()
+        self._pages = [fresh if p is page else p for p in self._pages]
+        return fresh
+
+    @asynccontextmanager
+    async def page(self):
+        """Mượn một page; lỗi trong khối → đóng page đó (có thể đã crash/target closed), pool thay page mới."""
+        page = await self._ensure_open(await self._idle.get())
+        try:
+            yield page
+        except BaseException:
+            try:
+                await page.close()
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                page = await self._ensure_open(page)
+            finally:
+                self._idle.put_nowait(page)
+
+    async def close(self):
+        for page in self._pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._pages.clear()
+
+def _host_matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+class HostLimiter:
+    """Giới hạn số request đồng thời và khoảng cách tối thiểu giữa 2 lần vào cùng một host.
+
+    `rules` = {domain: (concurrency, delay_s)} lấy từ allow_domains.json; host không khớp
+    domain nào dùng mặc định (per_host, delay_s).
+    """
+
+    def __init__(self, per_host: int = PER_HOST_LIMIT, delay_s: float = REQUEST_DELAY,
+                 rules: Optional[Dict[str, Tuple[int, float]]] = None):
+        self.per_host = per_host
+        self.delay_s = delay_s
+        self.rules = rules or {}
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_at: Dict[str, float] = {}
+
+    def rule_for(self, host: str) -> Tuple[int, float]:
+        for domain, rule in self.rules.items():
+            if _host_matches(host, domain):
+                return rule
+        return self.per_host, self.delay_s
+
+    async def _pace(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_at.get(host, 0.0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_at[host] = loop.time() + self.rule_for(host)[1]
+
+    async def pace(self, url: str):
+        """Giữ khoảng cách giữa các lần tải liên tiếp khi đã đang giữ slot của host (phân trang danh sách)."""
+        await self._pace(urlparse(url).netloc)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """
+        Một lượt dùng host. Thứ tự khóa ở mọi nơi: slot của host trước, rồi mới mượn page của PagePool —
+        không giữ page trong lúc chờ slot, nên pool có giới hạn không thể kẹt chéo với limiter.
+        """
+        host = urlparse(url).netloc
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.rule_for(host)[0])
+        async with sem:
+            await self._pace(host)
+            yield
+
+async def page_so_hieu(page: Page) -> Optional[str]:
+    """Số hiệu văn bản từ metadata trang chi tiết đang mở (trường "Số hiệu"/"Ký hiệu" hoặc đầu tiêu đề)."""
     try:
-        headers = {}
-        if referer:
-            headers["Referer"] = referer
-        r = HTTP.get(url, headers=headers, timeout=timeout)
-        if r.status_code == 200 and r.content:
-            return r.content
-        logger.warning(f"HTTP {r.status_code} on {url}")
-        return None
-    except Exception as e:
-        logger.warning(f"requests download failed {url}: {e}")
+        soup = BeautifulSoup(await page.content(), "lxml")
+    except Exception:
         return None
+    heading = soup.find(["h1", "h2"])
+    title = heading.get_text(" ", strip=True) if heading else (soup.title.get_text(strip=True) if soup.title else "")
+    return so_hieu_from_meta(title, soup.get_text(" ", strip=True))
+
+async def fetch_detail(pool: PagePool, limiter: HostLimiter, detail_fn, detail_url: str,
+                       label: str = "DETAIL") -> Optional[Tuple[List[str], Optional[str]]]:
+    """
+    Lấy danh sách file + số hiệu (metadata) của 1 trang chi tiết qua một page trong pool (tôn trọng giới hạn host).
+    `detail_fn` chỉ thử một lần; thử lại (không thấy file / lỗi) ở đây, mỗi lần mượn page mới từ pool —
+    page lỗi đã bị pool đóng và thay, nên lần sau không dùng lại page hỏng.
+    Trả về None nếu mọi lần đều lỗi (khác ([], ...) = trang tải được nhưng không có file).
+    """
+    if is_file_url(detail_url):
+        return [detail_url], None
+    loaded = False
+    so_hieu = None
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            async with limiter.slot(detail_url), pool.page() as page:
+                out = await detail_fn(page, detail_url)
+                so_hieu = await page_so_hieu(page)
+            if out:
+                return out, so_hieu
+            loaded = True
+            logger.warning(f"[{label}] no files found on {detail_url} (attempt {attempt})")
+        except Exception as e:
+            logger.warning(f"[{label}] detail fetch failed {detail_url} (attempt {attempt}): {e}")
+        await asyncio.sleep(RETRY_BACKOFF_S * attempt)
+    return ([], so_hieu) if loaded else None
 
 # =============================
 # QH — gọi trực tiếp loadPagingAjax(...) trong trang
@@ -323,19 +541,32 @@ def _qh_type_from_url(u: str) -> int:
     if "du-thao-nghi-quyet" in u: return 2
     return 3  # pháp lệnh
 
-async def qh_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
+async def qh_list_detail_urls(pool: PagePool, limiter: HostLimiter, list_url: str,
+                              cursor: Optional[ListCursor] = None,
+                              known: Optional[Set[str]] = None) -> List[str]:
+    """
+    `known` != None → chế độ incremental (bỏ item đã crawl, lọc DATE_MIN, dừng sớm).
+    Giữ một slot của host (chung quota với trang chi tiết) rồi một page của pool trong suốt lúc phân trang;
+    mỗi lần gọi AJAX chờ theo delay của host.
+    """
     base = "{uri.scheme}://{uri.netloc}".format(uri=urlparse(list_url))
     t = _qh_type_from_url(list_url)
-    details: List[str] = []
-    page: Page = await ctx.new_page()
-    try:
+    details: List[str] = cursor.known() if cursor else []
+    # Hai tab: nav-profile (TrangThai=0), nav-contact (TrangThai=1)
+    tabs = [("nav-profile", 0), ("nav-contact", 1)]
+    pending = [(c, tt) for c, tt in tabs if not (cursor and cursor.is_done(f"{c}:{tt}"))]
+    if not pending:
+        logger.info(f"[QH] resume: list đã duyệt xong, dùng {len(details)} detail url từ frontier")
+        return dedup_order(details)
+    async with limiter.slot(list_url), pool.page() as page:
         await page.goto(list_url, wait_until=WAIT_NET)
         await page.wait_for_timeout(WAIT_MS)
-        # Hai tab: nav-profile (TrangThai=0), nav-contact (TrangThai=1)
-        tabs = [("nav-profile", 0), ("nav-contact", 1)]
-        for container, trang_thai in tabs:
+        for container, trang_thai in pending:
+            key = f"{container}:{trang_thai}"
+            start = cursor.start(key, 0) if cursor else 0
             empty_hits = 0
-            for p in range(0, MAX_QH_PAGES):
+            p = start
+            for p in range(start, MAX_QH_PAGES):
                 # truyền tham số qua một object duy nhất (đúng chuẩn evaluate)
                 js = """
                   (args) => {
@@ -349,6 +580,7 @@ async def qh_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
                     }
                   }
                 """
+                await limiter.pace(list_url)
                 await page.evaluate(js, {"p": p, "containerId": container, "t": t, "trangThai": trang_thai})
                 await page.wait_for_timeout(WAIT_MS)
 
@@ -360,12 +592,18 @@ async def qh_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
 
                 soup = BeautifulSoup(html, "lxml")
                 cards = []
+                too_old = 0
                 for a in soup.select("a.d-inline-block[href]"):
                     href = a["href"].strip()
                     if href.startswith("/dt/"):
+                        if known is not None:
+                            d = listing_date(a, "a.d-inline-block[href]")
+                            if d and d < DATE_MIN:
+                                too_old += 1
+                                continue
                         cards.append(abs_url(base, href))
                 cards = dedup_order(cards)
-                new_cards = [c for c in cards if c not in details]
+                new_cards = [c for c in cards if c not in details and not (known and c in known)]
                 logger.info(f"[QH] container={container} tt={trang_thai} page={p} cards={len(cards)} new={len(new_cards)}")
 
                 if not new_cards:
@@ -373,15 +611,20 @@ async def qh_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
                 else:
                     details.extend(new_cards)
                     empty_hits = 0
+                if cursor:
+                    cursor.advance(key, p, new_cards)
 
+                if known is not None and incremental_stop(cards, too_old, known):
+                    logger.info(f"[QH] incremental: container={container} page={p} chỉ còn item cũ → dừng")
+                    break
                 if empty_hits >= 2:
                     break
-                await page.wait_for_timeout(int(REQUEST_DELAY * 1000))
-    finally:
-        await page.close()
+            if cursor:
+                cursor.finish(key, p)
     return dedup_order(details)
 
-async def qh_detail_files(ctx: BrowserContext, detail_url: str) -> List[str]:
+async def qh_detail_files(page: Page, detail_url: str) -> List[str]:
+    """Một lượt trên trang chi tiết QH (thử lại ở fetch_detail)."""
     if is_file_url(detail_url):
         return [detail_url]
 
@@ -391,264 +634,388 @@ async def qh_detail_files(ctx: BrowserContext, detail_url: str) -> List[str]:
         "a[href*='uploadFiles']",
     ]
 
-    for attempt in range(1, RETRY_ATTEMPTS + 1):
-        page = await ctx.new_page()
+    def file_links(html: str) -> List[str]:
+        soup = BeautifulSoup(html, "lxml")
+        out = []
+        for a in soup.select("a[href]"):
+            href = a.get("href", "").strip()
+            if re.search(r"\.(pdf|docx?)($|\?)", href, re.I) or "uploadFiles" in href:
+                out.append(abs_url(detail_url, href))
+        return dedup_order(out)
+
+    await page.goto(detail_url, wait_until="domcontentloaded")
+    # đợi container tab chính hiện diện hoặc phần đính kèm
+    try:
+        await page.wait_for_selector("#nav-tabContent, .tab-content", timeout=SEL_TIMEOUT_MS)
+    except Exception:
+        pass
+    # đợi thêm chút để AJAX vẽ danh sách file
+    await page.wait_for_timeout(WAIT_MS)
+    out = file_links(await page.content())
+    if out:
+        return out
+
+    # nếu chưa thấy, thử click dùng selector “Tải file đính kèm”
+    for sel in sel_candidates:
         try:
-            await page.goto(detail_url, wait_until="domcontentloaded")
-            # đợi container tab chính hiện diện hoặc phần đính kèm
-            try:
-                await page.wait_for_selector("#nav-tabContent, .tab-content", timeout=SEL_TIMEOUT_MS)
-            except Exception:
-                pass
-
-            # cố gắng bấm đúng tab có đính kèm (nếu có)
-            try:
-                # nhiều trang có anchor nav-ykien/nav-home/nav-profile, ta không cần bấm nếu đã có link tải
-                pass
-            except Exception:
-                pass
-
-            # đợi thêm chút để AJAX vẽ danh sách file
-            await page.wait_for_timeout(WAIT_MS)
-
-            html = await page.content()
-            soup = BeautifulSoup(html, "lxml")
-            out = []
-            for a in soup.select("a[href]"):
-                href = a.get("href", "").strip()
-                if re.search(r"\.(pdf|docx?)($|\?)", href, re.I) or "uploadFiles" in href:
-                    out.append(abs_url(detail_url, href))
-            out = dedup_order(out)
-            if out:
-                return out
-
-            # nếu chưa thấy, thử click dùng selector “Tải file đính kèm”
-            clicked = False
-            for sel in sel_candidates:
-                try:
-                    el = await page.query_selector(sel)
-                    if el:
-                        await el.click()
-                        clicked = True
-                        break
-                except Exception:
-                    pass
-            if clicked:
+            el = await page.query_selector(sel)
+            if el:
+                await el.click()
                 await page.wait_for_timeout(WAIT_MS)
-                html = await page.content()
-                soup = BeautifulSoup(html, "lxml")
-                out = []
-                for a in soup.select("a[href]"):
-                    href = a.get("href", "").strip()
-                    if re.search(r"\.(pdf|docx?)($|\?)", href, re.I) or "uploadFiles" in href:
-                        out.append(abs_url(detail_url, href))
-                out = dedup_order(out)
-                if out:
-                    return out
-
-            # không thấy file → thử lần sau
-            logger.warning(f"[QH] no files found on {detail_url} (attempt {attempt})")
-        except Exception as e:
-            logger.warning(f"[QH] detail fetch failed {detail_url} (attempt {attempt}): {e}")
-        finally:
-            await page.close()
-        await asyncio.sleep(RETRY_BACKOFF_S * attempt)
-
+                return file_links(await page.content())
+        except Exception:
+            pass
     return []
 
 # =============================
 # CHÍNH PHỦ — duyệt ?page=N và/hoặc click phân trang
 # =============================
-async def cp_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
-    details: List[str] = []
-    page = await ctx.new_page()
-    try:
+async def cp_list_detail_urls(pool: PagePool, limiter: HostLimiter, list_url: str,
+                              cursor: Optional[ListCursor] = None,
+                              known: Optional[Set[str]] = None) -> List[str]:
+    """
+    `known` != None → chế độ incremental (bỏ item đã crawl, lọc DATE_MIN, dừng sớm).
+    Như QH: giữ slot của host rồi page của pool suốt lúc phân trang, mỗi trang chờ theo delay của host.
+    """
+    details: List[str] = cursor.known() if cursor else []
+    key = "pages"
+    if cursor and cursor.is_done(key):
+        logger.info(f"[CP] resume: list đã duyệt xong, dùng {len(details)} detail url từ frontier")
+        return dedup_order(details)
+    start = cursor.start(key, 1) if cursor else 1
+    async with limiter.slot(list_url), pool.page() as page:
         empty_hits = 0
-        for p in range(1, MAX_CP_PAGES + 1):
+        p = start
+        for p in range(start, MAX_CP_PAGES + 1):
             url = f"{list_url}?page={p}"
+            if p > start:
+                await limiter.pace(url)
             await page.goto(url, wait_until=WAIT_NET)
             await page.wait_for_timeout(WAIT_MS)
             html = await page.content()
             soup = BeautifulSoup(html, "lxml")
             links = []
+            too_old = 0
             for a in soup.select("a[href]"):
                 href = a["href"].strip()
                 full = abs_url(list_url, href)
                 # chỉ lấy TRANG CHI TIẾT trên chinhphu.vn, bỏ link file ở datafiles.*
                 if "chinhphu.vn" in urlparse(full).netloc and "/du-thao" in full and not is_file_url(full):
+                    if known is not None:
+                        d = listing_date(a, "a[href*='du-thao']")
+                        if d and d < DATE_MIN:
+                            too_old += 1
+                            continue
                     links.append(full)
             links = dedup_order(links)
-            new_links = [u for u in links if u not in details]
+            new_links = [u for u in links if u not in details and not (known and u in known)]
             logger.info(f"[CP] page={p} cards={len(links)} new={len(new_links)}")
             if not new_links:
                 empty_hits += 1
             else:
                 details.extend(new_links)
                 empty_hits = 0
+            if cursor:
+                cursor.advance(key, p, new_links)
+            if known is not None and incremental_stop(links, too_old, known):
+                logger.info(f"[CP] incremental: page={p} chỉ còn item cũ → dừng")
+                break
             if empty_hits >= 2:
                 break
-            await page.wait_for_timeout(int(REQUEST_DELAY * 1000))
-    finally:
-        await page.close()
+        if cursor:
+            cursor.finish(key, p)
     return dedup_order(details)
 
-async def cp_detail_files(ctx: BrowserContext, detail_url: str) -> List[str]:
+async def cp_detail_files(page: Page, detail_url: str) -> List[str]:
+    """Một lượt trên trang chi tiết CP (thử lại ở fetch_detail)."""
     if is_file_url(detail_url):
         return [detail_url]
-    for attempt in range(1, RETRY_ATTEMPTS + 1):
-        page = await ctx.new_page()
-        try:
-            await page.goto(detail_url, wait_until="domcontentloaded")
-            await page.wait_for_timeout(WAIT_MS)
-            html = await page.content()
-            soup = BeautifulSoup(html, "lxml")
-            out = []
-            for a in soup.select("a[href]"):
-                href = a.get("href", "").strip()
-                if re.search(r"\.(pdf|docx?)($|\?)", href, re.I):
-                    out.append(abs_url(detail_url, href))
-            out = dedup_order(out)
-            if out:
-                return out
-        except Exception as e:
-            logger.warning(f"[CP] detail fetch failed {detail_url} (attempt {attempt}): {e}")
-        finally:
-            await page.close()
-        await asyncio.sleep(RETRY_BACKOFF_S * attempt)
-    return []
+    await page.goto(detail_url, wait_until="domcontentloaded")
+    await page.wait_for_timeout(WAIT_MS)
+    html = await page.content()
+    soup = BeautifulSoup(html, "lxml")
+    out = []
+    for a in soup.select("a[href]"):
+        href = a.get("href", "").strip()
+        if re.search(r"\.(pdf|docx?)($|\?)", href, re.I):
+            out.append(abs_url(detail_url, href))
+    return dedup_order(out)
 
 # =============================
 # MST — lấy “Xem chi tiết” rồi tab “Văn bản gốc/PDF”
 # =============================
-async def mst_list_detail_urls(ctx: BrowserContext, list_url: str) -> List[str]:
+async def mst_list_detail_urls(pool: PagePool, limiter: HostLimiter, list_url: str,
+                               cursor: Optional[ListCursor] = None,
+                               known: Optional[Set[str]] = None) -> List[str]:
     details: List[str] = []
-    page = await ctx.new_page()
-    try:
+    async with limiter.slot(list_url), pool.page() as page:
         await page.goto(list_url, wait_until=WAIT_NET)
         await page.wait_for_timeout(WAIT_MS)
         html = await page.content()
-        soup = BeautifulSoup(html, "lxml")
-        for a in soup.select("a.view-more[href]"):
-            href = a["href"].strip()
-            if href and not href.lower().startswith("javascript"):
-                details.append(urljoin(list_url, href))
-    finally:
-        await page.close()
+    soup = BeautifulSoup(html, "lxml")
+    for a in soup.select("a.view-more[href]"):
+        href = a["href"].strip()
+        if href and not href.lower().startswith("javascript"):
+            details.append(urljoin(list_url, href))
     details = dedup_order(details)
+    if known is not None:
+        details = [u for u in details if u not in known]
     logger.info(f"[MST] collected detail urls: {len(details)}")
     return details
 
-async def mst_detail_files(ctx: BrowserContext, detail_url: str) -> List[str]:
+async def mst_detail_files(page: Page, detail_url: str) -> List[str]:
+    """Một lượt trên trang chi tiết MST (thử lại ở fetch_detail)."""
     if is_file_url(detail_url):
         return [detail_url]
-    for attempt in range(1, RETRY_ATTEMPTS + 1):
-        page = await ctx.new_page()
-        try:
-            await page.goto(detail_url, wait_until="domcontentloaded")
-            await page.wait_for_timeout(WAIT_MS)
-            # click tab Văn bản gốc/PDF nếu có thật (href không phải javascript)
-            try:
-                candidates = await page.locator("a", has_text=re.compile("Văn bản gốc/PDF", re.I)).all()
-                for el in candidates:
-                    href = await el.get_attribute("href")
-                    if href and not href.lower().startswith("javascript"):
-                        await el.click()
-                        await page.wait_for_timeout(WAIT_MS)
-                        break
-            except Exception:
-                pass
+    await page.goto(detail_url, wait_until="domcontentloaded")
+    await page.wait_for_timeout(WAIT_MS)
+    # click tab Văn bản gốc/PDF nếu có thật (href không phải javascript)
+    try:
+        candidates = await page.locator("a", has_text=re.compile("Văn bản gốc/PDF", re.I)).all()
+        for el in candidates:
+            href = await el.get_attribute("href")
+            if href and not href.lower().startswith("javascript"):
+                await el.click()
+                await page.wait_for_timeout(WAIT_MS)
+                break
+    except Exception:
+        pass
 
-            html = await page.content()
-            soup = BeautifulSoup(html, "lxml")
-            links = []
-            for a in soup.select("a.doc-download[href], a[href$='.pdf'], a[href$='.doc'], a[href$='.docx']"):
-                href = a.get("href", "").strip()
-                if href and not href.lower().startswith("javascript"):
-                    links.append(urljoin(detail_url, href))
-            links = dedup_order(links)
-            if links:
-                return links
-        except Exception as e:
-            logger.warning(f"[MST] detail fetch failed {detail_url} (attempt {attempt}): {e}")
-        finally:
-            await page.close()
-        await asyncio.sleep(RETRY_BACKOFF_S * attempt)
-    return []
+    html = await page.content()
+    soup = BeautifulSoup(html, "lxml")
+    links = []
+    for a in soup.select("a.doc-download[href], a[href$='.pdf'], a[href$='.doc'], a[href$='.docx']"):
+        href = a.get("href", "").strip()
+        if href and not href.lower().startswith("javascript"):
+            links.append(urljoin(detail_url, href))
+    return dedup_order(links)
 
 # =============================
-# CORE: DOWNLOAD & SAVE
+# SOURCE REGISTRY
 # =============================
-def save_binary_as_pdfname(bytes_data: bytes, prefer_pdf: bool, src_url: str) -> tuple[str, str]:
-    file_sha1 = sha1_bytes(bytes_data)
-    ext = ".pdf" if prefer_pdf else (".pdf" if src_url.lower().endswith(".pdf") else Path(urlparse(src_url).path).suffix or ".bin")
-    p = OUT_PDF_DIR / f"{file_sha1}{ext}"
-    if not p.exists():
-        p.write_bytes(bytes_data)
-        logger.info(f"Saved BIN: {p}")
-    else:
-        logger.info(f"BIN exists (dedup): {p}")
-    return str(p), file_sha1
-
-def handle_download_and_save(source_label, list_url, detail_url, download_url, seen_sha1: Set[str]):
-    bin_data = http_download(download_url, referer=detail_url)
-    if not bin_data:
+@dataclass
+class Source:
+    label: str
+    list_url: str
+    lister: Callable[[PagePool, HostLimiter, str, Optional[ListCursor], Optional[Set[str]]], Awaitable[List[str]]]
+    detail: Callable[[Page, str], Awaitable[List[str]]]
+    respect_robots: bool = False   # robots.txt hiện chỉ áp cho QH
+
+SOURCES: List[Source] = []
+
+def register_source(label: str, list_url: str, lister, detail, respect_robots: bool = False) -> Source:
+    """Thêm một nguồn (lister + detail) vào registry; engine sẽ tự chạy nó trong main()."""
+    src = Source(label, list_url, lister, detail, respect_robots)
+    SOURCES.append(src)
+    return src
+
+register_source("DU_THAO_QH_LUAT", "https://duthaoonline.quochoi.vn/du-thao/du-thao-luat",
+                qh_list_detail_urls, qh_detail_files, respect_robots=True)
+register_source("DU_THAO_QH_NGHI_QUYET", "https://duthaoonline.quochoi.vn/du-thao/du-thao-nghi-quyet",
+                qh_list_detail_urls, qh_detail_files, respect_robots=True)
+register_source("DU_THAO_QH_PHAP_LENH", "https://duthaoonline.quochoi.vn/du-thao/du-thao-phap-lenh",
+                qh_list_detail_urls, qh_detail_files, respect_robots=True)
+register_source("DU_THAO_CP", "https://chinhphu.vn/du-thao-vbqppl", cp_list_detail_urls, cp_detail_files)
+register_source("MST", "https://mst.gov.vn/van-ban-phap-luat.htm", mst_list_detail_urls, mst_detail_files)
+
+def _strip_www(host: str) -> str:
+    return host[4:] if host.startswith("www.") else host
+
+def load_enabled_sources(seeds_path: Path = SEEDS_JSON) -> List[Source]:
+    """Chỉ chạy các nguồn có host nằm trong seeds.json (không có file → chạy tất cả)."""
+    if not seeds_path.exists():
+        return list(SOURCES)
+    seeds = json.loads(seeds_path.read_text(encoding="utf-8"))
+    seed_hosts = {_strip_www(urlparse(u).netloc) for u in seeds}
+    enabled = [s for s in SOURCES if _strip_www(urlparse(s.list_url).netloc) in seed_hosts]
+    for s in SOURCES:
+        if s not in enabled:
+            logger.info(f"[SOURCES] {s.label} không có trong seeds.json → bỏ qua")
+    return enabled
+
+def load_host_rules(domains_path: Path = DOMAINS_JSON) -> Dict[str, Tuple[int, float]]:
+    """
+    Đọc allow_domains.json dạng {domain: {"concurrency": n, "delay_s": x}}.
+    Dạng cũ (list domain) vẫn hợp lệ → dùng PER_HOST_LIMIT/REQUEST_DELAY mặc định.
+    """
+    if not domains_path.exists():
+        return {}
+    raw = json.loads(domains_path.read_text(encoding="utf-8"))
+    if isinstance(raw, list):
+        raw = {d: {} for d in raw}
+    rules = {}
+    for domain, cfg in raw.items():
+        cfg = cfg or {}
+        rules[_strip_www(domain)] = (
+            int(cfg.get("concurrency", PER_HOST_LIMIT)),
+            float(cfg.get("delay_s", REQUEST_DELAY)),
+        )
+    return rules
+
+def pool_size_for(sources: List[Source], limiter: HostLimiter) -> int:
+    """
+    Đủ page cho mọi host của các nguồn chạy hết quota cùng lúc — host không có luật trong
+    allow_domains.json tính theo PER_HOST_LIMIT mặc định. Lister cũng giữ page trong một slot của host
+    nên không cần cộng thêm.
+    """
+    hosts = {urlparse(s.list_url).netloc for s in sources}
+    return max(DETAIL_WORKERS, sum(limiter.rule_for(h)[0] for h in hosts))
+
+# =============================
+# ENGINE: list → detail → download → extract → CSV
+# =============================
+async def process_download(src: Source, dl: AsyncDownloader, extractor: ExtractStage,
+                           frontier: Frontier, identity: DocIdentity,
+                           detail_url: str, download_url: str, seen: Set[str],
+                           so_hieu: Optional[str] = None) -> bool:
+    """Tải + trích xuất một file đính kèm; trả về False nếu thất bại (để detail không bị đánh dấu xong)."""
+    row = frontier.attachment(download_url)
+    if row and row["status"] == "extracted":
+        return True
+    frontier.add_attachment(download_url, detail_url, src.label)
+
+    saved = await http_download_stream(dl, download_url, referer=detail_url)
+    if not saved:
         logger.warning(f"Failed to download: {download_url}")
-        return
-    prefer_pdf = download_url.lower().endswith(".pdf")
-    file_path, sha1 = save_binary_as_pdfname(bin_data, prefer_pdf, download_url)
-    if sha1 in seen_sha1:
-        return
-    seen_sha1.add(sha1)
-
-    txt = ""
-    if prefer_pdf:
-        txt = pdf_to_text(Path(file_path))
+        frontier.mark_attachment_failed(download_url, "download failed")
+        return False
+    file_path, sha1 = saved
+    frontier.mark_fetched(download_url, sha1, str(file_path))
     txt_path = OUT_TXT_DIR / f"{sha1}.txt"
+    # nhóm văn bản: nội dung + trang chi tiết / URL file + số hiệu từ metadata trang chi tiết →
+    # cùng một văn bản lấy từ nguồn/URL khác (nội dung khác) vẫn về chung một doc_id.
+    doc_id = identity.link(sha1=sha1, so_hieu=so_hieu, urls=[detail_url, download_url])
+    # quyết định trích hay dùng lại thì chỉ theo sha1: file ở cùng URL đổi nội dung (bản dự thảo mới)
+    # phải được trích lại, bản khác cùng số hiệu cũng vậy.
+    prior = identity.done(doc_id, "extract", sha1=sha1)
+    if prior and not Path(prior).exists():
+        prior = None
+    first = not_seen(sha1, seen)
+    if not prior and not first and not extractor.running(sha1) and txt_path.exists():
+        prior = str(txt_path)       # đã trích ở lượt trước (trước khi có doc_identity)
+    if prior:
+        frontier.mark_extracted(download_url, prior, None)
+        return True
+
     try:
-        txt_path.write_text(txt or "", encoding="utf-8")
+        # sha1 đang được task khác trích → chờ chung job đó; chỉ ghi nhận sau khi txt đã ghi xong
+        text_len = await extractor.extract(sha1, Path(file_path), txt_path)
     except Exception as e:
-        logger.warning(f"Write txt failed {txt_path}: {e}")
+        logger.warning(f"Extract failed {file_path.name}: {e}")
+        frontier.mark_attachment_failed(download_url, f"extract: {e}")
+        if first:
+            seen.discard(sha1)
+        return False
+    frontier.mark_extracted(download_url, str(txt_path), text_len)
+    # số hiệu đọc từ đầu văn bản (nếu có) gộp thêm; nội dung khác (dự thảo / sửa đổi cùng số)
+    # vẫn được ghi nhận là đã trích theo sha1 của nó
+    doc_id = identity.link_text_file(str(txt_path))
+    other = identity.done(doc_id, "extract")
+    if other and other != str(txt_path):
+        logger.info(f"[VER] {sha1[:10]} là bản khác của văn bản {doc_id} ({Path(other).name})")
+    identity.mark_done(doc_id, "extract", str(txt_path), sha1=sha1)
+    if not first:
+        return True     # nội dung này đã có dòng CSV (task khác cùng sha1)
 
     rec = {
-        "source_label": source_label,
-        "list_url": list_url,
+        "source_label": src.label,
+        "list_url": src.list_url,
         "detail_url": detail_url,
         "download_url": download_url,
-        "pdf_local": str(file_path),      # có thể là .pdf/.doc/.docx
+        "pdf_local": str(file_path),
         "txt_local": str(txt_path),
         "sha1_pdf": sha1,
-        "pdf_text_len": len(txt or ""),
-        "title": "",
+        "pdf_text_len": text_len,
+        "title": Path(urlparse(download_url).path).name or "download.bin",
         "crawl_time": now_iso(),
     }
     append_csv(rec, OUT_CSV)
+    return True
 
-from urllib.parse import urlparse
-
-ALLOWED_INSECURE_HOSTS = {"gatewayduthaoonline.quochoi.vn"}  # chỉ QH gateway
-
-async def playwright_download(context, url: str, out_dir: Path, timeout_ms: int = 60000) -> Optional[Path]:
-    """Tải file bằng Playwright để tránh lỗi SSL của requests."""
-    out_dir.mkdir(parents=True, exist_ok=True)
-    page = await context.new_page()
+def load_known_detail_urls(frontier: Frontier, csv_path: Path = OUT_CSV) -> Set[str]:
+    """Detail URL đã crawl: cột detail_url trong all.csv + bảng crawled_detail của frontier."""
+    known = frontier.crawled_details()
+    if csv_path.exists():
+        with csv_path.open("r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("detail_url"):
+                    known.add(row["detail_url"])
+    return known
+
+async def run_source(src: Source, pool: PagePool, limiter: HostLimiter, dl: AsyncDownloader, extractor: ExtractStage,
+                     frontier: Frontier, identity: DocIdentity, seen: Set[str], known: Optional[Set[str]] = None):
+    """
+    Chạy trọn một nguồn. Mỗi detail URL đi tiếp xuống download/extract ngay khi có danh sách file,
+    không chờ cả nguồn; `seen` dùng chung giữa các nguồn để dedup theo SHA-1.
+    """
+    logger.info(f":: Crawl list begin [{src.label}] {src.list_url}")
     try:
-        # Quan trọng: expect_download bao quanh hành động gây ra download
-        async with page.expect_download(timeout=timeout_ms):
-            await page.goto(url, wait_until="domcontentloaded")
-        download = await page.wait_for_event("download", timeout=timeout_ms)
-        suggested = download.suggested_filename or "download.bin"
-        dest = out_dir / suggested
-        await download.save_as(str(dest))
-        return dest
+        if src.respect_robots and not robots_allow(src.list_url, frontier):
+            logger.warning(f"[ROBOTS] Disallowed: {src.list_url}")
+            return
+        cursor = ListCursor(frontier, src.label, src.list_url)
+        detail_urls = await src.lister(pool, limiter, src.list_url, cursor, known)
+        frontier.add_details(src.label, src.list_url, detail_urls)
+        done = set(frontier.details(src.label, status="done"))
+        logger.info(f"[{src.label}] detail urls = {len(detail_urls)} (đã xong từ lượt trước: {len(done)})")
+
+        allowed = []
+        for du in detail_urls:
+            if du in done:
+                continue
+            if not src.respect_robots or robots_allow(du, frontier):
+                allowed.append(du)
+            else:
+                logger.warning(f"[ROBOTS] skip detail: {du}")
+
+        async def handle(du: str) -> bool:
+            got = await fetch_detail(pool, limiter, src.detail, du, label=src.label)
+            ok = got is not None
+            files, so_hieu = got or ([], None)
+            for download_url in files:
+                try:
+                    ok = await process_download(src, dl, extractor, frontier, identity,
+                                                du, download_url, seen, so_hieu) and ok
+                except Exception as e:
+                    ok = False
+                    frontier.mark_attachment_failed(download_url, str(e))
+                    logger.warning(f"[{src.label}] process failed {download_url}: {e}")
+            frontier.mark_detail(du, "done" if ok else "failed")
+            if ok:
+                frontier.remember_crawled(du, src.label)
+            return ok
+
+        results = await asyncio.gather(*(handle(du) for du in allowed))
+        failed = results.count(False)
+        if failed:
+            # giữ checkpoint: lượt sau bỏ qua detail đã xong, chỉ chạy lại detail/file lỗi
+            logger.warning(f"[{src.label}] {failed} detail lỗi → giữ frontier để chạy tiếp")
+        else:
+            # chạy trọn nguồn → xoá checkpoint, lượt sau đi lại từ đầu
+            frontier.complete_source(src.label)
+    except Exception as e:
+        logger.exception(f"{src.label} failed: {e}")
     finally:
-        await page.close()
+        logger.info(f":: Crawl list end [{src.label}]")
 
 # =============================
 # MAIN RUNNER
 # =============================
-async def main():
+async def main(incremental: bool = False, extract_workers: int = EXTRACT_WORKERS,
+               extract_timeout_s: int = EXTRACT_TIMEOUT_S):
+    setup_outputs()
     logger.info("=== START RUN ===")
-    seen = set()
+    # checkpoint/resume: con trỏ phân trang, detail URL, file đính kèm, robots.txt
+    frontier = Frontier(FRONTIER_DB)
+    identity = DocIdentity(DOC_IDENTITY_DB)
+    # SHA-1 đã trích xuất trong lượt bị ngắt trước đó (nếu có) → không ghi trùng CSV
+    seen: Set[str] = frontier.extracted_sha1s()
+    sources = load_enabled_sources()
+    rules = load_host_rules()
+    known = load_known_detail_urls(frontier) if incremental else None
+    if known is not None:
+        logger.info(f"[INCREMENTAL] {len(known)} detail url đã biết, DATE_MIN={DATE_MIN.date()}")
+
     browser = await async_playwright().start()
     context = await browser.chromium.launch_persistent_context(
         user_data_dir="/tmp/qh_ctx",
@@ -656,289 +1023,33 @@ async def main():
         ignore_https_errors=True,  # cho phép QH SSL lỗi nhẹ
         args=["--disable-gpu", "--no-sandbox"],
     )
+    limiter = HostLimiter(PER_HOST_LIMIT, REQUEST_DELAY, rules)
+    pool = await PagePool(context, pool_size_for(sources, limiter)).start()
+    dl = AsyncDownloader(DOWNLOAD_CONCURRENCY, cache=HttpCache(HTTP_CACHE_DB))
+    extractor = ExtractStage(extract_workers, extract_timeout_s).start()
 
-    # --- DOMAIN CONFIG ---
-    qh_luat = "https://duthaoonline.quochoi.vn/du-thao/du-thao-luat"
-    qh_nq = "https://duthaoonline.quochoi.vn/du-thao/du-thao-nghi-quyet"
-    qh_pl = "https://duthaoonline.quochoi.vn/du-thao/du-thao-phap-lenh"
-    cp_url = "https://chinhphu.vn/du-thao-vbqppl"
-    mst_url = "https://mst.gov.vn/van-ban-phap-luat.htm"
-
-    # --- QH: LUẬT ---
     try:
-        logger.info(f":: Crawl QH list begin [DU_THAO_QH_LUAT] {qh_luat}")
-        if robots_allow(qh_luat):
-            detail_urls = await qh_list_detail_urls(context, qh_luat)
-            logger.info(f"[DU_THAO_QH_LUAT] detail urls = {len(detail_urls)}")
-
-            for du in detail_urls:
-                if not robots_allow(du):
-                    logger.warning(f"[ROBOTS] skip detail: {du}")
-                    continue
-
-                files = await qh_detail_files(context, du)
-                for download_url in files:
-                    host = urlparse(download_url).netloc
-
-                    saved_path = http_download_to_path(
-                        download_url,
-                        OUT_PDF_DIR,
-                        referer=du,
-                        insecure=(host in ALLOWED_INSECURE_HOSTS),
-                    )
-                    if not saved_path:
-                        logger.warning(f"Failed to download: {download_url}")
-                        continue
-
-                    bin_bytes = Path(saved_path).read_bytes()
-                    is_pdf = is_pdf_bytes(bin_bytes)
-                    prefer_pdf = is_pdf or download_url.lower().endswith(".pdf")
-
-                    file_path, sha1 = save_binary_as_pdfname(bin_bytes, prefer_pdf, download_url)
-                    if not not_seen(sha1, seen):
-                        continue
-
-                    txt = extract_text_generic(Path(file_path))
-                    txt_path = OUT_TXT_DIR / f"{sha1}.txt"
-                    txt_path.write_text(txt or "", encoding="utf-8")
-
-                    rec = {
-                        "source_label": "DU_THAO_QH_LUAT",
-                        "list_url": qh_luat,
-                        "detail_url": du,
-                        "download_url": download_url,
-                        "pdf_local": str(file_path),
-                        "txt_local": str(txt_path),
-                        "sha1_pdf": sha1,
-                        "pdf_text_len": len(txt or ""),
-                        "title": Path(saved_path).name,
-                        "crawl_time": now_iso(),
-                    }
-                    append_csv(rec, OUT_CSV)
-        else:
-            logger.warning(f"[ROBOTS] Disallowed: {qh_luat}")
-    except Exception as e:
-        logger.exception(f"DU_THAO_QH_LUAT failed: {e}")
-    logger.info(":: Crawl QH list end [DU_THAO_QH_LUAT]")
-
-    # --- QH: NGHỊ QUYẾT ---
-    try:
-        logger.info(f":: Crawl QH list begin [DU_THAO_QH_NGHI_QUYET] {qh_nq}")
-        if robots_allow(qh_nq):
-            detail_urls = await qh_list_detail_urls(context, qh_nq)
-            logger.info(f"[DU_THAO_QH_NGHI_QUYET] detail urls = {len(detail_urls)}")
-
-            for du in detail_urls:
-                if not robots_allow(du):
-                    continue
-
-                files = await qh_detail_files(context, du)
-                for download_url in files:
-                    host = urlparse(download_url).netloc
-
-                    saved_path = http_download_to_path(
-                        download_url,
-                        OUT_PDF_DIR,
-                        referer=du,
-                        insecure=(host in ALLOWED_INSECURE_HOSTS),
-                    )
-                    if not saved_path:
-                        logger.warning(f"Failed to download: {download_url}")
-                        continue
-
-                    bin_bytes = Path(saved_path).read_bytes()
-                    is_pdf = is_pdf_bytes(bin_bytes)
-                    prefer_pdf = is_pdf or download_url.lower().endswith(".pdf")
-
-                    file_path, sha1 = save_binary_as_pdfname(bin_bytes, prefer_pdf, download_url)
-                    if not not_seen(sha1, seen):
-                        continue
-
-                    txt = extract_text_generic(Path(file_path))
-                    txt_path = OUT_TXT_DIR / f"{sha1}.txt"
-                    txt_path.write_text(txt or "", encoding="utf-8")
-
-                    rec = {
-                        "source_label": "DU_THAO_QH_NGHI_QUYET",
-                        "list_url": qh_nq,
-                        "detail_url": du,
-                        "download_url": download_url,
-                        "pdf_local": str(file_path),
-                        "txt_local": str(txt_path),
-                        "sha1_pdf": sha1,
-                        "pdf_text_len": len(txt or ""),
-                        "title": Path(saved_path).name,
-                        "crawl_time": now_iso(),
-                    }
-                    append_csv(rec, OUT_CSV)
-        else:
-            logger.warning(f"[ROBOTS] Disallowed: {qh_nq}")
-    except Exception as e:
-        logger.exception(f"DU_THAO_QH_NGHI_QUYET failed: {e}")
-    logger.info(":: Crawl QH list end [DU_THAO_QH_NGHI_QUYET]")
-
-    # --- QH: PHÁP LỆNH ---
-    try:
-        logger.info(f":: Crawl QH list begin [DU_THAO_QH_PHAP_LENH] {qh_pl}")
-        if robots_allow(qh_pl):
-            detail_urls = await qh_list_detail_urls(context, qh_pl)
-            logger.info(f"[DU_THAO_QH_PHAP_LENH] detail urls = {len(detail_urls)}")
-
-            for du in detail_urls:
-                if not robots_allow(du):
-                    continue
-
-                files = await qh_detail_files(context, du)
-                for download_url in files:
-                    host = urlparse(download_url).netloc
-
-                    saved_path = http_download_to_path(
-                        download_url,
-                        OUT_PDF_DIR,
-                        referer=du,
-                        insecure=(host in ALLOWED_INSECURE_HOSTS),
-                    )
-                    if not saved_path:
-                        logger.warning(f"Failed to download: {download_url}")
-                        continue
-
-                    bin_bytes = Path(saved_path).read_bytes()
-                    is_pdf = is_pdf_bytes(bin_bytes)
-                    prefer_pdf = is_pdf or download_url.lower().endswith(".pdf")
-
-                    file_path, sha1 = save_binary_as_pdfname(bin_bytes, prefer_pdf, download_url)
-                    if not not_seen(sha1, seen):
-                        continue
-
-                    txt = extract_text_generic(Path(file_path))
-                    txt_path = OUT_TXT_DIR / f"{sha1}.txt"
-                    txt_path.write_text(txt or "", encoding="utf-8")
-
-                    rec = {
-                        "source_label": "DU_THAO_QH_PHAP_LENH",
-                        "list_url": qh_pl,
-                        "detail_url": du,
-                        "download_url": download_url,
-                        "pdf_local": str(file_path),
-                        "txt_local": str(txt_path),
-                        "sha1_pdf": sha1,
-                        "pdf_text_len": len(txt or ""),
-                        "title": Path(saved_path).name,
-                        "crawl_time": now_iso(),
-                    }
-                    append_csv(rec, OUT_CSV)
-        else:
-            logger.warning(f"[ROBOTS] Disallowed: {qh_pl}")
-    except Exception as e:
-        logger.exception(f"DU_THAO_QH_PHAP_LENH failed: {e}")
-    logger.info(":: Crawl QH list end [DU_THAO_QH_PHAP_LENH]")
-
-    # --- CHÍNH PHỦ ---
-    try:
-        logger.info(f":: Crawl CP list begin [DU_THAO_CP] {cp_url}")
-        detail_urls = await cp_list_detail_urls(context, cp_url)
-        logger.info(f"[DU_THAO_CP] detail urls = {len(detail_urls)}")
-        for du in detail_urls:
-            files = await cp_detail_files(context, du)
-            for download_url in files:
-                host = urlparse(download_url).netloc
-
-                saved_path = http_download_to_path(
-                    download_url,
-                    OUT_PDF_DIR,
-                    referer=du,
-                    insecure=(host in ALLOWED_INSECURE_HOSTS),
-                )
-                if not saved_path:
-                    logger.warning(f"Failed to download: {download_url}")
-                    continue
-
-                bin_bytes = Path(saved_path).read_bytes()
-                is_pdf = is_pdf_bytes(bin_bytes)
-                prefer_pdf = is_pdf or download_url.lower().endswith(".pdf")
-
-                file_path, sha1 = save_binary_as_pdfname(bin_bytes, prefer_pdf, download_url)
-                if not not_seen(sha1, seen):
-                    continue
-
-                txt = extract_text_generic(Path(file_path))
-                txt_path = OUT_TXT_DIR / f"{sha1}.txt"
-                txt_path.write_text(txt or "", encoding="utf-8")
-
-                rec = {
-                    "source_label": "DU_THAO_CP",
-                    "list_url": cp_url,
-                    "detail_url": du,
-                    "download_url": download_url,
-                    "pdf_local": str(file_path),
-                    "txt_local": str(txt_path),
-                    "sha1_pdf": sha1,
-                    "pdf_text_len": len(txt or ""),
-                    "title": Path(saved_path).name,
-                    "crawl_time": now_iso(),
-                }
-                append_csv(rec, OUT_CSV)
-    except Exception as e:
-        logger.exception(f"DU_THAO_CP failed: {e}")
-    logger.info(":: Crawl CP list end [DU_THAO_CP]")
-
-    # --- MST ---
-    try:
-        logger.info(f":: Crawl MST list begin [MST] {mst_url}")
-        detail_urls = await mst_list_detail_urls(context, mst_url)
-        logger.info(f"[MST] detail urls = {len(detail_urls)}")
-        for du in detail_urls:
-            files = await mst_detail_files(context, du)
-            for download_url in files:
-                host = urlparse(download_url).netloc
-
-                saved_path = http_download_to_path(
-                    download_url,
-                    OUT_PDF_DIR,
-                    referer=du,
-                    insecure=(host in ALLOWED_INSECURE_HOSTS),
-                )
-                if not saved_path:
-                    logger.warning(f"Failed to download: {download_url}")
-                    continue
-
-                bin_bytes = Path(saved_path).read_bytes()
-                is_pdf = is_pdf_bytes(bin_bytes)
-                prefer_pdf = is_pdf or download_url.lower().endswith(".pdf")
-
-                file_path, sha1 = save_binary_as_pdfname(bin_bytes, prefer_pdf, download_url)
-                if not not_seen(sha1, seen):
-                    continue
-
-                txt = extract_text_generic(Path(file_path))
-                txt_path = OUT_TXT_DIR / f"{sha1}.txt"
-                txt_path.write_text(txt or "", encoding="utf-8")
-
-                rec = {
-                    "source_label": "MST",
-                    "list_url": mst_url,
-                    "detail_url": du,
-                    "download_url": download_url,
-                    "pdf_local": str(file_path),
-                    "txt_local": str(txt_path),
-                    "sha1_pdf": sha1,
-                    "pdf_text_len": len(txt or ""),
-                    "title": Path(saved_path).name,
-                    "crawl_time": now_iso(),
-                }
-                append_csv(rec, OUT_CSV)
-    except Exception as e:
-        logger.exception(f"MST failed: {e}")
-    logger.info(":: Crawl MST list end [MST]")
-
-    await context.close()
-    await browser.stop()
-    logger.info("=== END RUN ===")
-
-if __name__ == "__main__":
-    import asyncio
-    logger.info("=== START RUN ===")
-    try:
-        asyncio.run(main())
+        await asyncio.gather(*(run_source(src, pool, limiter, dl, extractor, frontier, identity, seen, known)
+                               for src in sources))
     finally:
+        await extractor.close()
+        await dl.aclose()
+        await pool.close()
+        await context.close()
+        await browser.stop()
+        frontier.close()
+        identity.close()
         logger.info("=== END RUN ===")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incremental", action="store_true",
+                    help="Chỉ lấy văn bản mới: dừng phân trang khi gặp trang toàn item đã crawl")
+    ap.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS,
+                    help="Số process trích xuất text song song")
+    ap.add_argument("--extract-timeout", type=int, default=EXTRACT_TIMEOUT_S,
+                    help="Timeout (giây) trích xuất cho mỗi file")
+    args = ap.parse_args()
+    asyncio.run(main(incremental=args.incremental, extract_workers=args.extract_workers,
+                     extract_timeout_s=args.extract_timeout))
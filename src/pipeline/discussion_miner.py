@@ -1,13 +1,18 @@
 # src/pipeline/discussion_miner.py
 from __future__ import annotations
-import json, os, re
+import json, logging, os, re, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
 from .keyword_extractor import top_keywords_from_text, keywords_from_filename
 from .patterns import find_legal_ids
-from .searchers import DDGSearcher, DDGNewsSearcher, DDGVideoSearcher, SearchResult
+from .searchers import DDGSearcher, DDGNewsSearcher, DDGVideoSearcher, RateLimiter, SearchResult, WebSearcher
+from .search_cache import CachedSearcher, SearchCache
 from ..utils.vi_text import normalize_text
 
+log = logging.getLogger(__name__)
+
 @dataclass
 class DocDiscussion:
     doc_path: str
@@ -51,37 +56,109 @@ def build_queries(text: str, file_path: str, max_q: int = 6) -> List[str]:
             break
     return dedup
 
-def mine_discussion_for_file(file_path: str, max_results_per_query: int = 8) -> DocDiscussion:
+def default_engines(limiter: Optional[RateLimiter] = None,
+                    cache: Optional[SearchCache] = None) -> List[WebSearcher]:
+    # news trước → web → video
+    engines: List[WebSearcher] = [DDGNewsSearcher(limiter=limiter), DDGSearcher(limiter=limiter),
+                                  DDGVideoSearcher(limiter=limiter)]
+    if cache is not None:
+        # cache bọc ngoài: hit không tốn lượt rate limit
+        engines = [CachedSearcher(e, cache) for e in engines]
+    return engines
+
+def _failed(fut: Future) -> bool:
+    return fut.done() and (fut.cancelled() or fut.exception() is not None)
+
+class QueryDispatcher:
+    """
+    Thread pool chạy các lượt (engine, query) cho nhiều văn bản cùng lúc; mỗi query khác nhau chỉ gửi một lần
+    trong lượt chạy, kể cả khi tắt SearchCache (--no_cache).
+    Query trùng giữa các văn bản (cùng định danh pháp lý...) khi lượt trước còn đang chạy: dùng lại Future.
+    Future xong thì chuyển từ _inflight sang _done (chỉ giữ kết quả, tối đa `memo_size` query gần nhất,
+    LRU) — lỗi không được nhớ, lần sau gửi lại.
+    """
+
+    def __init__(self, engines: List[WebSearcher], workers: int = 4, memo_size: int = 20_000):
+        self.engines = engines
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="search")
+        self._inflight: Dict[Tuple[str, str, int], Future] = {}
+        self._done: "OrderedDict[Tuple[str, str, int], List[SearchResult]]" = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.deduped = 0
+
+    def submit(self, engine: WebSearcher, query: str, max_results: int) -> Future:
+        key = (engine.name, re.sub(r"\s+", " ", query.strip().lower()), max_results)
+        with self._lock:
+            if key in self._done:
+                self._done.move_to_end(key)
+                self.deduped += 1
+                fut = Future()
+                fut.set_result(self._done[key])
+                return fut
+            fut = self._inflight.get(key)
+            # Future lỗi mà callback _evict chưa kịp chạy → coi như chưa có, gửi lại
+            if fut is not None and not _failed(fut):
+                self.deduped += 1
+                return fut
+            fut = self._pool.submit(engine.search, query, max_results=max_results)
+            self._inflight[key] = fut
+            self.sent += 1
+        # gắn ngoài lock: Future đã xong thì callback chạy ngay trong thread này
+        fut.add_done_callback(lambda f, k=key: self._evict(k, f))
+        return fut
+
+    def _evict(self, key, fut: Future):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            if not _failed(fut):
+                self._done[key] = fut.result()
+                while len(self._done) > self._memo_size:
+                    self._done.popitem(last=False)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+def _hit_rows(q: str, hits: List[SearchResult]) -> List[Dict[str, Any]]:
+    return [{
+        "query": q,
+        "title": h.title,
+        "url": h.url,
+        "snippet": h.snippet,
+        "engine": h.source,
+        "published": h.published,
+        "extra": h.extra,
+    } for h in hits]
+
+def mine_discussion_for_file(file_path: str, max_results_per_query: int = 8,
+                             dispatcher: Optional[QueryDispatcher] = None,
+                             engines: Optional[List[WebSearcher]] = None) -> DocDiscussion:
     text = normalize_text(load_text(file_path))
     file_name = os.path.basename(file_path)
     doc_id = os.path.splitext(file_name)[0]
 
     queries = build_queries(text, file_path, max_q=8)
 
-    web = DDGSearcher()
-    news = DDGNewsSearcher()
-    video = DDGVideoSearcher()
-
     all_results: List[Dict[str, Any]] = []
-    for q in queries:
-        # news trước → web → video
-        for engine in (news, web, video):
+    if dispatcher is None:
+        engines = engines or default_engines()
+        for q in queries:
+            for engine in engines:
+                try:
+                    all_results.extend(_hit_rows(q, engine.search(q, max_results=max_results_per_query)))
+                except Exception as e:
+                    all_results.append({"query": q, "engine": type(engine).__name__, "error": str(e)})
+    else:
+        # gửi hết query của văn bản vào pool, rồi gom kết quả theo đúng thứ tự query × engine
+        futs = [(q, engine, dispatcher.submit(engine, q, max_results_per_query))
+                for q in queries for engine in dispatcher.engines]
+        for q, engine, fut in futs:
             try:
-                hits: List[SearchResult] = engine.search(q, max_results=max_results_per_query)
-                for h in hits:
-                    all_results.append({
-                        "query": q,
-                        "title": h.title,
-                        "url": h.url,
-                        "snippet": h.snippet,
-                        "engine": h.source,
-                        "published": h.published,
-                        "extra": h.extra,
-                    })
+                all_results.extend(_hit_rows(q, fut.result()))
             except Exception as e:
-                all_results.append({
-                    "query": q, "engine": type(engine).__name__, "error": str(e)
-                })
+                all_results.append({"query": q, "engine": type(engine).__name__, "error": str(e)})
 
     return DocDiscussion(
         doc_path=file_path,
@@ -90,3 +167,47 @@ def mine_discussion_for_file(file_path: str, max_results_per_query: int = 8) ->
         queries=queries,
         results=all_results
     )
+
+def mine_many(file_paths: Iterable[str], max_results_per_query: int = 8, workers: int = 4,
+              rate_per_s: float = 1.0, engines: Optional[List[WebSearcher]] = None,
+              cache: Optional[SearchCache] = None) -> Iterator[DocDiscussion]:
+    """
+    Đào nhiều văn bản song song: `workers` thread cho văn bản và `workers` thread cho query,
+    mọi engine dùng chung một RateLimiter (`rate_per_s` request/giây). Trả kết quả theo thứ tự hoàn thành.
+    File lỗi (vd không đọc được) được ghi log và bỏ qua, không dừng cả lượt.
+    workers=1 → tuần tự từng văn bản, từng query (vẫn qua RateLimiter và cache).
+    """
+    engines = engines or default_engines(RateLimiter(rate_per_s, burst=max(1, workers)), cache)
+    if workers <= 1:
+        for p in file_paths:
+            try:
+                dd = mine_discussion_for_file(p, max_results_per_query, engines=engines)
+            except Exception as e:
+                log.warning("Bỏ qua %s: %s", p, e)
+                continue
+            yield dd
+        return
+    dispatcher = QueryDispatcher(engines, workers=workers)
+    files = iter(file_paths)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mine") as pool:
+            pending: Dict[Future, str] = {}
+            # cửa sổ trượt: chỉ giữ ~2×workers văn bản đang xử lý để bộ nhớ không phình theo số file
+            for p in files:
+                pending[pool.submit(mine_discussion_for_file, p, max_results_per_query, dispatcher)] = p
+                if len(pending) >= 2 * max(1, workers):
+                    break
+            while pending:
+                done = next(as_completed(pending))
+                path = pending.pop(done)
+                nxt = next(files, None)
+                if nxt is not None:
+                    pending[pool.submit(mine_discussion_for_file, nxt, max_results_per_query, dispatcher)] = nxt
+                try:
+                    dd = done.result()
+                except Exception as e:
+                    log.warning("Bỏ qua %s: %s", path, e)
+                    continue
+                yield dd
+    finally:
+        dispatcher.shutdown()
@@ -0,0 +1,155 @@
+# src/pipeline/keyword_engine.py
+"""
+Dịch vụ trích keyword YAKE dùng chung cho pipeline và dashboard.
+
+- KeywordExtractor được tạo một lần cho mỗi bộ tham số (lan, n, top) rồi dùng lại.
+- Văn bản dài hơn MAX_CHARS được chia đoạn (tối đa MAX_CHUNKS đoạn), gộp kết quả theo điểm tốt nhất.
+- Kết quả cache trên SQLite theo SHA-1 nội dung + tham số → chạy lại không tính lại.
+- extract_keywords_batch: văn bản chưa có trong cache chạy ngay trong process; chỉ script batch
+  (vd scripts/build_dashboard_cubes.py) mới truyền workers > 1 để chia cho ProcessPoolExecutor —
+  dashboard (server Streamlit) không tự sinh process pool.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import yake
+except Exception:
+    yake = None
+
+BASE = Path(__file__).resolve().parents[2]
+CACHE_DB = BASE / "outputs" / "state" / "keyword_cache.sqlite"
+
+ENGINE_VERSION = 1        # đổi cách chia đoạn/gộp → tăng để bỏ cache cũ
+MAX_CHARS = 20_000        # đoạn tối đa đưa vào YAKE một lần
+MAX_CHUNKS = 8            # văn bản rất dài: chỉ lấy ngần này đoạn đầu
+POOL_MIN_BATCH = 32       # ít hơn ngần này văn bản chưa cache thì chạy ngay trong process
+
+Keywords = List[Tuple[str, float]]
+
+@lru_cache(maxsize=32)
+def get_extractor(lan: str = "vi", n: int = 1, top: int = 15):
+    return yake.KeywordExtractor(lan=lan, n=n, top=top)
+
+def _chunks(text: str, max_chars: int, max_chunks: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    out, start = [], 0
+    while start < len(text) and len(out) < max_chunks:
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            # cắt ở xuống dòng/dấu chấm gần nhất để không xẻ đôi câu
+            cut = max(text.rfind("\n", start, end), text.rfind(". ", start, end))
+            if cut > start + max_chars // 2:
+                end = cut + 1
+        out.append(text[start:end])
+        start = end
+    return out
+
+def extract_uncached(text: str, lan: str = "vi", n: int = 1, top: int = 15,
+                     max_chars: int = MAX_CHARS, max_chunks: int = MAX_CHUNKS) -> Keywords:
+    """YAKE trên từng đoạn; keyword xuất hiện ở nhiều đoạn giữ điểm thấp nhất (tốt nhất)."""
+    if yake is None or not text:
+        return []
+    ex = get_extractor(lan, n, top)
+    best: Dict[str, Tuple[str, float]] = {}
+    for chunk in _chunks(text, max_chars, max_chunks):
+        for k, score in ex.extract_keywords(chunk):
+            key = k.strip().lower()
+            if key not in best or score < best[key][1]:
+                best[key] = (k, float(score))
+    return sorted(best.values(), key=lambda x: x[1])[:top]
+
+def _job(args) -> Optional[Keywords]:
+    """None = YAKE lỗi trên văn bản này (không cache, lần sau tính lại)."""
+    text, lan, n, top, max_chars, max_chunks = args
+    try:
+        return extract_uncached(text, lan, n, top, max_chars, max_chunks)
+    except Exception:
+        return None
+
+class KeywordCache:
+    def __init__(self, path: Path = CACHE_DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS kw_cache (key TEXT PRIMARY KEY, keywords TEXT NOT NULL)")
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Keywords]:
+        out: Dict[str, Keywords] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(uniq), 500):
+                part = uniq[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, keywords FROM kw_cache WHERE key IN ({','.join('?' * len(part))})", part
+                )
+                out.update({k: [tuple(x) for x in json.loads(v)] for k, v in rows})
+        return out
+
+    def put_many(self, items: Dict[str, Keywords]):
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO kw_cache(key, keywords) VALUES (?,?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in items.items()],
+            )
+            self.conn.execute("COMMIT")
+
+_cache: Optional[KeywordCache] = None
+_cache_lock = threading.Lock()
+
+def default_cache() -> KeywordCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KeywordCache()
+        return _cache
+
+def cache_key(text: str, lan: str, n: int, top: int, max_chars: int, max_chunks: int) -> str:
+    h = hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest()
+    return f"{h}|{lan}|{n}|{top}|{max_chars}|{max_chunks}|v{ENGINE_VERSION}"
+
+def extract_keywords_batch(texts: Sequence[str], lan: str = "vi", n: int = 1, top: int = 15,
+                           max_chars: int = MAX_CHARS, max_chunks: int = MAX_CHUNKS,
+                           workers: int = 1,
+                           cache: Optional[KeywordCache] = None) -> List[Keywords]:
+    """
+    Keyword cho nhiều văn bản, cùng thứ tự với `texts`. Văn bản trùng nội dung chỉ tính một lần;
+    phần chưa có trong cache chạy trong process (workers=1, mặc định) hoặc song song trên `workers`
+    process. Văn bản YAKE lỗi → [] nhưng không ghi cache.
+    """
+    if yake is None:
+        return [[] for _ in texts]
+    cache = cache or default_cache()
+    texts = [str(t or "") for t in texts]
+    keys = [cache_key(t, lan, n, top, max_chars, max_chunks) for t in texts]
+    found = cache.get_many(keys)
+
+    todo: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in todo:
+            todo[k] = t
+    if todo:
+        jobs = [(t, lan, n, top, max_chars, max_chunks) for t in todo.values()]
+        if workers > 1 and len(jobs) >= POOL_MIN_BATCH:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        else:
+            results = [_job(j) for j in jobs]
+        new = {k: r for k, r in zip(todo.keys(), results) if r is not None}
+        if new:
+            cache.put_many(new)
+        found.update(new)
+    return [found.get(k, []) for k in keys]
+
+def extract_keywords(text: str, lan: str = "vi", n: int = 1, top: int = 15, **kw) -> Keywords:
+    return extract_keywords_batch([text], lan=lan, n=n, top=top, workers=1, **kw)[0]
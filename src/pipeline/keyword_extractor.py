@@ -3,14 +3,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List, Tuple, Optional
 from .patterns import find_legal_ids
+from .keyword_engine import extract_keywords, yake
 from ..utils.vi_text import normalize_text, sentences
 import os
 
-try:
-    import yake
-except Exception:
-    yake = None
-
 @dataclass
 class KeywordItem:
     phrase: str
@@ -25,17 +21,15 @@ def top_keywords_from_text(text: str, topk: int = 15) -> List[KeywordItem]:
     for hit in find_legal_ids(text):
         kws.append(KeywordItem(phrase=f"{hit['type']} {hit['code']}", score=0.0, source="regex"))
 
-    # 2) YAKE (nếu có)
+    # 2) YAKE (nếu có) — extractor dùng lại, kết quả cache theo nội dung (keyword_engine)
     if yake:
-        extractor = yake.KeywordExtractor(lan="vi", n=1, top=topk)
-        for k, score in extractor.extract_keywords(text):
+        for k, score in extract_keywords(text, n=1, top=topk):
             # YAKE trả về (kw, score) ; score thấp hơn = quan trọng hơn
-            kws.append(KeywordItem(phrase=k, score=float(score), source="yake"))
+            kws.append(KeywordItem(phrase=k, score=score, source="yake"))
 
         # thêm n-gram 2 từ (hữu ích với TV)
-        extractor2 = yake.KeywordExtractor(lan="vi", n=2, top=max(5, topk//2))
-        for k, score in extractor2.extract_keywords(text):
-            kws.append(KeywordItem(phrase=k, score=float(score), source="yake"))
+        for k, score in extract_keywords(text, n=2, top=max(5, topk//2)):
+            kws.append(KeywordItem(phrase=k, score=score, source="yake"))
     else:
         # YAKE không có → fallback: lấy cụm từ đầu câu có độ dài vừa
         for s in sentences(text)[:50]:
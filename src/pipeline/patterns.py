@@ -1,24 +1,60 @@
 # src/pipeline/patterns.py
 import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
 
 # Ví dụ: "Nghị định 260/2025/NĐ-CP", "Thông tư 19/2014/TT-BKHCN", "Quyết định 187/QĐ-TTg"
-LEGAL_ID_PATTERNS = [
-    re.compile(r"\b(Nghị\s*định)\s+([0-9]+\/[0-9]{4}\/NĐ-CP)\b", re.IGNORECASE),
-    re.compile(r"\b(Thông\s*tư)\s+([0-9]+\/[0-9]{4}\/TT-[A-ZĐ]+)\b", re.IGNORECASE),
-    re.compile(r"\b(Quyết\s*định)\s+([0-9]+\/QĐ-?[A-ZĐ]+)\b", re.IGNORECASE),
-    re.compile(r"\b(Nghị\s*quyết)\s+([0-9]+\/NQ-[A-ZĐ]+)\b", re.IGNORECASE),
-    re.compile(r"\b(VBHN)\s+([0-9]+\/[A-Z]+)\b", re.IGNORECASE),
+# (kind, tên loại văn bản, mẫu số hiệu) — thứ tự này cũng là thứ tự kết quả của find_legal_ids
+_LEGAL_ID_SPECS = [
+    ("ND", r"Nghị\s*định", r"[0-9]+\/[0-9]{4}\/NĐ-CP"),
+    ("TT", r"Thông\s*tư", r"[0-9]+\/[0-9]{4}\/TT-[A-ZĐ]+"),
+    ("QD", r"Quyết\s*định", r"[0-9]+\/QĐ-?[A-ZĐ]+"),
+    ("NQ", r"Nghị\s*quyết", r"[0-9]+\/NQ-[A-ZĐ]+"),
+    ("VBHN", r"VBHN", r"[0-9]+\/[A-Z]+"),
     # Bản tin Chính phủ/Thông báo/Tờ trình...
-    re.compile(r"\b(Thông\s*báo)\s+([0-9]+\/TB-[A-ZĐ]+)\b", re.IGNORECASE),
+    ("TB", r"Thông\s*báo", r"[0-9]+\/TB-[A-ZĐ]+"),
+]
+LEGAL_ID_PATTERNS = [
+    re.compile(rf"\b({name})\s+({code})\b", re.IGNORECASE) for _, name, code in _LEGAL_ID_SPECS
 ]
 
-def find_legal_ids(text: str) -> list[dict]:
+# Một regex duy nhất quét văn bản một lượt: mỗi loại một cặp nhóm tên t{i}/c{i}.
+# Các mẫu đều bắt đầu bằng tên loại văn bản khác nhau nên không chồng lấn nhau → cùng tập kết quả
+# với việc chạy từng regex riêng. Lookahead ký tự đầu (N/T/Q/V) cho engine bỏ qua nhanh các vị trí
+# không thể khớp thay vì thử lần lượt 6 nhánh.
+LEGAL_ID_RE = re.compile(
+    r"\b(?=[NnTtQqVv])(?:" + "|".join(rf"(?P<t{i}>{name})\s+(?P<c{i}>{code})\b"
+                                      for i, (_, name, code) in enumerate(_LEGAL_ID_SPECS)) + ")",
+    re.IGNORECASE,
+)
+
+@dataclass(frozen=True)
+class LegalIdHit:
+    kind: str          # "ND" | "TT" | "QD" | "NQ" | "VBHN" | "TB"
+    type: str          # tên loại như trong văn bản, vd "Nghị định"
+    code: str          # số hiệu, vd "260/2025/NĐ-CP"
+    start: int
+    end: int
+
+    def as_dict(self) -> dict:
+        return {"type": self.type, "code": self.code, "span": [self.start, self.end]}
+
+@lru_cache(maxsize=256)
+def scan_legal_ids(text: str) -> Tuple[LegalIdHit, ...]:
+    """
+    Quét một lượt; memo theo nội dung văn bản nên build_queries, legal_ids và keyword
+    trong cùng một lượt chạy chỉ quét mỗi văn bản một lần.
+    """
     hits = []
-    for pat in LEGAL_ID_PATTERNS:
-        for m in pat.finditer(text):
-            hits.append({
-                "type": m.group(1).strip(),
-                "code": m.group(2).strip(),
-                "span": [m.start(), m.end()],
-            })
-    return hits
+    for m in LEGAL_ID_RE.finditer(text):
+        i = int(m.lastgroup[1:])       # lastgroup là c{i}: nhóm đóng sau cùng của nhánh khớp
+        kind = _LEGAL_ID_SPECS[i][0]
+        hits.append((i, LegalIdHit(kind, m.group(f"t{i}").strip(), m.group(f"c{i}").strip(),
+                                   m.start(), m.end())))
+    # giữ thứ tự cũ: theo loại (thứ tự pattern), rồi theo vị trí
+    hits.sort(key=lambda x: (x[0], x[1].start))
+    return tuple(h for _, h in hits)
+
+def find_legal_ids(text: str) -> list[dict]:
+    return [h.as_dict() for h in scan_legal_ids(text)]
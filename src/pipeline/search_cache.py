@@ -0,0 +1,112 @@
+# src/pipeline/search_cache.py
+"""
+Cache kết quả tìm kiếm trên SQLite, khóa (engine, query, region, max_results), TTL theo engine.
+
+CachedSearcher bọc một WebSearcher: còn hạn → trả từ cache (không tốn lượt rate limit);
+hết hạn/chưa có → gọi engine rồi lưu lại. offline=True: chỉ đọc cache (bỏ qua TTL), không gọi mạng —
+dùng để chạy lại/kiểm thử build_discussion_index mà không cần mạng.
+"""
+from __future__ import annotations
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .searchers import SearchResult, WebSearcher
+
+DAY = 24 * 3600
+DEFAULT_TTL_S: Dict[str, float] = {
+    "ddg": 14 * DAY,
+    "ddg_news": 1 * DAY,      # tin tức thay đổi nhanh
+    "ddg_video": 7 * DAY,
+}
+FALLBACK_TTL_S = 7 * DAY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    engine      TEXT NOT NULL,
+    query       TEXT NOT NULL,
+    region      TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    results     TEXT NOT NULL,      -- JSON list[SearchResult]
+    fetched_at  REAL NOT NULL,
+    PRIMARY KEY (engine, query, region, max_results)
+);
+"""
+
+def _norm(q: str) -> str:
+    return re.sub(r"\s+", " ", q.strip().lower())
+
+class SearchCache:
+    def __init__(self, path: Path, ttl_s: Optional[Dict[str, float]] = None, offline: bool = False):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.ttl_s = {**DEFAULT_TTL_S, **(ttl_s or {})}
+        self.offline = offline
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        # dùng chung giữa các thread của QueryDispatcher → khoá thủ công
+        self.conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, engine: str, query: str, region: str, max_results: int) -> Optional[List[SearchResult]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT results, fetched_at FROM search_cache WHERE engine=? AND query=? AND region=? AND max_results=?",
+                (engine, _norm(query), region, max_results),
+            ).fetchone()
+        if row is None:
+            return None
+        if not self.offline and time.time() - row[1] > self.ttl_s.get(engine, FALLBACK_TTL_S):
+            self.count(f"{engine}.stale")
+            return None
+        return [SearchResult(**r) for r in json.loads(row[0])]
+
+    def put(self, engine: str, query: str, region: str, max_results: int, results: List[SearchResult]):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO search_cache(engine, query, region, max_results, results, fetched_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (engine, _norm(query), region, max_results,
+                 json.dumps([asdict(r) for r in results], ensure_ascii=False), time.time()),
+            )
+
+    def count(self, key: str):
+        """Tăng bộ đếm thống kê (gọi từ nhiều thread của QueryDispatcher)."""
+        with self._lock:
+            self.stats[key] += 1
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self.stats.items()))
+
+class CachedSearcher(WebSearcher):
+    def __init__(self, inner: WebSearcher, cache: SearchCache):
+        super().__init__(None)
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+        self.region = getattr(inner, "region", "")
+
+    def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        hit = self.cache.get(self.name, query, self.region, max_results)
+        if hit is not None:
+            self.cache.count(f"{self.name}.hit")
+            return hit
+        if self.cache.offline:
+            self.cache.count(f"{self.name}.offline_miss")
+            return []
+        self.cache.count(f"{self.name}.miss")
+        results = self.inner.search(query, max_results=max_results)
+        self.cache.put(self.name, query, self.region, max_results, results)
+        return results
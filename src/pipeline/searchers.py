@@ -2,6 +2,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
+import threading
 import time
 
 try:
@@ -18,12 +19,58 @@ class SearchResult:
     published: Optional[str] = None
     extra: Optional[dict] = None
 
+class RateLimiter:
+    """Token bucket dùng chung giữa các thread/engine: tối đa `rate` request/giây, cho phép dồn `burst`."""
+
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_local = threading.local()
+
+def _ddgs():
+    """Một phiên DDGS cho mỗi thread, dùng lại qua các lần gọi (không tạo DDGS() mới mỗi query)."""
+    s = getattr(_local, "ddgs", None)
+    if s is None:
+        s = _local.ddgs = DDGS()
+    return s
+
 class WebSearcher:
+    name = "web"
+
+    def __init__(self, limiter: Optional[RateLimiter] = None):
+        self.limiter = limiter
+
+    def _throttle(self):
+        if self.limiter:
+            self.limiter.acquire()
+
     def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
         raise NotImplementedError
 
 class DDGSearcher(WebSearcher):
-    def __init__(self, safesearch: str = "moderate", region: str = "vn-vi"):
+    name = "ddg"
+
+    def __init__(self, safesearch: str = "moderate", region: str = "vn-vi",
+                 limiter: Optional[RateLimiter] = None):
+        super().__init__(limiter)
         self.safesearch = safesearch
         self.region = region
 
@@ -31,50 +78,57 @@ class DDGSearcher(WebSearcher):
         if DDGS is None:
             raise RuntimeError("duckduckgo_search chưa được cài. pip install duckduckgo-search")
         out: List[SearchResult] = []
-        with DDGS() as ddgs:
-            for r in ddgs.text(query, region=self.region, safesearch=self.safesearch, max_results=max_results):
-                out.append(SearchResult(
-                    title=r.get("title") or "",
-                    url=r.get("href") or r.get("url") or "",
-                    snippet=r.get("body") or "",
-                    source="ddg",
-                ))
+        self._throttle()
+        for r in _ddgs().text(query, region=self.region, safesearch=self.safesearch, max_results=max_results) or []:
+            out.append(SearchResult(
+                title=r.get("title") or "",
+                url=r.get("href") or r.get("url") or "",
+                snippet=r.get("body") or "",
+                source="ddg",
+            ))
         return out
 
 class DDGNewsSearcher(WebSearcher):
-    def __init__(self, safesearch: str = "moderate", region: str = "vn-vi"):
+    name = "ddg_news"
+
+    def __init__(self, safesearch: str = "moderate", region: str = "vn-vi",
+                 limiter: Optional[RateLimiter] = None):
+        super().__init__(limiter)
         self.safesearch = safesearch
         self.region = region
     def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
         if DDGS is None:
             raise RuntimeError("duckduckgo_search chưa được cài.")
         out: List[SearchResult] = []
-        with DDGS() as ddgs:
-            for r in ddgs.news(query, region=self.region, safesearch=self.safesearch, max_results=max_results):
-                out.append(SearchResult(
-                    title=r.get("title") or "",
-                    url=r.get("url") or "",
-                    snippet=r.get("body") or "",
-                    source="ddg_news",
-                    published=r.get("date"),
-                    extra={"source": r.get("source")}
-                ))
+        self._throttle()
+        for r in _ddgs().news(query, region=self.region, safesearch=self.safesearch, max_results=max_results) or []:
+            out.append(SearchResult(
+                title=r.get("title") or "",
+                url=r.get("url") or "",
+                snippet=r.get("body") or "",
+                source="ddg_news",
+                published=r.get("date"),
+                extra={"source": r.get("source")}
+            ))
         return out
 
 class DDGVideoSearcher(WebSearcher):
-    def __init__(self, region: str = "vn-vi"):
+    name = "ddg_video"
+
+    def __init__(self, region: str = "vn-vi", limiter: Optional[RateLimiter] = None):
+        super().__init__(limiter)
         self.region = region
     def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
         if DDGS is None:
             raise RuntimeError("duckduckgo_search chưa được cài.")
         out: List[SearchResult] = []
-        with DDGS() as ddgs:
-            for r in ddgs.videos(query, region=self.region, max_results=max_results):
-                out.append(SearchResult(
-                    title=r.get("title") or "",
-                    url=r.get("content") or r.get("url") or "",
-                    snippet=r.get("description") or "",
-                    source="ddg_video",
-                    extra={"duration": r.get("duration")}
-                ))
+        self._throttle()
+        for r in _ddgs().videos(query, region=self.region, max_results=max_results) or []:
+            out.append(SearchResult(
+                title=r.get("title") or "",
+                url=r.get("content") or r.get("url") or "",
+                snippet=r.get("description") or "",
+                source="ddg_video",
+                extra={"duration": r.get("duration")}
+            ))
         return out
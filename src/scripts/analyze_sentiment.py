@@ -1,12 +1,16 @@
 # src/scripts/analyze_sentiment.py
 # Chạy:  python src/scripts/analyze_sentiment.py
 
-import os, re, json
+import os, re, sys, json, hashlib, sqlite3, unicodedata
 from typing import List, Dict, Optional
 import pandas as pd
 from tqdm import tqdm
 from collections import Counter
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.utils.doc_meta import enrich_agency_law
+from src.utils.doc_identity import DocIdentity, sha1_of_path
+
 # ========================
 # CẤU HÌNH CỨNG
 # ========================
@@ -16,6 +20,10 @@ MODEL      = "hf"                                               # "underthesea"
 HF_MODEL   = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
 VOTE_THRESHOLD = 0.3
 MAX_LEN_PER_SENT = 180
+BATCH_SIZE = 32          # số câu mỗi lượt forward của mô hình HF (padding theo câu dài nhất trong lô)
+NUM_THREADS = 0          # số thread torch trên CPU; 0 = để torch tự chọn
+SCORE_CACHE_DB = "../../outputs/state/sentiment_cache.sqlite"    # cache điểm theo câu; None = tắt
+DOC_IDENTITY_DB = "../../outputs/state/doc_identity.sqlite"      # chỉ mục định danh văn bản; None = tắt
 
 # ======== Từ vựng cảm xúc ========
 POS_CUES = {
@@ -30,7 +38,8 @@ NEG_CUES = {
 # ======== Import tùy chọn ========
 HF_AVAILABLE = True
 try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification, TextClassificationPipeline
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
 except Exception:
     HF_AVAILABLE = False
 
@@ -80,11 +89,15 @@ def lexicon_boost(text: str, base_label: str) -> str:
     return base_label
 
 # ======== Bộ phân loại ========
+NEUTRAL_SCORES = {"positive":0.0,"neutral":1.0,"negative":0.0}
+
 class UndertheseaClassifier:
     name = "underthesea"
     def __init__(self):
         if not UTS_AVAILABLE:
             raise RuntimeError("underthesea chưa cài. pip install underthesea")
+        import underthesea
+        self.cache_key = f"underthesea:{getattr(underthesea, '__version__', '?')}"
     def predict_label(self, text: str) -> str:
         try:
             return uts_sentiment(text)
@@ -93,15 +106,18 @@ class UndertheseaClassifier:
 
 class HFClassifier:
     name = "hf"
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, batch_size: int = BATCH_SIZE, num_threads: int = NUM_THREADS):
         if not HF_AVAILABLE:
             raise RuntimeError("transformers chưa cài. pip install transformers torch")
         try:
+            if num_threads > 0:
+                torch.set_num_threads(num_threads)
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-            # return_all_scores=True để lấy đủ score
-            self.pipe = TextClassificationPipeline(model=self.model, tokenizer=self.tokenizer, top_k=None, return_all_scores=True)
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+            self.labels = [self._map(self.model.config.id2label[i]) for i in range(self.model.config.num_labels)]
+            self.batch_size = batch_size
             self.model_name = model_name
+            self.cache_key = f"hf:{model_name}"
         except Exception as e:
             raise RuntimeError(f"Không tải được mô hình HF '{model_name}'. Lỗi: {e}")
 
@@ -114,75 +130,196 @@ class HFClassifier:
 
     def predict_label(self, text: str) -> str:
         # Giữ để tương thích (không dùng score)
-        try:
-            out = self.pipe(text[:512])[0]
-            # out là list [{'label':'negative','score':...}, ...]
-            top = max(out, key=lambda x: x["score"])
-            return self._map(top["label"])
-        except Exception:
-            return "neutral"
+        sc = self.predict_scores(text)
+        return max(sc, key=sc.get)
 
     def predict_scores(self, text: str) -> dict:
         """Trả về dict {'positive': p, 'neutral': p, 'negative': p}"""
-        try:
-            out = self.pipe(text[:512])[0]
-            d = { self._map(x["label"]): float(x["score"]) for x in out }
-            # Bảo đảm đủ 3 nhãn
-            for k in ("positive","neutral","negative"):
-                d.setdefault(k, 0.0)
-            # Chuẩn hóa tổng = 1 (phòng trường hợp rounding)
+        return self.predict_scores_batch([text])[0]
+
+    def _forward(self, texts: List[str]) -> List[dict]:
+        enc = self.tokenizer([t[:512] for t in texts], padding=True, truncation=True,
+                             max_length=512, return_tensors="pt")
+        with torch.inference_mode():
+            probs = torch.softmax(self.model(**enc).logits, dim=-1).tolist()
+        out = []
+        for row in probs:
+            d = {"positive": 0.0, "neutral": 0.0, "negative": 0.0}
+            for lbl, p in zip(self.labels, row):
+                d[lbl] += float(p)
             s = sum(d.values()) or 1.0
-            return {k: v/s for k,v in d.items()}
+            out.append({k: v/s for k, v in d.items()})
+        return out
+
+    def _forward_one(self, text: str) -> Optional[dict]:
+        try:
+            return self._forward([text])[0]
         except Exception:
-            return {"positive":0.0,"neutral":1.0,"negative":0.0}
+            return None
+
+    def predict_scores_batch(self, texts: List[str]) -> List[dict]:
+        """Như score_batch nhưng câu chấm lỗi nhận neutral."""
+        return [sc or dict(NEUTRAL_SCORES) for sc in self.score_batch(texts)]
+
+    def score_batch(self, texts: List[str]) -> List[Optional[dict]]:
+        """
+        Chấm theo lô. Sắp theo độ dài trước khi chia lô để các câu trong lô dài gần bằng nhau
+        (ít padding), rồi trả về đúng thứ tự đầu vào. Lô lỗi → chấm lại từng câu của lô, để một câu
+        hỏng không kéo cả lô theo; câu vẫn lỗi khi chấm riêng → None.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        res: List[Optional[dict]] = [None] * len(texts)
+        for b in range(0, len(order), self.batch_size):
+            idx = order[b:b + self.batch_size]
+            try:
+                scores = self._forward([texts[i] for i in idx])
+            except Exception:
+                scores = [self._forward_one(texts[i]) for i in idx]
+            for i, sc in zip(idx, scores):
+                res[i] = sc
+        return res
 
 class LexiconOnlyClassifier:
     name = "lexicon"
+    # đổi bộ từ vựng → khóa cache đổi theo
+    cache_key = "lexicon:" + hashlib.sha1(
+        json.dumps([sorted(POS_CUES), sorted(NEG_CUES)], ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
     def predict_label(self, text: str) -> str:
         return lexicon_boost(text, "neutral")
 
+# ======== Cache điểm theo câu ========
+class ScoreCache:
+    """
+    SQLite: (model, sha1 câu đã chuẩn hóa) → xác suất 3 nhãn. Chạy lại chỉ chấm các câu mới.
+    `model` là clf.cache_key (tên mô hình HF / phiên bản underthesea / băm từ vựng lexicon).
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sent_scores ("
+            " model TEXT NOT NULL, h TEXT NOT NULL,"
+            " positive REAL NOT NULL, neutral REAL NOT NULL, negative REAL NOT NULL,"
+            " PRIMARY KEY (model, h))"
+        )
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def key(text: str) -> str:
+        t = unicodedata.normalize("NFC", normalize_text(text))
+        return hashlib.sha1(t.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, dict]:
+        by_key: Dict[str, List[str]] = {}
+        for t in texts:
+            by_key.setdefault(self.key(t), []).append(t)
+        found: Dict[str, dict] = {}
+        ks = list(by_key)
+        for i in range(0, len(ks), 500):
+            part = ks[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT h, positive, neutral, negative FROM sent_scores "
+                f"WHERE model=? AND h IN ({','.join('?' * len(part))})", [model, *part])
+            for h, p, n, g in rows:
+                for t in by_key[h]:
+                    found[t] = {"positive": p, "neutral": n, "negative": g}
+        self.stats[f"{model}.hit"] += len(found)
+        self.stats[f"{model}.miss"] += len(texts) - len(found)
+        return found
+
+    def put_many(self, model: str, scored: Dict[str, dict]):
+        self.conn.execute("BEGIN")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO sent_scores(model, h, positive, neutral, negative) VALUES (?,?,?,?,?)",
+            [(model, self.key(t), d["positive"], d["neutral"], d["negative"]) for t, d in scored.items()])
+        self.conn.execute("COMMIT")
+
+    def summary(self) -> Dict[str, object]:
+        hit = sum(v for k, v in self.stats.items() if k.endswith(".hit"))
+        miss = sum(v for k, v in self.stats.items() if k.endswith(".miss"))
+        return {**dict(sorted(self.stats.items())), "hit": hit, "miss": miss,
+                "hit_rate": round(hit / (hit + miss), 4) if hit + miss else None}
+
+    def close(self):
+        self.conn.close()
+
+# ======== Chấm theo lô (dedupe) ========
+def score_texts(texts: List[str], clf, cache: Optional[ScoreCache] = None) -> Dict[str, dict]:
+    """
+    Chấm mỗi câu khác nhau đúng một lần → {câu: {'positive','neutral','negative'}}.
+    Có `cache` → câu đã chấm ở lần chạy trước lấy từ cache, chỉ chấm phần còn lại.
+    HF chấm theo lô; bộ phân loại chỉ có nhãn → xác suất one-hot.
+    Câu chấm lỗi nhận neutral nhưng không ghi vào cache → lần chạy sau chấm lại.
+    """
+    uniq = list(dict.fromkeys(texts))
+    model = getattr(clf, "cache_key", clf.name)
+    cached = cache.get_many(model, uniq) if cache is not None else {}
+    todo = [t for t in uniq if t not in cached]
+    out = _score_uncached(todo, clf) if todo else {}
+    ok = {t: d for t, d in out.items() if d is not None}
+    if len(ok) < len(out):
+        print(f"[WARN] {len(out) - len(ok)} câu chấm lỗi → neutral (không cache)")
+    if cache is not None and ok:
+        cache.put_many(model, ok)
+    return {**cached, **{t: d or dict(NEUTRAL_SCORES) for t, d in out.items()}}
+
+def _score_uncached(uniq: List[str], clf) -> Dict[str, Optional[dict]]:
+    """{câu: xác suất}; None = chấm lỗi."""
+    if hasattr(clf, "score_batch"):
+        return dict(zip(uniq, clf.score_batch(uniq)))
+    out = {}
+    for t in uniq:
+        if hasattr(clf, "predict_scores"):
+            out[t] = clf.predict_scores(t)
+        else:
+            d = {"positive":0.0,"neutral":0.0,"negative":0.0}
+            d[clf.predict_label(t)] = 1.0
+            out[t] = d
+    return out
+
 # ======== Chấm theo câu + voting + lexicon boost ========
-def analyze_sent_piecewise(text: str, clf) -> str:
-    text = normalize_text(text)
-    if not text: return "neutral"
+def collect_sentences(text: str) -> Optional[List[tuple]]:
+    """Các câu (nguồn, câu) cần chấm của một dòng; None nếu dòng được coi luôn là neutral."""
+    if not text: return None
     if looks_english(text):  # vẫn bỏ qua tiếng Anh rõ rệt
-        return "neutral"
+        return None
 
     # --- tách title & snippet: title = trước dấu chấm đầu tiên
     parts = text.split(". ", 1)
     title_txt = parts[0]
     snippet_txt = parts[1] if len(parts) > 1 else ""
 
-    # tham số
-    title_weight = 2.0
-    max_len = MAX_LEN_PER_SENT
-    vote_th = VOTE_THRESHOLD
-
     # gom câu
     sents = []
     for sen in split_sentences(title_txt):
         sents.append(("title", sen))
     for sen in split_sentences(snippet_txt):
         sents.append(("snippet", sen))
+    return [(src, sen) for src, sen in sents
+            if len(sen) <= MAX_LEN_PER_SENT and not noisy_or_quote(sen.lower())]
+
+def analyze_sent_piecewise(text: str, clf, scored: Optional[Dict[str, dict]] = None) -> str:
+    """`scored`: điểm đã chấm sẵn theo lô (score_texts); không có thì chấm các câu của dòng này."""
+    text = normalize_text(text)
+    sents = collect_sentences(text)
+    if sents is None:
+        return "neutral"
+    if scored is None:
+        scored = score_texts([sen for _, sen in sents], clf)
+
+    # tham số
+    title_weight = 2.0
+    vote_th = VOTE_THRESHOLD
 
     # tích lũy xác suất
     acc = {"positive":0.0,"neutral":0.0,"negative":0.0}
     valid = 0
 
     for src, sen in sents:
-        if len(sen) > max_len: continue
-        s_lower = sen.lower()
-        if noisy_or_quote(s_lower): continue
-
-        if hasattr(clf, "predict_scores"):
-            scores = clf.predict_scores(sen)
-            top_label = max(scores, key=scores.get)
-            top_conf = scores[top_label]
-        else:
-            lbl = clf.predict_label(sen)
-            scores = {"positive":0.0,"neutral":0.0,"negative":0.0}
-            scores[lbl] = 1.0
-            top_label, top_conf = lbl, 1.0
+        scores = dict(scored[sen])
+        top_label = max(scores, key=scores.get)
+        top_conf = scores[top_label]
 
         w = title_weight if src=="title" else 1.0
 
@@ -214,6 +351,30 @@ def analyze_sent_piecewise(text: str, clf) -> str:
     # cuộn lần cuối theo lexicon toàn văn
     return lexicon_boost(text, label)
 
+# ======== Văn bản trùng ========
+def dedupe_docs(df: pd.DataFrame, ident: DocIdentity) -> pd.DataFrame:
+    """
+    Gắn canonical_id (ID chuẩn của văn bản trong chỉ mục định danh; chưa đăng ký → giữ doc_id) rồi bỏ
+    các dòng trùng (canonical_id, url): cùng một bài thảo luận tìm ra từ nhiều bản của một văn bản chỉ chấm một lần.
+    """
+    if "canonical_id" not in df.columns or df["canonical_id"].isna().any():
+        col = next((c for c in ("doc_path", "doc_id") if c in df.columns), None)
+        if col is None:
+            return df       # không có cột nào để tra định danh → giữ nguyên
+        src = df[col]
+        table = {}
+        for k in src.dropna().astype(str).unique():
+            sha1 = sha1_of_path(k)
+            table[k] = (ident.lookup(sha1=sha1) if sha1 else None) or os.path.splitext(os.path.basename(k))[0]
+        mapped = src.astype(str).map(table)
+        df["canonical_id"] = df["canonical_id"].fillna(mapped) if "canonical_id" in df.columns else mapped
+    if "url" in df.columns:
+        before = len(df)
+        df = df.drop_duplicates(subset=["canonical_id", "url"]).reset_index(drop=True)
+        if before != len(df):
+            print(f"Dedup văn bản trùng: {before} → {len(df)} dòng")
+    return df
+
 # ======== Tổng hợp theo văn bản ========
 def summarize_by_doc(df_pred: pd.DataFrame) -> pd.DataFrame:
     g = (df_pred.groupby("doc_id")["sentiment"]
@@ -253,6 +414,10 @@ def main():
     if "title" not in df.columns or "snippet" not in df.columns:
         raise ValueError("CSV cần có cột 'title' và 'snippet'.")
     df["text"] = (df["title"].fillna("") + ". " + df["snippet"].fillna("")).apply(normalize_text)
+    if DOC_IDENTITY_DB and os.path.exists(DOC_IDENTITY_DB):
+        ident = DocIdentity(DOC_IDENTITY_DB)
+        df = dedupe_docs(df, ident)
+        ident.close()
 
     # Dùng biến cục bộ để tránh làm MODEL thành biến local bị “dùng trước khi gán”
     model_choice = MODEL
@@ -275,22 +440,40 @@ def main():
     if clf is None:
         clf = LexiconOnlyClassifier()
 
-    tqdm.pandas(desc=f"Scoring with {clf.name}")
-    df["sentiment"] = df["text"].progress_apply(lambda s: analyze_sent_piecewise(s, clf))
-
-    # Lấy confidence nhanh cho một số dòng để debug
+    # Gom mọi câu của mọi dòng (+ toàn văn cho pred_conf) → dedupe → chấm theo lô → rải lại
+    texts = df["text"].tolist()
+    plans = [collect_sentences(t) for t in texts]
+    pending = [sen for sents in plans if sents for _, sen in sents]
+    has_scores = hasattr(clf, "predict_scores")
+    if has_scores:
+        pending += texts
+    print(f"Scoring with {clf.name}: {len(pending)} câu, {len(set(pending))} khác nhau")
+    cache = ScoreCache(SCORE_CACHE_DB) if SCORE_CACHE_DB else None
+    scored = {}
+    uniq = list(dict.fromkeys(pending))
+    step = max(1, 8 * getattr(clf, "batch_size", BATCH_SIZE))
+    for i in tqdm(range(0, len(uniq), step), desc=f"Scoring with {clf.name}"):
+        scored.update(score_texts(uniq[i:i + step], clf, cache))
+    cache_stats = None
+    if cache is not None:
+        cache_stats = cache.summary()
+        cache.close()
+        print("Score cache:", json.dumps(cache_stats, ensure_ascii=False))
+
+    df["sentiment"] = [analyze_sent_piecewise(t, clf, scored) for t in texts]
+
+    # Lấy confidence nhanh cho một số dòng để debug (toàn văn, đã chấm cùng lô ở trên)
     def top_confidence(text):
-        if hasattr(clf, "predict_scores"):
-            sc = clf.predict_scores(text)
-            lbl = max(sc, key=sc.get);
-            conf = sc[lbl]
-            return lbl, round(conf, 3)
-        else:
-            return "n/a", 1.0
+        if has_scores:
+            sc = scored[text]
+            lbl = max(sc, key=sc.get)
+            return lbl, round(sc[lbl], 3)
+        return "n/a", 1.0
+
+    df[["pred_label_raw", "pred_conf"]] = pd.DataFrame([top_confidence(t) for t in texts], index=df.index)
 
-    df[["pred_label_raw", "pred_conf"]] = df["text"].apply(
-        lambda t: pd.Series(top_confidence(t))
-    )
+    # agency/law_id theo doc_path, lưu kèm kết quả để dashboard/cube không phải suy ra lại
+    enrich_agency_law(df)
 
     out_pred = os.path.join(OUTDIR, "sentiment_results.csv")
     df.to_csv(out_pred, index=False)
@@ -302,7 +485,7 @@ def main():
     proxy = evaluate_proxy(df)
     out_eval = os.path.join(OUTDIR, "sentiment_eval.json")
     with open(out_eval, "w", encoding="utf-8") as f:
-        json.dump({"model": clf.name, "proxy": proxy}, f, ensure_ascii=False, indent=2)
+        json.dump({"model": clf.name, "proxy": proxy, "score_cache": cache_stats}, f, ensure_ascii=False, indent=2)
 
     print("Saved:", out_pred)
     print("Saved:", out_summary)
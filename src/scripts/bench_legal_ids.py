@@ -0,0 +1,62 @@
+# src/scripts/bench_legal_ids.py
+# Chạy: python src/scripts/bench_legal_ids.py [--txt_dir outputs/raw/txt] [--repeat 3]
+# So sánh 6 regex chạy riêng (cách cũ) với regex một lượt trong patterns.py, kiểm tra kết quả giống hệt.
+import argparse
+import glob
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE))
+from src.pipeline.patterns import LEGAL_ID_PATTERNS, find_legal_ids, scan_legal_ids
+
+def find_legal_ids_multi(text: str) -> list[dict]:
+    """Cài đặt cũ: mỗi pattern quét toàn văn bản một lần."""
+    hits = []
+    for pat in LEGAL_ID_PATTERNS:
+        for m in pat.finditer(text):
+            hits.append({"type": m.group(1).strip(), "code": m.group(2).strip(), "span": [m.start(), m.end()]})
+    return hits
+
+def bench(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--txt_dir", default=str(BASE / "outputs" / "raw" / "txt"))
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.txt_dir, "*.txt")))
+    texts = [Path(p).read_text(encoding="utf-8", errors="ignore") for p in paths]
+    if not texts:
+        print("No .txt files.")
+        return
+    chars = sum(map(len, texts))
+    print(f"{len(texts)} files, {chars / 1e6:.1f}M ký tự")
+
+    mismatch = [p for p, t in zip(paths, texts) if find_legal_ids_multi(t) != find_legal_ids(t)]
+    print(f"kết quả khác nhau: {len(mismatch)} file")
+    for p in mismatch[:5]:
+        print("  ", p)
+
+    multi = bench(find_legal_ids_multi, texts, args.repeat)
+    scan_legal_ids.cache_clear()
+    single = bench(lambda t: (scan_legal_ids.cache_clear(), scan_legal_ids(t)), texts, args.repeat)
+    # một lượt pipeline gọi 3 lần/văn bản (build_queries, legal_ids, keyword) — cách cũ quét 3 lần
+    scan_legal_ids.cache_clear()
+    memo = bench(lambda t: [find_legal_ids(t) for _ in range(3)], texts, 1)
+    print(f"6 regex riêng     : {multi:.3f}s")
+    print(f"1 regex một lượt  : {single:.3f}s  (x{multi / single:.2f})")
+    print(f"pipeline 3 lần gọi: cũ {3 * multi:.3f}s → memo {memo:.3f}s (x{3 * multi / memo:.2f})")
+
+if __name__ == "__main__":
+    main()
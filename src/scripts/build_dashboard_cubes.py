@@ -0,0 +1,79 @@
+# src/scripts/build_dashboard_cubes.py
+# Chạy:  python src/scripts/build_dashboard_cubes.py  (sau analyze_sentiment.py)
+# Tổng hợp trước cho dashboard → outputs/sentiment/cubes/:
+#   cube_W.parquet, cube_M.parquet — số bài theo (period × agency × law_id × domain × sentiment)
+#   rows.parquet                   — bảng theo dòng đã có cột suy ra + dedup URL, chỉ dùng khi drill-down
+#   dashboard.duckdb               — rows.parquet nạp vào DuckDB (+ chỉ mục FTS nếu có) cho bộ lọc của dashboard
+#   _meta.json                     — mtime nguồn để dashboard biết cube đã cũ
+# Kèm theo: tính sẵn keyword YAKE của mọi dòng (tham số mặc định tab Topics) vào cache của keyword_engine
+# bằng process pool ở đây, để dashboard chỉ đọc cache thay vì tự chạy YAKE / sinh process trong server.
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, BASE)
+from src.utils.dash_query import build_db
+from src.utils.doc_meta import add_meta_columns, build_cube
+from src.pipeline.keyword_engine import extract_keywords_batch, yake
+
+SENTENCE_CSV = os.path.join(BASE, "outputs", "sentiment", "sentiment_results.csv")
+CUBE_DIR = os.path.join(BASE, "outputs", "sentiment", "cubes")
+FREQS = ("W", "M")
+KW_TOP, KW_NGRAM = 8, 3     # như aggregate_keywords(topk_per_doc=8, max_ngram=3) trong dashboard
+
+def load_rows(src: str) -> pd.DataFrame:
+    df = add_meta_columns(pd.read_csv(src))
+    if "url_norm" in df.columns:
+        before = len(df)
+        df = df.drop_duplicates(subset=["url_norm"]).reset_index(drop=True)
+        print(f"Dedup theo URL: {before} → {len(df)}")
+    return df
+
+def write_parquet(df: pd.DataFrame, path: str):
+    df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def warm_keywords(rows: pd.DataFrame, workers: int) -> int:
+    if yake is None or "text_all" not in rows.columns:
+        return 0
+    texts = rows["text_all"].tolist()
+    extract_keywords_batch(texts, lan="vi", n=KW_NGRAM, top=KW_TOP, workers=workers)
+    return len(texts)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default=SENTENCE_CSV)
+    ap.add_argument("--out_dir", default=CUBE_DIR)
+    ap.add_argument("--keyword_workers", type=int, default=os.cpu_count() or 1,
+                    help="Số process tính sẵn keyword YAKE cho tab Topics")
+    ap.add_argument("--no_keywords", action="store_true", help="Không tính sẵn keyword")
+    args = ap.parse_args()
+
+    t0 = time.time()
+    os.makedirs(args.out_dir, exist_ok=True)
+    rows = load_rows(args.input)
+    write_parquet(rows, os.path.join(args.out_dir, "rows.parquet"))
+
+    meta = {"source": os.path.abspath(args.input), "source_mtime": os.path.getmtime(args.input),
+            "rows": int(len(rows)), "built_at": time.time(), "cubes": {}}
+    for freq in FREQS:
+        cube = build_cube(rows, freq)
+        write_parquet(cube, os.path.join(args.out_dir, f"cube_{freq}.parquet"))
+        meta["cubes"][freq] = int(len(cube))
+        print(f"cube_{freq}: {len(cube)} ô")
+    meta["fts"] = build_db(args.out_dir)
+    print(f"dashboard.duckdb: FTS {'có' if meta['fts'] else 'không có (tìm chuỗi con)'}")
+    if not args.no_keywords:
+        n = warm_keywords(rows, args.keyword_workers)
+        print(f"Keyword cache: {n} dòng" if n else "Keyword cache: bỏ qua (chưa cài yake)")
+    with open(os.path.join(args.out_dir, "_meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"Saved: {args.out_dir} ({len(rows)} dòng, {time.time() - t0:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,168 @@
 # scripts/build_discussion_index.py
+# Ghi có thể chạy tiếp (resumable):
+#   index.jsonl          — append mỗi văn bản một dòng, fsync sau mỗi dòng; doc_id đã có thì bỏ qua khi chạy lại
+#   index_parts/*.parquet — kết quả phẳng, flush theo lô --parquet_batch dòng (bộ nhớ không phình theo số kết quả)
+#   index.parquet        — gộp lại từ index_parts/ khi kết thúc (stream từng part)
 import argparse, glob, json, os
 from tqdm import tqdm
-from src.pipeline.discussion_miner import mine_discussion_for_file
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.pipeline.discussion_miner import mine_many
+from src.pipeline.search_cache import SearchCache
+from src.utils.doc_identity import DocIdentity
+
+FLAT_SCHEMA = pa.schema([(c, pa.string()) for c in (
+    "doc_id", "doc_path", "canonical_id", "query", "engine", "title", "url", "snippet", "published", "extra"
+)])
+
+def error_only(rec):
+    """Mọi query đều lỗi (vd DDG rate-limit) → chưa coi là xong, lần chạy sau thử lại."""
+    results = rec.get("results") or []
+    return bool(results) and all("error" in r for r in results)
+
+def flat_rows(rec):
+    """Dòng phẳng cho Parquet từ một record index.jsonl (bỏ các query lỗi)."""
+    for r in rec.get("results") or []:
+        if "error" in r:
+            continue
+        yield {
+            "doc_id": rec["doc_id"],
+            "doc_path": rec.get("doc_path"),
+            "canonical_id": rec.get("canonical_id"),
+            "query": r.get("query"),
+            "engine": r.get("engine"),
+            "title": r.get("title"),
+            "url": r.get("url"),
+            "snippet": r.get("snippet"),
+            "published": None if r.get("published") is None else str(r.get("published")),
+            "extra": json.dumps(r.get("extra"), ensure_ascii=False) if r.get("extra") else None
+        }
+
+def repair_jsonl(path):
+    """
+    Cắt dòng cuối bị ghi dở (crash giữa chừng) và bỏ các record chỉ có lỗi từ lượt trước — lượt này đào lại
+    văn bản đó và ghi record mới, giữ dòng cũ thì index có hai dòng cho cùng doc_id.
+    Trả về tập doc_id đã ghi trọn.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good = errors = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                rec = json.loads(line)
+            except Exception:
+                break
+            if error_only(rec):
+                errors += 1
+            else:
+                done.add(rec["doc_id"])
+            good += len(line)
+    size = os.path.getsize(path)
+    if errors:
+        print(f"Repair: bỏ {errors} record chỉ có lỗi khỏi {path}")
+        pos = 0
+        with open(path, "rb") as f, open(path + ".tmp", "wb") as out:
+            for line in f:
+                pos += len(line)
+                if pos > good:
+                    break
+                if not error_only(json.loads(line)):
+                    out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(path + ".tmp", path)
+    elif good != size:
+        print(f"Repair: cắt {size - good} byte hỏng ở cuối {path}")
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return done
+
+class PartWriter:
+    """Gom dòng phẳng rồi ghi thành part Parquet mỗi `batch` dòng (ghi tạm + rename)."""
+
+    def __init__(self, parts_dir, batch=5000):
+        self.parts_dir = parts_dir
+        self.batch = batch
+        self.buf = []
+        os.makedirs(parts_dir, exist_ok=True)
+        existing = glob.glob(os.path.join(parts_dir, "part-*.parquet"))
+        self.seq = 1 + max((int(os.path.basename(p)[5:10]) for p in existing), default=-1)
+
+    def add(self, rows):
+        self.buf.extend(rows)
+        if len(self.buf) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.buf:
+            return
+        path = os.path.join(self.parts_dir, f"part-{self.seq:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(self.buf, schema=FLAT_SCHEMA), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.seq += 1
+        self.buf = []
+
+def docs_in_parts(parts_dir):
+    done = set()
+    for p in glob.glob(os.path.join(parts_dir, "part-*.parquet")):
+        done.update(pq.read_table(p, columns=["doc_id"]).column("doc_id").to_pylist())
+    return done
+
+def recover_parts(out_jsonl, parts_dir, writer):
+    """Văn bản đã có trong JSONL nhưng dòng phẳng chưa kịp flush (crash) → dựng lại từ JSONL."""
+    in_parts = docs_in_parts(parts_dir)
+    n = 0
+    with open(out_jsonl, "r", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            rows = list(flat_rows(rec)) if rec["doc_id"] not in in_parts else []
+            if rows:
+                writer.add(rows)
+                n += 1
+    writer.flush()
+    if n:
+        print(f"Recovered parquet rows for {n} docs")
+
+def merge_parts(parts_dir, out_parquet):
+    parts = sorted(glob.glob(os.path.join(parts_dir, "part-*.parquet")))
+    if not parts:
+        return 0
+    total = 0
+    with pq.ParquetWriter(out_parquet + ".tmp", FLAT_SCHEMA) as w:
+        for p in parts:
+            t = pq.read_table(p)
+            # part ghi trước khi có cột canonical_id → thêm cột rỗng cho khớp schema
+            for f in FLAT_SCHEMA:
+                if f.name not in t.column_names:
+                    t = t.append_column(f, pa.nulls(t.num_rows, f.type))
+            t = t.select(FLAT_SCHEMA.names)
+            total += t.num_rows
+            w.write_table(t)
+    os.replace(out_parquet + ".tmp", out_parquet)
+    return total
+
+def dedupe_by_identity(files, done, ident):
+    """
+    Bỏ file trùng văn bản (cùng ID chuẩn trong chỉ mục định danh) với văn bản đã có trong index
+    hoặc với file đứng trước trong lượt này. Trả về (todo, {path: canonical_id}, số file bỏ qua).
+    """
+    canon = {p: ident.link_text_file(p) for p in files}
+    stem = lambda p: os.path.splitext(os.path.basename(p))[0]
+    taken = {canon[p] for p in files if stem(p) in done}
+    todo, skipped = [], 0
+    for p in files:
+        if stem(p) in done:
+            continue
+        if canon[p] in taken:
+            skipped += 1
+            continue
+        taken.add(canon[p])
+        todo.append(p)
+    return todo, canon, skipped
 
 def main():
     ap = argparse.ArgumentParser()
@@ -10,45 +170,85 @@ def main():
     ap.add_argument("--pattern", default="*.txt")
     ap.add_argument("--out_dir", default="../../outputs/discussions")
     ap.add_argument("--max_results", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=4, help="Số thread song song (văn bản / query); 1 = tuần tự")
+    ap.add_argument("--rate", type=float, default=1.0, help="Số request/giây tối đa, dùng chung mọi engine")
+    ap.add_argument("--cache_db", default="../../outputs/state/search_cache.sqlite",
+                    help="Cache kết quả tìm kiếm (SQLite)")
+    ap.add_argument("--no_cache", action="store_true", help="Luôn gọi mạng, không đọc/ghi cache")
+    ap.add_argument("--offline", action="store_true", help="Chỉ dùng cache (bỏ qua TTL), không gọi mạng")
+    ap.add_argument("--news_ttl_h", type=float, default=None, help="TTL cache cho ddg_news (giờ)")
+    ap.add_argument("--parquet_batch", type=int, default=5000, help="Số dòng phẳng mỗi part Parquet")
+    ap.add_argument("--fresh", action="store_true", help="Bỏ kết quả cũ, chạy lại từ đầu")
+    ap.add_argument("--identity_db", default="../../outputs/state/doc_identity.sqlite",
+                    help="Chỉ mục định danh văn bản (dùng chung với crawler) để bỏ văn bản trùng")
+    ap.add_argument("--no_identity", action="store_true", help="Không dedup theo định danh văn bản")
     args = ap.parse_args()
 
+    cache = None
+    if not args.no_cache:
+        ttl = {"ddg_news": args.news_ttl_h * 3600} if args.news_ttl_h is not None else None
+        cache = SearchCache(args.cache_db, ttl_s=ttl, offline=args.offline)
+
     os.makedirs(args.out_dir, exist_ok=True)
     out_jsonl = os.path.join(args.out_dir, "index.jsonl")
     out_parquet = os.path.join(args.out_dir, "index.parquet")
+    parts_dir = os.path.join(args.out_dir, "index_parts")
+
+    if args.fresh:
+        for p in [out_jsonl, *glob.glob(os.path.join(parts_dir, "part-*.parquet"))]:
+            if os.path.exists(p):
+                os.remove(p)
+    done = repair_jsonl(out_jsonl)
+    writer = PartWriter(parts_dir, batch=args.parquet_batch)
+    if done:
+        recover_parts(out_jsonl, parts_dir, writer)
 
     files = sorted(glob.glob(os.path.join(args.input_dir, args.pattern)))
-    rows = []
-    with open(out_jsonl, "w", encoding="utf-8") as f:
-        for p in tqdm(files, desc="Mining"):
-            dd = mine_discussion_for_file(p, max_results_per_query=args.max_results)
-            # ghi JSONL (mỗi doc 1 record lớn)
-            f.write(json.dumps({
-                "doc_id": dd.doc_id,
-                "doc_path": dd.doc_path,
-                "legal_ids": dd.legal_ids,
-                "queries": dd.queries,
-                "results": dd.results
-            }, ensure_ascii=False) + "\n")
-
-            # đồng thời flatten để đổ Parquet
-            for r in dd.results:
-                rows.append({
+    canon = {}
+    if args.no_identity:
+        todo = [p for p in files if os.path.splitext(os.path.basename(p))[0] not in done]
+        print(f"{len(files)} files, {len(files) - len(todo)} đã có trong index → còn {len(todo)}")
+    else:
+        ident = DocIdentity(args.identity_db)
+        todo, canon, dup = dedupe_by_identity(files, done, ident)
+        ident.close()
+        print(f"{len(files)} files, {len(files) - len(todo) - dup} đã có trong index, "
+              f"{dup} trùng văn bản khác → còn {len(todo)}")
+
+    failed = 0
+    try:
+        with open(out_jsonl, "a", encoding="utf-8") as f:
+            mined = mine_many(todo, max_results_per_query=args.max_results,
+                              workers=args.workers, rate_per_s=args.rate, cache=cache)
+            for dd in tqdm(mined, total=len(todo), desc="Mining"):
+                rec = {
                     "doc_id": dd.doc_id,
                     "doc_path": dd.doc_path,
-                    "query": r.get("query"),
-                    "engine": r.get("engine"),
-                    "title": r.get("title"),
-                    "url": r.get("url"),
-                    "snippet": r.get("snippet"),
-                    "published": r.get("published"),
-                    "extra": json.dumps(r.get("extra"), ensure_ascii=False) if r.get("extra") else None
-                })
-
-    if rows:
-        df = pd.DataFrame(rows)
-        df.to_parquet(out_parquet, index=False)
+                    "canonical_id": canon.get(dd.doc_path),
+                    "legal_ids": dd.legal_ids,
+                    "queries": dd.queries,
+                    "results": dd.results
+                }
+                if error_only(rec):
+                    failed += 1
+                    continue
+                # ghi JSONL (mỗi doc 1 record lớn) — fsync để crash không mất văn bản đã đào xong
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                writer.add(list(flat_rows(rec)))
+    finally:
+        writer.flush()
+        if failed:
+            print(f"{failed} văn bản có mọi query lỗi → không ghi, lần chạy sau thử lại")
+        if cache is not None:
+            print(f"Search cache: {cache.summary()}")
+            cache.close()
+
+    n = merge_parts(parts_dir, out_parquet)
+    if n:
         print(f"Saved: {out_jsonl}")
-        print(f"Saved: {out_parquet}")
+        print(f"Saved: {out_parquet} ({n} rows)")
     else:
         print("No results collected.")
 
@@ -1,11 +1,18 @@
 # src/scripts/dashboard.py
-import os, re
+import os, re, sys, json
 import pandas as pd
 import numpy as np
 import altair as alt
 import streamlit as st
 from collections import Counter, defaultdict
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.pipeline.keyword_engine import extract_keywords_batch
+from src.utils.kw_index import KeywordIndex
+from src.utils.doc_meta import (
+    LOCAL_TZ, add_meta_columns, build_cube, normalize_url, sentiment_score_map,
+)
+
 # Optional
 try:
     import yake
@@ -13,6 +20,12 @@ try:
 except Exception:
     YAKE_OK = False
 
+try:
+    from src.utils.dash_query import DashStore
+    DUCKDB_OK = True
+except Exception:
+    DUCKDB_OK = False
+
 try:
     import networkx as nx
     NX_OK = True
@@ -22,121 +35,83 @@ except Exception:
 # ======================
 # Config & paths
 # ======================
-LOCAL_TZ = "Asia/Ho_Chi_Minh"
 BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 SENTENCE_CSV = os.path.join(BASE, "outputs", "sentiment", "sentiment_results.csv")
 SUMMARY_CSV  = os.path.join(BASE, "outputs", "sentiment", "sentiment_results_summary.csv")
+CUBE_DIR     = os.path.join(BASE, "outputs", "sentiment", "cubes")   # scripts/build_dashboard_cubes.py
+PAGE_SIZE    = 200       # số dòng mỗi trang của bảng chi tiết
+KW_ROWS      = 50000     # trần số dòng đưa vào trích keyword (tab Agency/Topics) khi đọc từ DuckDB
 
 # ======================
 # Utils
 # ======================
-AGENCY_HINTS = {
-    r"\bttg\b": "Thủ tướng Chính phủ",
-    r"\bcp\b": "Chính phủ",
-    r"\bbkhcn\b": "Bộ KH&CN",
-    r"\bbtc\b": "Bộ Tài chính",
-    r"\bbqp\b": "Bộ Quốc phòng",
-    r"\bbgd&dt\b|\bbgd\b": "Bộ GD&ĐT",
-    r"\bmoj\b|\bbtp\b": "Bộ Tư pháp",
-    r"\bbcvt\b|\bboxntt\b": "Bộ TT&TT",
-    r"\bbkh&dt\b|\bbkhdt\b": "Bộ KH&ĐT",
-    r"\bmoit\b|\bbct\b": "Bộ Công Thương",
-    r"\bbnn&ptnt\b|\bbnn\b": "Bộ NN&PTNT",
-    r"\bgiao thông\b|\bbgtvt\b": "Bộ GTVT",
-}
-LAW_PAT = re.compile(r"\b(\d{2,4}[-_/]?(ttg|cp|btc|bkhcn|bqp|bgd|moj|btp|bct|moit|bnn|gtvt))\b", re.I)
-
-def to_dt(x):
-    """Parse về datetime; convert sang LOCAL_TZ rồi bỏ tz (naive)."""
-    dt = pd.to_datetime(x, errors="coerce", utc=True)
-    if pd.isna(dt):
-        return pd.NaT
-    try:
-        dt = dt.tz_convert(LOCAL_TZ)
-    except Exception:
-        try:
-            dt = dt.tz_localize("UTC").tz_convert(LOCAL_TZ)
-        except Exception:
-            pass
-    return dt.tz_localize(None)
-
-def guess_agency_from_path(s: str) -> str:
-    if not isinstance(s, str): return "Khác/Không rõ"
-    s_low = s.lower()
-    for pat, lab in AGENCY_HINTS.items():
-        if re.search(pat, s_low):
-            return lab
-    m = re.search(r"[-_/](ttg|cp|btc|bkhcn|bqp|bgd|moj|btp|bct|moit|bnn|gtvt)[-_.]", s_low)
-    if m:
-        token = m.group(1).upper()
-        return {
-            "TTG":"Thủ tướng Chính phủ", "CP":"Chính phủ", "BTC":"Bộ Tài chính",
-            "BKHCN":"Bộ KH&CN", "BQP":"Bộ Quốc phòng", "BGD":"Bộ GD&ĐT",
-            "MOJ":"Bộ Tư pháp", "BCT":"Bộ Công Thương", "MOIT":"Bộ Công Thương",
-            "BNN":"Bộ NN&PTNT", "GTVT":"Bộ GTVT"
-        }.get(token, "Khác/Không rõ")
-    return "Khác/Không rõ"
-
-def extract_law_id(text):
-    if not isinstance(text, str): return None
-    m = LAW_PAT.search(text.lower())
-    return m.group(1).upper() if m else None
-
-def normalize_url(u):
-    if not isinstance(u, str): return u
-    u = u.strip()
-    u = re.sub(r"https?://(www\.)?", "https://", u)
-    u = re.sub(r"(\?|&)(utm_[^=]+|fbclid|gclid)=[^&]+", "", u)
-    return u.rstrip("?&")
-
-def extract_domain(u):
-    m = re.search(r"https?://([^/]+)/", str(u))
-    return m.group(1).lower() if m else None
-
-def sentiment_score_map(label: str) -> int:
-    l = str(label).lower()
-    return 1 if l == "positive" else (-1 if l == "negative" else 0)
-
-def compute_time_agg(df, freq="W", sentiment_col="sentiment"):
-    ts = df.copy()
-    if ts["published_dt"].isna().all():
-        ts["published_dt"] = pd.Timestamp.today().normalize()
-    ts["published_dt"] = pd.to_datetime(ts["published_dt"]).dt.tz_localize(None)
-    ts = ts.set_index("published_dt").sort_index()
-    counts = (
-        ts.groupby([pd.Grouper(freq=freq), sentiment_col])
-          .size().rename("count").reset_index()
-    )
+def cube_time_agg(cube):
+    """Số bài + tỷ trọng theo (kỳ, sentiment) từ cube (cột period/sentiment/count)."""
+    c = cube
+    if c["period"].isna().all():
+        c = c.assign(period=pd.Timestamp.today().normalize())
+    counts = (c.groupby(["period", "sentiment"])["count"].sum().reset_index()
+                .rename(columns={"period": "published_dt"}))
+    counts = counts[counts["count"] > 0]
     totals = counts.groupby("published_dt")["count"].sum().rename("total")
     counts = counts.merge(totals, on="published_dt", how="left")
     counts["share"] = counts["count"] / counts["total"].replace(0, np.nan)
     return counts
 
+def cubes_fresh():
+    """Cube còn dùng được: đủ file và được dựng từ đúng bản SENTENCE_CSV hiện tại (nếu CSV còn đó)."""
+    meta_path = os.path.join(CUBE_DIR, "_meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if os.path.exists(SENTENCE_CSV) and os.path.getmtime(SENTENCE_CSV) > meta.get("source_mtime", 0):
+        return False
+    return all(os.path.exists(os.path.join(CUBE_DIR, n)) for n in ("rows.parquet", "cube_W.parquet", "cube_M.parquet"))
+
+def data_stamp():
+    """mtime của CSV nguồn + các file cube: tham số của các hàm load_* → dựng lại cube là nạp lại."""
+    names = ("_meta.json", "rows.parquet", "cube_W.parquet", "cube_M.parquet", "dashboard.duckdb")
+    paths = [SENTENCE_CSV, SUMMARY_CSV, *(os.path.join(CUBE_DIR, n) for n in names)]
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+@st.cache_data(show_spinner=False)
+def load_cubes(stamp):
+    if not cubes_fresh():
+        return None
+    return {f: pd.read_parquet(os.path.join(CUBE_DIR, f"cube_{f}.parquet")) for f in ("W", "M")}
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_store(stamp):
+    """Bảng dòng trên DuckDB (cubes/dashboard.duckdb hoặc rows.parquet); None → lọc bằng pandas."""
+    if not DUCKDB_OK or not cubes_fresh():
+        return None
+    return DashStore(CUBE_DIR)
+
 @st.cache_data(show_spinner=False)
-def load_data():
-    df = pd.read_csv(SENTENCE_CSV)
-    df["published_dt"] = df["published"].apply(to_dt) if "published" in df.columns else pd.NaT
-    df["agency"] = df["doc_path"].apply(guess_agency_from_path) if "doc_path" in df.columns else "Khác/Không rõ"
-    text_cols = [c for c in ["title","snippet"] if c in df.columns]
-    df["text_all"] = df[text_cols].fillna("").agg(". ".join, axis=1) if text_cols else ""
+def load_data(stamp):
+    """Bảng theo dòng (chỉ cho drill-down/tìm kiếm). Có cube → rows.parquet đã tính sẵn cột suy ra."""
+    if cubes_fresh():
+        df = pd.read_parquet(os.path.join(CUBE_DIR, "rows.parquet"))
+    else:
+        df = add_meta_columns(pd.read_csv(SENTENCE_CSV))
     summary = pd.read_csv(SUMMARY_CSV) if os.path.exists(SUMMARY_CSV) else None
     return df, summary
 
 def yake_keywords(documents, topk=10, max_ngram=3, lang="vi"):
     if not YAKE_OK:
         return []
+    # chạy trong process của server (không sinh process pool); văn bản đã tính (cùng nội dung + tham số)
+    # lấy từ cache — build_dashboard_cubes.py tính sẵn cho tham số mặc định của tab Topics
     kw = []
-    extractor = yake.KeywordExtractor(lan=lang, n=max_ngram, top=topk)
-    for text in documents:
-        try:
-            for k, s in extractor.extract_keywords(str(text)):
-                kw.append((k.strip().lower(), s))
-        except Exception:
-            continue
+    for res in extract_keywords_batch(list(documents), lan=lang, n=max_ngram, top=topk, workers=1):
+        kw.extend((k.strip().lower(), s) for k, s in res)
     return kw
 
 @st.cache_data(show_spinner=False)
-def aggregate_keywords(df, topk_per_doc=8, max_ngram=3):
+def aggregate_keywords(filter_key, _df, topk_per_doc=8, max_ngram=3):
+    """filter_key (stamp + bộ lọc) là khóa cache — không băm cả DataFrame ở mỗi lần rerun."""
+    df = _df
     pairs = yake_keywords(df["text_all"].tolist(), topk=topk_per_doc, max_ngram=max_ngram)
     if not pairs:
         bag = Counter()
@@ -152,22 +127,36 @@ def aggregate_keywords(df, topk_per_doc=8, max_ngram=3):
     rows = [{"keyword":k, "weight":v["score_sum"], "count":v["count"]} for k,v in agg.items()]
     return pd.DataFrame(rows).sort_values(["weight","count"], ascending=False)
 
+@st.cache_data(show_spinner=False)
+def keyword_index(filter_key, keywords, _texts_lower, _sentiments):
+    """Chỉ mục keyword → bitmap dòng; khóa cache là bộ lọc + danh sách keyword, không băm toàn bộ văn bản."""
+    return KeywordIndex(_texts_lower, keywords, _sentiments)
+
 # ======================
 # UI
 # ======================
 st.set_page_config(page_title="Sentiment Dashboard for Legal Discussions", layout="wide")
 st.title("📊 Legal Discussion Sentiment Dashboard")
 
-# 1) Load data
-df, summary = load_data()
-
-# Bảo đảm tz-naive (phòng case CSV khác nhau)
-if df["published_dt"].dtype == "datetime64[ns, UTC]":
-    df["published_dt"] = df["published_dt"].dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+# 1) Load data — có DuckDB store thì không nạp cả bảng dòng vào bộ nhớ, chỉ truy vấn phần đã lọc
+stamp = data_stamp()
+cubes = load_cubes(stamp)
+store = load_store(stamp)
+if store is None:
+    df, summary = load_data(stamp)
+    # Bảo đảm tz-naive (phòng case CSV khác nhau)
+    if df["published_dt"].dtype == "datetime64[ns, UTC]":
+        df["published_dt"] = df["published_dt"].dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    else:
+        df["published_dt"] = df["published_dt"].apply(
+            lambda x: x.tz_localize(None) if hasattr(x, "tzinfo") and x.tzinfo else x
+        )
 else:
-    df["published_dt"] = df["published_dt"].apply(
-        lambda x: x.tz_localize(None) if hasattr(x, "tzinfo") and x.tzinfo else x
-    )
+    df = None
+    summary = pd.read_csv(SUMMARY_CSV) if os.path.exists(SUMMARY_CSV) else None
+if cubes is None:
+    st.caption("ℹ️ Chưa có cube tổng hợp (hoặc đã cũ) → tính trực tiếp từ bảng dòng. "
+               "Chạy `python src/scripts/build_dashboard_cubes.py` để tải trang nhanh hơn.")
 
 # 2) Sidebar filters
 with st.sidebar:
@@ -175,11 +164,15 @@ with st.sidebar:
     freq = st.selectbox("Chu kỳ thời gian", ["W (tuần)", "M (tháng)"], index=0)
     freq_code = "W" if freq.startswith("W") else "M"
 
-    agencies = sorted(df["agency"].dropna().unique().tolist())
+    if store is not None:
+        agencies = store.distinct("agency")
+        date_min, date_max = store.date_bounds()
+    else:
+        agencies = sorted(df["agency"].dropna().unique().tolist())
+        date_min = pd.to_datetime(df["published_dt"].min())
+        date_max = pd.to_datetime(df["published_dt"].max())
     sel_agencies = st.multiselect("Đơn vị ban hành", agencies, default=agencies)
 
-    date_min = pd.to_datetime(df["published_dt"].min())
-    date_max = pd.to_datetime(df["published_dt"].max())
     if pd.isna(date_min) or pd.isna(date_max):
         date_min, date_max = pd.Timestamp("2020-01-01"), pd.Timestamp.today().normalize()
     date_range = st.date_input("Khoảng thời gian", value=(date_min.date(), date_max.date()))
@@ -189,7 +182,13 @@ with st.sidebar:
     else:
         d_from, d_to = date_min, date_max
 
-    q = st.text_input("🔎 Tìm trong tiêu đề/snippet", "")
+    q = st.text_input("🔎 Tìm trong tiêu đề/snippet", "", help="Tìm chuỗi con, không phân biệt hoa thường.")
+    whole_words = False
+    if store is not None and store.fts:
+        whole_words = st.checkbox(
+            "Chỉ khớp nguyên từ (chỉ mục FTS, nhanh hơn)", value=False,
+            help="Bật: dùng chỉ mục toàn văn — 'thảo' không còn khớp một phần từ như 'thảoluận'; "
+                 "các từ trong ô tìm kiếm phải cùng xuất hiện nhưng không cần liền nhau.")
 
     st.markdown("**Trọng số domain (tùy chọn)**")
     dom_weights_raw = st.text_area(
@@ -202,23 +201,29 @@ with st.sidebar:
     topk_kw   = st.slider("Số keyword (top-N)", 20, 300, 80, step=10)
     max_ngram = st.slider("Độ dài n-gram tối đa (keyword)", 1, 4, 3)
 
-# 3) Áp dụng filter cơ bản
-mask = df["agency"].isin(sel_agencies)
-mask &= (df["published_dt"].fillna(pd.Timestamp("1970-01-01")) >= d_from)
-mask &= (df["published_dt"].fillna(pd.Timestamp("2100-01-01")) <= d_to)
-df_f = df.loc[mask].copy()
-
-# Search text
-if q:
-    q_l = q.lower()
-    df_f = df_f[df_f["text_all"].str.lower().str.contains(q_l, na=False)]
-
-# Dedup URL
-if "url" in df_f.columns:
-    df_f["url_norm"] = df_f["url"].apply(normalize_url)
-    before = len(df_f)
-    df_f = df_f.drop_duplicates(subset=["url_norm"])
-    st.caption(f"🔁 Dedup theo URL: {before} → {len(df_f)}")
+# 3) Áp dụng filter cơ bản. DuckDB: mọi bộ lọc đẩy xuống SQL, không nạp bảng dòng (xem fetch_rows);
+#    pandas: lọc ra df_f dùng cho drill-down, Topics, Docs
+row_filters = dict(agencies=sel_agencies, d_from=d_from, d_to=d_to, q=q)
+if store is not None:
+    row_filters["whole_words"] = whole_words
+    df_f = None
+else:
+    mask = df["agency"].isin(sel_agencies)
+    mask &= (df["published_dt"].fillna(pd.Timestamp("1970-01-01")) >= d_from)
+    mask &= (df["published_dt"].fillna(pd.Timestamp("2100-01-01")) <= d_to)
+    df_f = df.loc[mask].copy()
+
+    # Search text
+    if q:
+        q_l = q.lower()
+        df_f = df_f[df_f["text_all"].str.lower().str.contains(q_l, na=False)]
+
+    # Dedup URL (rows.parquet của cube đã dedup sẵn)
+    if "url" in df_f.columns and cubes is None:
+        df_f["url_norm"] = df_f["url"].apply(normalize_url)
+        before = len(df_f)
+        df_f = df_f.drop_duplicates(subset=["url_norm"])
+        st.caption(f"🔁 Dedup theo URL: {before} → {len(df_f)}")
 
 # Domain weights
 dom_weight = {}
@@ -229,28 +234,56 @@ for line in dom_weights_raw.splitlines():
     except:
         pass
 
-if "url" in df_f.columns and dom_weight:
-    df_f["domain"] = df_f["url"].apply(extract_domain)
-    df_f["w"] = df_f["domain"].map(dom_weight).fillna(1.0)
+# Cube cho KPI/biểu đồ: tổng hợp sẵn khi không tìm theo chữ; có q → GROUP BY trên các dòng khớp
+if cubes is not None and not q:
+    cube = cubes[freq_code]
+    cmask = cube["agency"].isin(sel_agencies)
+    # lọc ngày theo kỳ: lấy các kỳ giao với khoảng đã chọn
+    cmask &= (cube["period"].fillna(pd.Timestamp("1970-01-01")) >= d_from)
+    cmask &= (cube["period_start"].fillna(pd.Timestamp("2100-01-01")) <= d_to)
+    cube_f = cube.loc[cmask]
+    st.caption("🧊 Số liệu tổng hợp từ cube (lọc thời gian làm tròn theo kỳ).")
+elif store is not None:
+    cube_f = store.cube(freq_code, **row_filters)
 else:
-    df_f["w"] = 1.0
+    cube_f = build_cube(df_f, freq_code)
 
-# Law id filter (sau khi có df_f)
-df_f["law_id"] = df_f["doc_path"].apply(extract_law_id) if "doc_path" in df_f.columns else None
+# Law id filter
 with st.sidebar:
-    law_ids = sorted(x for x in df_f["law_id"].dropna().unique().tolist())
+    law_ids = sorted(x for x in cube_f["law_id"].dropna().unique().tolist())
     sel_law = st.multiselect("Lọc theo mã văn bản", law_ids, default=[])
-if sel_law:
+if df_f is not None and sel_law:
     df_f = df_f[df_f["law_id"].isin(sel_law)]
+if sel_law:
+    cube_f = cube_f[cube_f["law_id"].isin(sel_law)]
+# khóa cache cho các bước tính trên tập dòng đã lọc (keyword) — đổi dữ liệu hoặc bộ lọc là tính lại
+filter_key = (stamp, tuple(sel_agencies), str(d_from), str(d_to), q, whole_words, tuple(sel_law))
+kw_limit = KW_ROWS if store is not None else None
+
+def fetch_rows(columns=None, limit=None, offset=0, agency=None):
+    """Dòng đã lọc (tùy chọn thêm một agency): DuckDB chỉ trả đúng cột/trang cần, pandas cắt từ df_f."""
+    if store is not None:
+        filters = dict(row_filters, law_ids=sel_law)
+        if agency is not None:
+            filters["agencies"] = [agency]
+        return store.rows(columns, limit=limit, offset=offset, **filters)
+    out = df_f if agency is None else df_f[df_f["agency"] == agency]
+    if columns:
+        out = out[[c for c in columns if c in out.columns]]
+    return out.iloc[offset:offset + limit] if limit else out
+
+cube_f = cube_f.assign(wcount=cube_f["count"] * cube_f["domain"].map(dom_weight).fillna(1.0).astype(float))
 
 # 4) KPI
 k1, k2, k3, k4 = st.columns(4)
-non_neutral_rate = (df_f["sentiment"].str.lower()!="neutral").mean() if len(df_f) else 0.0
-avg_score = df_f["sentiment"].map({"positive":1,"neutral":0,"negative":-1}).mean() if len(df_f) else 0.0
-k1.metric("Tổng bài", f"{len(df_f):,}")
+n_total = int(cube_f["count"].sum())
+by_sent = cube_f.groupby(cube_f["sentiment"].str.lower())["count"].sum()
+non_neutral_rate = (1 - by_sent.get("neutral", 0) / n_total) if n_total else 0.0
+avg_score = (by_sent.get("positive", 0) - by_sent.get("negative", 0)) / n_total if n_total else 0.0
+k1.metric("Tổng bài", f"{n_total:,}")
 k2.metric("% Non-neutral", f"{non_neutral_rate*100:,.1f}%")
 k3.metric("Điểm cảm xúc TB", f"{avg_score:+.3f}")
-k4.metric("Số agency", df_f["agency"].nunique())
+k4.metric("Số agency", cube_f.loc[cube_f["count"] > 0, "agency"].nunique())
 
 # 5) Tabs
 tab_overview, tab_agency, tab_topics, tab_docs = st.tabs(["📈 Overview","🏛️ Agency","🧭 Topics","📄 Docs"])
@@ -258,7 +291,7 @@ tab_overview, tab_agency, tab_topics, tab_docs = st.tabs(["📈 Overview","🏛
 # ========== Overview ==========
 with tab_overview:
     st.subheader("⏱️ Xu hướng cảm xúc theo thời gian")
-    time_agg = compute_time_agg(df_f, freq=freq_code)
+    time_agg = cube_time_agg(cube_f)
     if len(time_agg) == 0:
         st.info("Không có dữ liệu sau khi lọc.")
     else:
@@ -297,7 +330,8 @@ with tab_overview:
 # ========== Agency ==========
 with tab_agency:
     st.subheader("📊 So sánh theo Đơn vị ban hành")
-    by_agency = df_f.groupby(["agency","sentiment"]).size().rename("count").reset_index()
+    by_agency = cube_f.groupby(["agency","sentiment"])["count"].sum().reset_index()
+    by_agency = by_agency[by_agency["count"] > 0]
     if len(by_agency):
         bars = alt.Chart(by_agency).mark_bar().encode(
             x=alt.X("count:Q", title="Số lượng"),
@@ -308,8 +342,8 @@ with tab_agency:
         st.altair_chart(bars, use_container_width=True)
 
         # Weighted view
-        by_agency_w = (df_f.groupby(["agency","sentiment"])["w"].sum()
-                       .rename("wcount").reset_index())
+        by_agency_w = cube_f.groupby(["agency","sentiment"])["wcount"].sum().reset_index()
+        by_agency_w = by_agency_w[by_agency_w["wcount"] > 0]
         bars_w = alt.Chart(by_agency_w).mark_bar().encode(
             x=alt.X("wcount:Q", title="Số lượng (có trọng số)"),
             y=alt.Y("agency:N", sort="-x"),
@@ -319,13 +353,14 @@ with tab_agency:
         st.altair_chart(bars_w, use_container_width=True)
 
         # Scatter overview
-        sc = df_f.copy()
-        sc["score"] = sc["sentiment"].apply(sentiment_score_map)
-        sc_ag = sc.groupby("agency").agg(
-            total=("sentiment","size"),
-            non_neutral=("sentiment", lambda s: np.mean(s.str.lower()!="neutral")),
-            sentiment_score=("score","mean"),
-        ).reset_index()
+        sc = cube_f.assign(
+            score=cube_f["sentiment"].apply(sentiment_score_map) * cube_f["count"],
+            nn=(cube_f["sentiment"].str.lower() != "neutral") * cube_f["count"],
+        )
+        sc_ag = sc.groupby("agency")[["count", "nn", "score"]].sum().reset_index()
+        sc_ag = sc_ag[sc_ag["count"] > 0].rename(columns={"count": "total"})
+        sc_ag["non_neutral"] = sc_ag["nn"] / sc_ag["total"]
+        sc_ag["sentiment_score"] = sc_ag["score"] / sc_ag["total"]
         scatter = alt.Chart(sc_ag).mark_circle(size=200).encode(
             x=alt.X("sentiment_score:Q", title="Điểm cảm xúc (pos - neg)"),
             y=alt.Y("non_neutral:Q", title="Tỷ lệ non-neutral"),
@@ -336,14 +371,14 @@ with tab_agency:
 
         # Drill-down
         st.markdown("### 🔍 Drill-down agency")
-        pick = st.selectbox("Chọn agency", ["(tất cả)"] + sorted(df_f["agency"].unique().tolist()))
-        df_ag = df_f if pick=="(tất cả)" else df_f[df_f["agency"]==pick]
-        agg_ag = compute_time_agg(df_ag, freq=freq_code)
+        pick = st.selectbox("Chọn agency", ["(tất cả)"] + sorted(by_agency["agency"].unique().tolist()))
+        df_ag = fetch_rows(["text_all"], limit=kw_limit, agency=None if pick == "(tất cả)" else pick)
+        agg_ag = cube_time_agg(cube_f if pick=="(tất cả)" else cube_f[cube_f["agency"]==pick])
         st.altair_chart(alt.Chart(agg_ag).mark_area(opacity=0.7).encode(
             x="published_dt:T", y=alt.Y("share:Q", stack="normalize"), color="sentiment:N"
         ), use_container_width=True)
 
-        df_kw_ag = aggregate_keywords(df_ag, topk_per_doc=8, max_ngram=3).head(50)
+        df_kw_ag = aggregate_keywords((filter_key, pick), df_ag, topk_per_doc=8, max_ngram=3).head(50)
         st.dataframe(df_kw_ag, use_container_width=True, height=300)
     else:
         st.info("Không có số liệu agency sau khi lọc.")
@@ -352,27 +387,29 @@ with tab_agency:
 with tab_topics:
     st.subheader("🗺️ Bản đồ chủ đề theo keyword")
     with st.spinner("Đang trích từ khoá..."):
-        df_kw = aggregate_keywords(df_f, topk_per_doc=8, max_ngram=max_ngram)
+        df_kw_rows = fetch_rows(["text_all", "sentiment"], limit=kw_limit)
+        if kw_limit and len(df_kw_rows) >= kw_limit:
+            st.caption(f"ℹ️ Keyword tính trên {kw_limit:,} dòng đầu (theo thời gian) của bản lọc.")
+        df_kw = aggregate_keywords(filter_key, df_kw_rows, topk_per_doc=8, max_ngram=max_ngram)
         if len(df_kw) == 0:
             st.info("Không trích được keyword nào từ dữ liệu đã lọc.")
         else:
-            text_all_lower = df_f["text_all"].fillna("").str.lower().tolist()
-            sentiments = df_f["sentiment"].str.lower().tolist()
-            kw_rows = []
             kw_list = df_kw.head(topk_kw)["keyword"].tolist()
+            kw_idx = keyword_index(filter_key, tuple(kw_list),
+                                   df_kw_rows["text_all"].fillna("").str.lower().tolist(),
+                                   df_kw_rows["sentiment"].str.lower().tolist())
+            kw_rows = []
 
             for kw in kw_list:
-                idxs = [i for i, t in enumerate(text_all_lower) if kw in t]
-                if not idxs:
+                n_hits = kw_idx.freq(kw)
+                if not n_hits:
                     continue
-                labels = [sentiments[i] for i in idxs]
-                pos = sum(1 for l in labels if l == "positive")
-                neg = sum(1 for l in labels if l == "negative")
-                neu = sum(1 for l in labels if l == "neutral")
+                lc = kw_idx.label_counts(kw)
+                pos, neg, neu = lc.get("positive", 0), lc.get("negative", 0), lc.get("neutral", 0)
                 score = (pos - neg) / max(1, (pos + neg + neu))
                 kw_rows.append({
                     "keyword": kw,
-                    "freq": len(idxs),
+                    "freq": n_hits,
                     "pos": pos, "neg": neg, "neu": neu,
                     "sentiment_score": score
                 })
@@ -391,7 +428,6 @@ with tab_topics:
 
             if NX_OK and len(df_kw2) >= 5:
                 st.markdown("**Mạng đồng xuất hiện keyword (đơn giản)**")
-                import itertools
                 top_nodes = df_kw2.head(min(30, len(df_kw2)))["keyword"].tolist()
 
                 G = nx.Graph()
@@ -399,13 +435,9 @@ with tab_topics:
                     scr = float(df_kw2.loc[df_kw2["keyword"]==k, "sentiment_score"].values[0])
                     G.add_node(k, score=scr)
 
-                for text in text_all_lower:
-                    hits = [k for k in top_nodes if k in text]
-                    for a, b in itertools.combinations(sorted(set(hits)), 2):
-                        if G.has_edge(a,b):
-                            G[a][b]["w"] += 1
-                        else:
-                            G.add_edge(a,b, w=1)
+                # đồng xuất hiện = AND hai bitmap dòng
+                for a, b, c in kw_idx.cooccurrence(top_nodes):
+                    G.add_edge(a, b, w=c)
 
                 edges = [(u,v,d["w"]) for u,v,d in G.edges(data=True) if d["w"]>=2]
                 if edges:
@@ -416,11 +448,17 @@ with tab_topics:
 # ========== Docs ==========
 with tab_docs:
     st.subheader("📄 Dữ liệu chi tiết")
-    st.dataframe(df_f[["doc_id","agency","published_dt","title","snippet","sentiment"]].head(200), use_container_width=True)
+    n_rows = store.count(**row_filters, law_ids=sel_law) if store is not None else len(df_f)
+    n_pages = max(1, -(-n_rows // PAGE_SIZE))
+    page = st.number_input(f"Trang (/{n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+    doc_cols = ["doc_id","agency","published_dt","title","snippet","sentiment"]
+    st.dataframe(fetch_rows(doc_cols, limit=PAGE_SIZE, offset=(int(page) - 1) * PAGE_SIZE), use_container_width=True)
     c1, c2 = st.columns(2)
     with c1:
-        st.download_button("Tải CSV (bản lọc hiện tại)", data=df_f.to_csv(index=False).encode("utf-8"),
-                           file_name="filtered_sentiment_rows.csv", mime="text/csv")
+        # cả bản lọc chỉ được kéo về khi người dùng yêu cầu tải
+        if st.checkbox(f"Chuẩn bị CSV ({n_rows:,} dòng)", value=False):
+            st.download_button("Tải CSV (bản lọc hiện tại)", data=fetch_rows().to_csv(index=False).encode("utf-8"),
+                               file_name="filtered_sentiment_rows.csv", mime="text/csv")
     with c2:
         if summary is not None:
             st.download_button("Tải summary theo văn bản", data=summary.to_csv(index=False).encode("utf-8"),
@@ -1,35 +1,120 @@
 # -*- coding: utf-8 -*-
 # Chạy: python src/scripts/merge_jsonl_discussions.py
-import os, json, glob
-import pandas as pd
+# Stream outputs/jsonl/*.jsonl → CSV + Parquet theo lô cố định: bộ nhớ không tăng theo kích thước corpus.
+#   Lượt 1: quét schema (tên cột phẳng + kiểu) — không giữ giá trị.
+#   Lượt 2: parse orjson từng lô BATCH_ROWS dòng, ghi row group Parquet + append CSV.
+import os, sys, csv, glob
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 
+BASE = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE))
+from src.utils.scd import read_history
+
 IN_DIR = "outputs/jsonl"
 OUT_FLAT_CSV = "outputs/discussions/index_merged_flat.csv"
 OUT_PARQUET  = "outputs/discussions/index_merged_flat.parquet"
+BATCH_ROWS = 2000
+
+def flatten(d, prefix=""):
+    """
+    Giống pd.json_normalize: dict lồng → cột 'a.b', dict rỗng bị bỏ, list giữ nguyên (ghi ra dạng JSON).
+    Cùng thứ tự cột: ở cấp ngoài cùng cột lồng xếp sau các cột thường, bên trong giữ thứ tự khóa.
+    """
+    out, nested = {}, {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            (out if prefix else nested).update(flatten(v, key + "."))
+        else:
+            out[key] = v
+    out.update(nested)
+    return out
+
+def iter_records(in_dir):
+    """Record của mọi site; lịch sử SCD2 đọc qua read_history để is_current/record_valid_to đúng."""
+    for fp in sorted(glob.glob(os.path.join(in_dir, "*.jsonl"))):
+        site = os.path.basename(fp)[:-len(".jsonl")]
+        yield from read_history(in_dir, site)
+
+def _kind(v):
+    if v is None:
+        return None
+    if isinstance(v, bool):
+        return "bool"
+    if isinstance(v, int):
+        return "int"
+    if isinstance(v, float):
+        return "float"
+    return "str"      # str, list → chuỗi (list ghi dạng JSON)
+
+_PA = {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64(), "str": pa.string(), None: pa.string()}
+
+def scan_schema(in_dir):
+    """Lượt 1: thứ tự cột theo lần xuất hiện đầu tiên, kiểu hợp nhất (xung đột → float/str)."""
+    kinds = {}
+    n = 0
+    for rec in iter_records(in_dir):
+        n += 1
+        for k, v in flatten(rec).items():
+            kv = _kind(v)
+            cur = kinds.get(k)
+            if k not in kinds or cur is None:
+                kinds[k] = kv
+            elif kv is not None and kv != cur:
+                kinds[k] = "float" if {cur, kv} <= {"int", "float"} else "str"
+    schema = pa.schema([(k, _PA[t]) for k, t in kinds.items()])
+    return schema, n
+
+def _cell(v, typ):
+    if v is None:
+        return None
+    if pa.types.is_string(typ):
+        if isinstance(v, (list, dict)):
+            return orjson.dumps(v).decode("utf-8")
+        return v if isinstance(v, str) else str(v)
+    if pa.types.is_floating(typ):
+        return float(v)
+    return v
+
+def iter_batches(in_dir, schema, batch_rows=BATCH_ROWS):
+    names = schema.names
+    types = [schema.field(c).type for c in names]
+    cols = {c: [] for c in names}
+    size = 0
+    for rec in iter_records(in_dir):
+        flat = flatten(rec)
+        for c, t in zip(names, types):
+            cols[c].append(_cell(flat.get(c), t))
+        size += 1
+        if size >= batch_rows:
+            yield pa.Table.from_pydict(cols, schema=schema)
+            cols = {c: [] for c in names}
+            size = 0
+    if size:
+        yield pa.Table.from_pydict(cols, schema=schema)
 
 def main():
-    rows = []
-    for fp in glob.glob(os.path.join(IN_DIR, "*.jsonl")):
-        with open(fp, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    d = json.loads(line)
-                except Exception:
-                    continue
-                rows.append(d)
-    if not rows:
+    schema, n = scan_schema(IN_DIR)
+    if not n:
         print("No rows.")
         return
-    df = pd.json_normalize(rows)
     os.makedirs(os.path.dirname(OUT_FLAT_CSV), exist_ok=True)
-    df.to_csv(OUT_FLAT_CSV, index=False)
-    try:
-        df.to_parquet(OUT_PARQUET, index=False)
-    except Exception:
-        pass
+    tmp_csv, tmp_pq = OUT_FLAT_CSV + ".tmp", OUT_PARQUET + ".tmp"
+    with open(tmp_csv, "w", encoding="utf-8", newline="") as fcsv, \
+            pq.ParquetWriter(tmp_pq, schema, compression="zstd") as writer:
+        w = csv.writer(fcsv)
+        w.writerow(schema.names)
+        for table in iter_batches(IN_DIR, schema):
+            writer.write_table(table)
+            w.writerows(zip(*(table.column(c).to_pylist() for c in schema.names)))
+    os.replace(tmp_csv, OUT_FLAT_CSV)
+    os.replace(tmp_pq, OUT_PARQUET)
+    print(f"Rows: {n}, columns: {len(schema)}")
     print("Saved:", OUT_FLAT_CSV)
     print("Saved:", OUT_PARQUET)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
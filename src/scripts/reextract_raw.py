@@ -0,0 +1,192 @@
+# src/scripts/reextract_raw.py
+# Chạy: python src/scripts/reextract_raw.py [--workers 8] [--force] [--limit N]
+"""
+Trích xuất lại text từ kho SHA-1 (outputs/raw/pdf) mà không cần crawl lại.
+
+Chọn các file chưa có {sha1}.txt hoặc có nhưng được tạo bởi EXTRACTOR_VERSION cũ hơn
+(theo outputs/raw/txt/_extract_manifest.jsonl), rồi trích xuất song song trên nhiều core.
+"""
+import argparse
+import itertools
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from tqdm import tqdm
+
+BASE = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE))
+from src.utils.doc_extract import (EXTRACTOR_VERSION, append_manifest, extract_job, load_manifest,
+                                   write_text_atomic)
+from src.utils.office_convert import OfficeServerPool, batch_docs_to_text, native_doc_tool, unoserver_available
+
+RAW_DIR = BASE / "outputs" / "raw" / "pdf"
+TXT_DIR = BASE / "outputs" / "raw" / "txt"
+EXTS = {".pdf", ".doc", ".docx"}
+SHA1_RE = re.compile(r"^[0-9a-f]{40}$")
+
+def find_stale(raw_dir: Path, txt_dir: Path, force: bool = False):
+    """(blob, txt_path, lý do) cho các blob cần trích xuất lại."""
+    manifest = load_manifest(txt_dir)
+    out = []
+    for p in sorted(raw_dir.iterdir()):
+        if p.suffix.lower() not in EXTS or not p.is_file():
+            continue
+        sha1 = p.stem
+        if not SHA1_RE.match(sha1):
+            continue        # không phải blob của kho SHA-1 (file copy tay, tên khác quy ước)
+        txt = txt_dir / f"{sha1}.txt"
+        rec = manifest.get(sha1)
+        if force:
+            out.append((p, txt, "force"))
+        elif not txt.exists():
+            out.append((p, txt, "missing"))
+        elif rec is None or int(rec.get("extractor_version", 0)) < EXTRACTOR_VERSION:
+            out.append((p, txt, "stale"))
+    return out
+
+def _record(item, res, txt_dir: Path, timings: list, failed: list):
+    p = item[0]
+    if res["error"]:
+        failed.append((p.name, res["error"]))
+        return
+    append_manifest(txt_dir, p.stem, str(p), res["text_len"], res["seconds"])
+    timings.append((res["seconds"], p.name, res["text_len"]))
+
+def _run_isolated(item, timeout: int):
+    """Chạy một file trong pool riêng 1 worker: worker chết thì chỉ file này lỗi."""
+    p, txt, _ = item
+    with ProcessPoolExecutor(max_workers=1) as ex:
+        try:
+            return ex.submit(extract_job, str(p), str(txt), timeout).result()
+        except BrokenProcessPool:
+            return {"text_len": None, "seconds": 0.0, "error": "worker crashed"}
+
+def run_pool(todo, txt_dir: Path, workers: int, timeout: int, timings: list, failed: list):
+    """
+    Trích xuất song song, mỗi lúc chỉ `workers` file nằm trong pool. Một worker chết (segfault, OOM kill...)
+    làm hỏng cả pool (BrokenProcessPool) → chạy lại riêng từng file đang dở để tìm đúng file gây lỗi,
+    ghi nó vào danh sách lỗi, rồi dựng pool mới và chạy tiếp phần còn lại.
+    """
+    items = iter(todo)
+    pbar = tqdm(total=len(todo), desc="Extract")
+    ex = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+
+    def refill():
+        for p, txt, r in itertools.islice(items, workers - len(pending)):
+            pending[ex.submit(extract_job, str(p), str(txt), timeout)] = (p, txt, r)
+
+    try:
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            suspects = []
+            for fut in done:
+                item = pending.pop(fut)
+                try:
+                    res = fut.result()
+                except BrokenProcessPool:
+                    suspects.append(item)
+                    continue
+                _record(item, res, txt_dir, timings, failed)
+                pbar.update()
+            if suspects:
+                # pool đã hỏng: mọi job còn lại cũng kết thúc với BrokenProcessPool (hoặc kết quả nếu kịp xong)
+                for fut in list(pending):
+                    item = pending.pop(fut)
+                    try:
+                        _record(item, fut.result(), txt_dir, timings, failed)
+                        pbar.update()
+                    except BrokenProcessPool:
+                        suspects.append(item)
+                ex.shutdown(wait=False, cancel_futures=True)
+                tqdm.write(f"Worker chết → chạy lại riêng {len(suspects)} file đang dở")
+                for item in suspects:
+                    res = _run_isolated(item, timeout)
+                    if res["error"] == "worker crashed":
+                        tqdm.write(f"  worker chết khi trích {item[0].name}")
+                    _record(item, res, txt_dir, timings, failed)
+                    pbar.update()
+                ex = ProcessPoolExecutor(max_workers=workers)
+            refill()
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+        pbar.close()
+
+def run_doc_batch(docs, txt_dir: Path, workers: int, timings: list) -> set:
+    """Không có unoserver: convert .doc theo lô (vài lần khởi động soffice thay vì mỗi file một lần)."""
+    t0 = time.perf_counter()
+    converted = batch_docs_to_text(docs, workers=workers)
+    per_file = round((time.perf_counter() - t0) / max(1, len(docs)), 3)
+    print(f"LibreOffice batch: {len(converted)}/{len(docs)} .doc, ~{per_file}s/file")
+    for p, text in converted.items():
+        write_text_atomic(txt_dir / f"{p.stem}.txt", text)
+        append_manifest(txt_dir, p.stem, str(p), len(text), per_file)
+        timings.append((per_file, p.name, len(text)))
+    return set(converted)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw_dir", default=str(RAW_DIR))
+    ap.add_argument("--txt_dir", default=str(TXT_DIR))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--timeout", type=int, default=300, help="Timeout (giây) cho mỗi file")
+    ap.add_argument("--force", action="store_true", help="Trích xuất lại toàn bộ, bỏ qua manifest")
+    ap.add_argument("--limit", type=int, default=0, help="Chỉ xử lý N file đầu (0 = tất cả)")
+    ap.add_argument("--dry_run", action="store_true", help="Chỉ liệt kê, không trích xuất")
+    ap.add_argument("--lo_servers", type=int, default=2,
+                    help="Số LibreOffice giữ ấm (unoserver) / soffice song song cho .doc; 0 = tắt")
+    args = ap.parse_args()
+
+    raw_dir, txt_dir = Path(args.raw_dir), Path(args.txt_dir)
+    txt_dir.mkdir(parents=True, exist_ok=True)
+    todo = find_stale(raw_dir, txt_dir, args.force)
+    if args.limit:
+        todo = todo[:args.limit]
+    reasons = {}
+    for _, _, r in todo:
+        reasons[r] = reasons.get(r, 0) + 1
+    print(f"extractor v{EXTRACTOR_VERSION}: {len(todo)} file cần trích xuất {reasons}")
+    if args.dry_run or not todo:
+        for p, _, r in todo:
+            print(f"  [{r}] {p.name}")
+        return
+
+    t0 = time.perf_counter()
+    timings, failed = [], []
+
+    # không có antiword/catdoc → mọi .doc đều rơi xuống LibreOffice
+    lo_pool = None
+    docs = [p for p, _, _ in todo if p.suffix.lower() == ".doc"]
+    if docs and args.lo_servers > 0 and not native_doc_tool():
+        if unoserver_available():
+            # export LO_UNO_PORTS trước khi tạo process pool để worker kế thừa
+            lo_pool = OfficeServerPool(args.lo_servers).start()
+        else:
+            done = run_doc_batch(docs, txt_dir, args.lo_servers, timings)
+            todo = [t for t in todo if t[0] not in done]
+    try:
+        if todo:
+            run_pool(todo, txt_dir, args.workers, args.timeout, timings, failed)
+    finally:
+        if lo_pool:
+            lo_pool.stop()
+
+    wall = time.perf_counter() - t0
+    cpu = sum(t for t, _, _ in timings)
+    print(f"Done: {len(timings)} ok, {len(failed)} failed, wall {wall:.1f}s, tổng thời gian file {cpu:.1f}s")
+    empty = sum(1 for _, _, n in timings if n == 0)
+    if empty:
+        print(f"  {empty} file ra text rỗng (có thể là PDF scan)")
+    for secs, name, n in sorted(timings, reverse=True)[:10]:
+        print(f"  {secs:7.2f}s  {name}  len={n}")
+    for name, err in failed:
+        print(f"  FAILED {name}: {err}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Lớp truy vấn DuckDB cho dashboard: bộ lọc agency / khoảng ngày / law_id / từ khóa chạy thành câu SQL
+trên bảng dòng thay vì copy + lọc cả DataFrame trong bộ nhớ.
+
+build_db() (gọi từ scripts/build_dashboard_cubes.py) nạp rows.parquet vào cubes/dashboard.duckdb,
+sắp theo published_dt (zonemap → lọc ngày bỏ qua được cả khối) và tạo chỉ mục FTS cho text_all nếu
+có extension fts. Không có file .duckdb → DashStore đọc thẳng rows.parquet (vẫn đẩy bộ lọc xuống scan).
+Tìm theo chữ mặc định là chuỗi con không phân biệt hoa thường (như bản pandas: "thảo" khớp "dự thảo",
+"thuế" khớp "thuếGTGT"); whole_words=True dùng chỉ mục FTS (nhanh hơn nhưng chỉ khớp nguyên từ — tokenizer
+không stem) và tự lùi về chuỗi con khi không có FTS.
+
+KPI/biểu đồ lấy từ cube() (GROUP BY trong SQL), bảng chi tiết lấy từng trang bằng rows(limit, offset):
+dashboard không phải kéo cả tập dòng đã lọc vào pandas ở mỗi lần rerun.
+
+Một DashStore dùng chung cho mọi phiên Streamlit (mỗi phiên một thread) nên mỗi truy vấn chạy trên
+cursor riêng (con.cursor()) — kết nối DuckDB không an toàn khi nhiều thread dùng cùng lúc.
+"""
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from src.utils.doc_meta import CUBE_DIMS
+
+import duckdb
+import pandas as pd
+
+DB_NAME = "dashboard.duckdb"
+ROWS_NAME = "rows.parquet"
+
+def _sql_str(s):
+    return "'" + str(s).replace("'", "''") + "'"
+
+def _load_fts(con) -> bool:
+    try:
+        con.execute("LOAD fts")
+        return True
+    except duckdb.Error:
+        try:
+            con.execute("INSTALL fts")
+            con.execute("LOAD fts")
+            return True
+        except duckdb.Error:
+            return False
+
+def build_db(cube_dir: str) -> bool:
+    """Dựng cube_dir/dashboard.duckdb từ cube_dir/rows.parquet; trả về True nếu có chỉ mục FTS."""
+    path = os.path.join(cube_dir, DB_NAME)
+    tmp = path + ".tmp"
+    for p in (tmp, tmp + ".wal"):
+        if os.path.exists(p):
+            os.remove(p)
+    con = duckdb.connect(tmp)
+    try:
+        con.execute(
+            "CREATE TABLE rows AS SELECT row_number() OVER (ORDER BY published_dt) AS row_id, * "
+            f"FROM read_parquet({_sql_str(os.path.join(cube_dir, ROWS_NAME))}) ORDER BY published_dt"
+        )
+        fts = _load_fts(con)
+        if fts:
+            # tách từ theo chữ/số Unicode (mặc định chỉ giữ a-z → mất hết chữ có dấu), không stem tiếng Anh
+            con.execute(
+                "PRAGMA create_fts_index('rows', 'row_id', 'text_all', stemmer='none', stopwords='none', "
+                "ignore='[^\\p{L}\\p{N}]+', strip_accents=0, lower=1, overwrite=1)"
+            )
+        con.execute("CREATE TABLE _meta AS SELECT ? AS fts", [fts])
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return fts
+
+class DashStore:
+    def __init__(self, cube_dir: str):
+        db = os.path.join(cube_dir, DB_NAME)
+        self._lock = threading.Lock()
+        if os.path.exists(db):
+            self.con = duckdb.connect(db, read_only=True)
+            self.src = "rows"
+            self.fts = bool(self.con.execute("SELECT fts FROM _meta").fetchone()[0]) and _load_fts(self.con)
+        else:
+            self.con = duckdb.connect()
+            self.src = f"read_parquet({_sql_str(os.path.join(cube_dir, ROWS_NAME))})"
+            self.fts = False
+        with self._cursor() as cur:
+            self.columns = [r[0] for r in cur.execute(f"DESCRIBE SELECT * FROM {self.src}").fetchall()]
+
+    def close(self):
+        self.con.close()
+
+    def _cursor(self):
+        with self._lock:
+            return self.con.cursor()
+
+    def _where(self, agencies: Optional[Sequence[str]] = None, d_from=None, d_to=None,
+               law_ids: Optional[Sequence[str]] = None, q: str = "",
+               whole_words: bool = False) -> Tuple[str, list]:
+        conds, params = [], []
+        if agencies is not None:
+            if not agencies:
+                return "WHERE false", []
+            conds.append(f"agency IN ({','.join('?' * len(agencies))})")
+            params += list(agencies)
+        # NULL published_dt bị loại như bản pandas (fillna 1970/2100 rồi so sánh)
+        if d_from is not None:
+            conds.append("published_dt >= ?")
+            params.append(pd.Timestamp(d_from).to_pydatetime())
+        if d_to is not None:
+            conds.append("published_dt <= ?")
+            params.append(pd.Timestamp(d_to).to_pydatetime())
+        if law_ids:
+            conds.append(f"law_id IN ({','.join('?' * len(law_ids))})")
+            params += list(law_ids)
+        if q:
+            if whole_words and self.fts:
+                conds.append("fts_main_rows.match_bm25(row_id, ?, conjunctive := 1) IS NOT NULL")
+            else:
+                conds.append("contains(lower(text_all), lower(?))")
+            params.append(q)
+        return ("WHERE " + " AND ".join(conds)) if conds else "", params
+
+    def rows(self, columns: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0,
+             **filters) -> pd.DataFrame:
+        cols = ", ".join(f'"{c}"' for c in columns if c in self.columns) if columns else "*"
+        where, params = self._where(**filters)
+        # row_id giữ thứ tự ổn định giữa các trang khi nhiều dòng trùng published_dt
+        order = "published_dt, row_id" if "row_id" in self.columns else "published_dt"
+        sql = f"SELECT {cols} FROM {self.src} {where} ORDER BY {order}"
+        if limit:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._cursor() as cur:
+            df = cur.execute(sql, params).df()
+        return df.drop(columns=["row_id"], errors="ignore")
+
+    def cube(self, freq: str, **filters) -> pd.DataFrame:
+        """
+        Như doc_meta.build_cube(self.rows(**filters), freq) nhưng GROUP BY ngay trong DuckDB.
+        Kỳ tuần W-SUN: date_trunc('week') là thứ Hai (ISO) → nhãn = Chủ nhật cuối tuần; tháng: ngày cuối tháng.
+        """
+        dt = "CAST(published_dt AS TIMESTAMP)"
+        if freq == "W":
+            start = f"date_trunc('week', {dt})"
+            label = f"{start} + INTERVAL 6 DAY"
+        else:
+            start = f"date_trunc('month', {dt})"
+            label = f"CAST(last_day({dt}) AS TIMESTAMP)"
+        dims = {"period": label, "period_start": f"CAST({start} AS TIMESTAMP)"}
+        for col in CUBE_DIMS[2:]:
+            dims[col] = f'"{col}"' if col in self.columns else "CAST(NULL AS VARCHAR)"
+        select = ", ".join(f"{expr} AS {name}" for name, expr in dims.items())
+        where, params = self._where(**filters)
+        with self._cursor() as cur:
+            df = cur.execute(
+                f"SELECT {select}, count(*) AS count FROM {self.src} {where} GROUP BY ALL", params).df()
+        df["count"] = df["count"].astype("int64")
+        return df
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._cursor() as cur:
+            return cur.execute(f"SELECT count(*) FROM {self.src} {where}", params).fetchone()[0]
+
+    def distinct(self, col: str) -> List[str]:
+        with self._cursor() as cur:
+            return [r[0] for r in cur.execute(
+                f'SELECT DISTINCT "{col}" FROM {self.src} WHERE "{col}" IS NOT NULL ORDER BY 1').fetchall()]
+
+    def date_bounds(self):
+        with self._cursor() as cur:
+            lo, hi = cur.execute(f"SELECT min(published_dt), max(published_dt) FROM {self.src}").fetchone()
+        return pd.Timestamp(lo) if lo is not None else pd.NaT, pd.Timestamp(hi) if hi is not None else pd.NaT
@@ -0,0 +1,318 @@
+# src/utils/doc_extract.py
+"""
+Trích xuất text từ file đính kèm (.pdf / .docx / .doc) trong kho SHA-1 (outputs/raw/pdf).
+
+Tách khỏi crawler để chạy được trong ProcessPoolExecutor: `extract_to_file` là entrypoint cho
+worker — trích xuất, ghi {sha1}.txt rồi trả về độ dài text, có timeout cho từng file.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pdfplumber
+
+# ======== Import tùy chọn ========
+HAS_PYMUPDF = True
+try:
+    import pymupdf
+except Exception:
+    HAS_PYMUPDF = False
+
+HAS_OCR = True
+try:
+    import pytesseract
+    from PIL import Image
+    if not shutil.which("tesseract"):
+        HAS_OCR = False
+except Exception:
+    HAS_OCR = False
+
+from src.utils.office_convert import (doc_to_text_via_server, doc_to_text_via_soffice, native_doc_tool,
+                                      soffice_bin)
+
+logger = logging.getLogger("crawler.extract")
+
+SUBPROCESS_TIMEOUT_S = 120   # antiword/catdoc/soffice treo thì bỏ
+
+# Tăng mỗi khi đổi logic trích xuất → scripts/reextract_raw.py coi các .txt cũ là stale
+EXTRACTOR_VERSION = 2            # v2: PyMuPDF + OCR các trang không có text layer
+
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "auto")   # auto | pymupdf | pdfplumber
+PAGE_WORKERS = int(os.environ.get("EXTRACT_PAGE_WORKERS", "2"))  # process con cho PDF lớn / OCR
+LARGE_PDF_PAGES = 60             # từ số trang này thì chia trang cho PAGE_WORKERS process
+PAGE_CHUNK = 20                  # số trang mỗi phần khi chia
+OCR_DPI = 300
+OCR_LANG = "vie+eng"
+OCR_MIN_CHARS = 20               # trang ít ký tự hơn ngưỡng này coi như không có text layer (scan)
+MANIFEST_NAME = "_extract_manifest.jsonl"   # nằm trong thư mục txt, mỗi dòng 1 lần trích xuất
+
+def _clean(text: str) -> str:
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _terminate_pool(ex: ProcessPoolExecutor, futs: Sequence[Future]):
+    """Hủy các job chưa chạy và kill process con đang chạy (shutdown(wait=False) để chúng chạy tiếp)."""
+    for f in futs:
+        f.cancel()
+    if hasattr(ex, "terminate_workers"):      # Python 3.14+
+        ex.terminate_workers()
+        return
+    procs = list((getattr(ex, "_processes", None) or {}).values())
+    ex.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+    for p in procs:
+        p.join(1)
+        if p.is_alive():
+            p.kill()
+
+def _pool_map(fn: Callable, jobs: Sequence[tuple], workers: int) -> List[Any]:
+    """map song song trên process con; bị ngắt (timeout) thì hủy job còn lại và dừng luôn các process con."""
+    ex = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    futs = [ex.submit(fn, *job) for job in jobs]
+    try:
+        out = [f.result() for f in futs]
+    except BaseException:
+        _terminate_pool(ex, futs)
+        raise
+    ex.shutdown(wait=True)
+    return out
+
+def _pymupdf_pages(pdf_path: str, start: int, stop: int) -> List[str]:
+    with pymupdf.open(pdf_path) as doc:
+        return [doc[i].get_text("text") or "" for i in range(start, stop)]
+
+def _ocr_page(pdf_path: str, pno: int) -> str:
+    with pymupdf.open(pdf_path) as doc:
+        pix = doc[pno].get_pixmap(dpi=OCR_DPI)
+    img = Image.open(BytesIO(pix.tobytes("png")))
+    return pytesseract.image_to_string(img, lang=OCR_LANG) or ""
+
+def pdf_to_text_pymupdf(pdf_path: Path) -> str:
+    """
+    PyMuPDF: PDF lớn thì chia dải trang cho PAGE_WORKERS process; trang không có text layer
+    (PDF scan) thì OCR riêng từng trang đó — song song — thay vì OCR cả văn bản.
+    """
+    path = str(pdf_path)
+    with pymupdf.open(path) as doc:
+        n = doc.page_count
+    if n >= LARGE_PDF_PAGES and PAGE_WORKERS > 1:
+        jobs = [(path, i, min(i + PAGE_CHUNK, n)) for i in range(0, n, PAGE_CHUNK)]
+        pages = [t for part in _pool_map(_pymupdf_pages, jobs, PAGE_WORKERS) for t in part]
+    else:
+        pages = _pymupdf_pages(path, 0, n)
+
+    empty = [i for i, t in enumerate(pages) if len(t.strip()) < OCR_MIN_CHARS]
+    if empty and HAS_OCR:
+        if len(empty) > 1 and PAGE_WORKERS > 1:
+            ocr = _pool_map(_ocr_page, [(path, i) for i in empty], PAGE_WORKERS)
+        else:
+            ocr = [_ocr_page(path, i) for i in empty]
+        for i, t in zip(empty, ocr):
+            pages[i] = t
+        logger.info(f"OCR {len(empty)}/{n} trang: {pdf_path.name}")
+    return _clean("\n".join(pages))
+
+def pdf_to_text_pdfplumber(pdf_path: Path) -> str:
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+    except Exception as e:
+        logger.warning(f"PDF to text failed for {pdf_path.name}: {e}")
+        return ""
+
+def pdf_to_text(pdf_path: Path) -> str:
+    """PyMuPDF trước (nhanh hơn nhiều lần), lỗi hoặc không có PyMuPDF thì dùng pdfplumber."""
+    if HAS_PYMUPDF and PDF_BACKEND != "pdfplumber":
+        try:
+            return pdf_to_text_pymupdf(pdf_path)
+        except Exception as e:
+            logger.warning(f"PyMuPDF failed for {pdf_path.name}: {e} → pdfplumber")
+    return pdf_to_text_pdfplumber(pdf_path)
+
+def docx_to_text(docx_path: Path) -> str:
+    try:
+        from docx import Document
+        doc = Document(str(docx_path))
+        parts = []
+        for p in doc.paragraphs:
+            if p.text:
+                parts.append(p.text)
+        # bảng (table) – lấy text từng ô (tuỳ file có thể bỏ)
+        for table in doc.tables:
+            for row in table.rows:
+                row_txt = "\t".join(cell.text.strip() for cell in row.cells)
+                if row_txt.strip():
+                    parts.append(row_txt)
+        text = "\n".join(parts)
+        text = re.sub(r"\n{3,}", "\n\n", text)
+        return text.strip()
+    except Exception as e:
+        logger.warning(f"DOCX to text failed for {docx_path.name}: {e}")
+        return ""
+
+def doc_to_text_via_antiword(doc_path: Path) -> Optional[str]:
+    """Dùng antiword nếu có."""
+    if shutil.which("antiword"):
+        try:
+            res = subprocess.run(
+                ["antiword", "-m", "UTF-8.txt", str(doc_path)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+                timeout=SUBPROCESS_TIMEOUT_S,
+            )
+            return res.stdout.decode("utf-8", errors="ignore").strip()
+        except Exception as e:
+            logger.warning(f"antiword failed for {doc_path.name}: {e}")
+    return None
+
+def doc_to_text_via_catdoc(doc_path: Path) -> Optional[str]:
+    """Dùng catdoc nếu có."""
+    if shutil.which("catdoc"):
+        try:
+            res = subprocess.run(
+                ["catdoc", "-w", str(doc_path)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+                timeout=SUBPROCESS_TIMEOUT_S,
+            )
+            return res.stdout.decode("utf-8", errors="ignore").strip()
+        except Exception as e:
+            logger.warning(f"catdoc failed for {doc_path.name}: {e}")
+    return None
+
+def doc_to_text_via_libreoffice(doc_path: Path) -> Optional[str]:
+    """
+    Dự phòng cuối: dùng LibreOffice để convert .doc -> .txt (output vào thư mục tạm).
+    Có unoserver đang chạy (LO_UNO_PORTS) thì gửi qua server ấm, không thì khởi động soffice riêng.
+    """
+    if not soffice_bin():
+        return None
+    return doc_to_text_via_server(doc_path) or doc_to_text_via_soffice(doc_path)
+
+def doc_to_text(doc_path: Path) -> str:
+    """
+    Chiến lược: antiword -> catdoc -> (dự phòng) LibreOffice.
+    """
+    for fn in (doc_to_text_via_antiword, doc_to_text_via_catdoc, doc_to_text_via_libreoffice):
+        txt = fn(doc_path)
+        if txt:
+            return txt
+    logger.warning(f"No available tool to extract .doc for {doc_path.name}")
+    return ""
+
+def extractor_available(local_path: Path) -> bool:
+    """False khi máy không có công cụ nào đọc được loại file này (hiện chỉ .doc: antiword/catdoc/soffice)."""
+    if local_path.suffix.lower() == ".doc":
+        return native_doc_tool() or bool(soffice_bin())
+    return True
+
+def extract_text_generic(local_path: Path) -> str:
+    suf = local_path.suffix.lower()
+    if suf == ".pdf":
+        return pdf_to_text(local_path)
+    if suf == ".docx":
+        return docx_to_text(local_path)
+    if suf == ".doc":
+        return doc_to_text(local_path)
+    # có thể mở rộng .rtf/.zip... nếu cần
+    return ""
+
+# =============================
+# Entry point cho process pool
+# =============================
+class ExtractTimeout(BaseException):
+    # BaseException: các hàm trích xuất ở trên bắt `Exception` rồi trả "" — timeout không được bị nuốt
+    pass
+
+def _on_alarm(signum, frame):
+    raise ExtractTimeout()
+
+def write_text_atomic(txt_path: Path, text: str):
+    fd, tmp = tempfile.mkstemp(dir=txt_path.parent, suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, txt_path)
+
+def extract_to_file(local_path: str, txt_path: str, timeout_s: Optional[int] = None) -> int:
+    """
+    Trích xuất `local_path` rồi ghi ra `txt_path` (ghi nguyên tử); trả về độ dài text.
+    `timeout_s`: SIGALRM ngắt file chạy quá lâu ngay trong worker (chỉ trên Unix) → ExtractTimeout,
+    để worker được giải phóng thay vì kẹt cả pool.
+    """
+    use_alarm = bool(timeout_s) and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        old = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(int(timeout_s))
+    try:
+        text = extract_text_generic(Path(local_path)) or ""
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+    write_text_atomic(Path(txt_path), text)
+    return len(text)
+
+def extract_job(local_path: str, txt_path: str, timeout_s: Optional[int] = None) -> Dict[str, Any]:
+    """Như extract_to_file nhưng không raise: trả về text_len, thời gian chạy và lỗi (nếu có)."""
+    t0 = time.perf_counter()
+    try:
+        n, err = extract_to_file(local_path, txt_path, timeout_s), None
+    except ExtractTimeout:
+        n, err = None, f"timeout after {timeout_s}s"
+    except Exception as e:
+        n, err = None, str(e)
+    return {"text_len": n, "seconds": round(time.perf_counter() - t0, 3), "error": err}
+
+# =============================
+# Manifest: sha1 → phiên bản extractor đã tạo ra {sha1}.txt
+# =============================
+def manifest_path(txt_dir: Path) -> Path:
+    return txt_dir / MANIFEST_NAME
+
+def load_manifest(txt_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Đọc manifest (append-only, dòng sau ghi đè dòng trước cùng sha1); bỏ qua dòng hỏng."""
+    out: Dict[str, Dict[str, Any]] = {}
+    p = manifest_path(txt_dir)
+    if not p.exists():
+        return out
+    with p.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if rec.get("sha1"):
+                out[rec["sha1"]] = rec
+    return out
+
+def append_manifest(txt_dir: Path, sha1: str, source: str, text_len: int, seconds: float) -> bool:
+    """
+    Ghi một dòng manifest; trả về False (không ghi) khi text rỗng vì thiếu công cụ trích xuất —
+    để lần chạy reextract sau khi cài antiword/catdoc/soffice vẫn coi file đó là stale.
+    """
+    if not text_len and not extractor_available(Path(source)):
+        return False
+    rec = {
+        "sha1": sha1,
+        "source": Path(source).name,
+        "extractor_version": EXTRACTOR_VERSION,
+        "text_len": text_len,
+        "seconds": seconds,
+        "extracted_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with manifest_path(txt_dir).open("a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return True
@@ -0,0 +1,234 @@
+# src/utils/doc_identity.py
+"""
+Chỉ mục định danh văn bản dùng chung cho cả pipeline (outputs/state/doc_identity.sqlite).
+
+Mỗi khóa — "sha1:<hex>" (nội dung file), "so:<số hiệu chuẩn hóa>", "url:<URL chuẩn hóa>" — là một nút
+union-find; các khóa cùng thuộc một văn bản được gộp lại. ID chuẩn của văn bản là khóa gốc, tức khóa
+đăng ký sớm nhất trong nhóm, nên ID của văn bản đã có không đổi khi gộp thêm bản từ nguồn khác.
+
+Bảng doc_done ghi văn bản (theo ID chuẩn) đã qua bước nào ("extract", "mine"...), kèm sha1 nội dung.
+Nhóm theo số hiệu gồm cả các bản dự thảo / sửa đổi cùng số nên bước làm trên nội dung (trích xuất) hỏi
+theo sha1 — chỉ bỏ qua khi đúng nội dung đó đã xử lý; bước làm trên cả văn bản (tìm thảo luận, cảm xúc)
+hỏi theo nhóm → cùng một Nghị định lấy từ CP/MST/QH chỉ xử lý một lần.
+"""
+from __future__ import annotations
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .doc_meta import normalize_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS doc_key (
+    key     TEXT PRIMARY KEY,
+    parent  TEXT NOT NULL,           -- parent = key → gốc
+    seq     INTEGER NOT NULL         -- thứ tự đăng ký; gốc mới = khóa cũ hơn
+);
+CREATE TABLE IF NOT EXISTS doc_done (
+    doc_id  TEXT NOT NULL,           -- khóa gốc tại thời điểm ghi (được dời khi gộp nhóm)
+    stage   TEXT NOT NULL,
+    sha1    TEXT NOT NULL DEFAULT '',-- nội dung đã xử lý ('' = không gắn với bản cụ thể)
+    ref     TEXT,                    -- kết quả của bước, vd đường dẫn txt
+    at      REAL NOT NULL,
+    PRIMARY KEY (doc_id, stage, sha1)
+);
+"""
+
+SHA1_RE = re.compile(r"^[0-9a-f]{40}$")
+_SO_HIEU = r"([0-9]+\s*/\s*(?:[0-9]{4}\s*/\s*)?[A-Za-zĐđ0-9]+(?:\s*[-‐-―]\s*[A-Za-zĐđ0-9]+)*)"
+# "Số: 260/2025/NĐ-CP" ở phần đầu văn bản (dự thảo thường để trống số: "Số: /TTr-BTC" → không khớp)
+SO_HIEU_HEAD_RE = re.compile(r"\bSố\s*[:.]?\s*" + _SO_HIEU)
+# trường metadata trên trang chi tiết: "Số hiệu: ...", "Số ký hiệu: ...", "Ký hiệu văn bản: ..."
+SO_HIEU_FIELD_RE = re.compile(r"\b(?:Số\s*(?:ký\s*)?hiệu|Ký\s*hiệu)(?:\s*văn\s*bản)?\s*[:.]?\s*" + _SO_HIEU,
+                              re.IGNORECASE)
+# tiêu đề bắt đầu bằng loại + số của chính văn bản: "Nghị định 260/2025/NĐ-CP quy định ..."
+SO_HIEU_TITLE_RE = re.compile(
+    r"^\s*(?:Luật|Pháp\s*lệnh|Nghị\s*định|Nghị\s*quyết|Thông\s*tư|Quyết\s*định|Chỉ\s*thị)"
+    r"\s+(?:số\s*)?" + _SO_HIEU, re.IGNORECASE)
+HEAD_CHARS = 2000
+
+def norm_so_hieu(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return None
+    s = unicodedata.normalize("NFC", str(s)).upper()
+    s = re.sub(r"[‐-―]", "-", s)
+    s = re.sub(r"\s+", "", s)
+    return s or None
+
+def norm_doc_url(u: Optional[str]) -> Optional[str]:
+    if not u:
+        return None
+    u = normalize_url(u).split("#", 1)[0]
+    m = re.match(r"(https?://)([^/]+)(.*)", u)
+    if m:
+        u = m.group(1) + m.group(2).lower() + m.group(3)
+    return u.rstrip("/") or None
+
+def so_hieu_from_text(text: str) -> Optional[str]:
+    """Số hiệu của chính văn bản (dòng "Số: ..." ở đầu), không lấy các văn bản được viện dẫn phía dưới."""
+    m = SO_HIEU_HEAD_RE.search(text[:HEAD_CHARS])
+    return norm_so_hieu(m.group(1)) if m else None
+
+def so_hieu_from_meta(title: str = "", text: str = "") -> Optional[str]:
+    """
+    Số hiệu từ metadata trang chi tiết (danh sách/chi tiết của nguồn): trường "Số hiệu"/"Ký hiệu" trong
+    `text`, không có thì lấy từ đầu `title`. Chỉ nhận số ở đầu tiêu đề — "Nghị định sửa đổi Nghị định
+    15/2020/NĐ-CP" là văn bản khác, không được gộp với 15/2020/NĐ-CP.
+    """
+    m = SO_HIEU_FIELD_RE.search(text or "") or SO_HIEU_TITLE_RE.match(title or "")
+    return norm_so_hieu(m.group(1)) if m else None
+
+def keys_for(sha1: Optional[str] = None, so_hieu: Optional[str] = None, urls: Iterable[str] = ()) -> List[str]:
+    keys = []
+    if sha1:
+        keys.append(f"sha1:{sha1.lower()}")
+    so = norm_so_hieu(so_hieu)
+    if so:
+        keys.append(f"so:{so}")
+    for u in urls:
+        nu = norm_doc_url(u)
+        if nu:
+            keys.append(f"url:{nu}")
+    return list(dict.fromkeys(keys))
+
+def sha1_of_path(path: str) -> Optional[str]:
+    """Tên file dạng {sha1}.txt (crawler) → sha1; tên khác → None."""
+    stem = Path(path).stem.lower()
+    return stem if SHA1_RE.match(stem) else None
+
+class DocIdentity:
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        """DB cũ: doc_done chưa có cột sha1 → dựng lại bảng, sha1 lấy từ tên file txt trong ref."""
+        cols = [r[1] for r in self.conn.execute("PRAGMA table_info(doc_done)")]
+        if not cols or "sha1" in cols:
+            return
+        rows = self.conn.execute("SELECT doc_id, stage, ref, at FROM doc_done").fetchall()
+        self.conn.execute("DROP TABLE doc_done")
+        self.conn.executescript(SCHEMA)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO doc_done(doc_id, stage, sha1, ref, at) VALUES (?,?,?,?,?)",
+            [(d, st, (sha1_of_path(ref) if ref else None) or "", ref, at) for d, st, ref, at in rows],
+        )
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- union-find ----------
+    def _find(self, key: str) -> Optional[str]:
+        path = []
+        cur = key
+        while True:
+            row = self.conn.execute("SELECT parent FROM doc_key WHERE key=?", (cur,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == cur:
+                break
+            path.append(cur)
+            cur = row[0]
+        for k in path[:-1]:     # nén đường đi
+            self.conn.execute("UPDATE doc_key SET parent=? WHERE key=?", (cur, k))
+        return cur
+
+    def _seq(self, key: str) -> int:
+        return self.conn.execute("SELECT seq FROM doc_key WHERE key=?", (key,)).fetchone()[0]
+
+    def _union(self, a: str, b: str) -> str:
+        if a == b:
+            return a
+        root, child = (a, b) if self._seq(a) <= self._seq(b) else (b, a)
+        self.conn.execute("UPDATE doc_key SET parent=? WHERE key=?", (root, child))
+        # trạng thái đã xử lý đi theo gốc mới; gốc cũ đã có thì giữ
+        self.conn.execute("UPDATE OR IGNORE doc_done SET doc_id=? WHERE doc_id=?", (root, child))
+        self.conn.execute("DELETE FROM doc_done WHERE doc_id=?", (child,))
+        return root
+
+    # ---------- API ----------
+    def link(self, sha1: Optional[str] = None, so_hieu: Optional[str] = None, urls: Iterable[str] = ()) -> Optional[str]:
+        """Đăng ký các khóa của một văn bản, gộp với nhóm đã có; trả về ID chuẩn (None nếu không có khóa nào)."""
+        keys = keys_for(sha1, so_hieu, urls)
+        if not keys:
+            return None
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                root = None
+                for k in keys:
+                    r = self._find(k)
+                    if r is None:
+                        seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM doc_key").fetchone()[0]
+                        self.conn.execute("INSERT INTO doc_key(key, parent, seq) VALUES (?,?,?)", (k, k, seq))
+                        r = k
+                    root = r if root is None else self._union(root, r)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return root
+
+    def lookup(self, sha1: Optional[str] = None, so_hieu: Optional[str] = None, urls: Iterable[str] = ()) -> Optional[str]:
+        """ID chuẩn nếu một trong các khóa đã được đăng ký (không ghi gì)."""
+        with self._lock:
+            for k in keys_for(sha1, so_hieu, urls):
+                r = self._find(k)
+                if r is not None:
+                    return r
+        return None
+
+    def done(self, doc_id: str, stage: str, sha1: Optional[str] = None) -> Optional[str]:
+        """
+        ref của bước `stage` nếu văn bản (hoặc bản trùng của nó) đã xử lý; None nếu chưa.
+        Có `sha1` → chỉ tính lần xử lý đúng nội dung đó (bản khác cùng số hiệu không tính).
+        """
+        with self._lock:
+            root = self._find(doc_id) or doc_id
+            sql, params = "SELECT ref FROM doc_done WHERE doc_id=? AND stage=?", [root, stage]
+            if sha1:
+                sql += " AND sha1=?"
+                params.append(sha1.lower())
+            row = self.conn.execute(sql + " ORDER BY at DESC LIMIT 1", params).fetchone()
+        return None if row is None else (row[0] or "")
+
+    def mark_done(self, doc_id: str, stage: str, ref: Optional[str] = None, sha1: Optional[str] = None):
+        with self._lock:
+            root = self._find(doc_id) or doc_id
+            self.conn.execute(
+                "INSERT OR REPLACE INTO doc_done(doc_id, stage, sha1, ref, at) VALUES (?,?,?,?,?)",
+                (root, stage, (sha1 or "").lower(), ref, time.time()),
+            )
+
+    def link_text_file(self, path: str, urls: Iterable[str] = ()) -> Optional[str]:
+        """
+        ID chuẩn cho một file txt đã trích: sha1 từ tên file + số hiệu đọc ở đầu nội dung (nếu có —
+        dự thảo thường chưa có số, khi đó nhóm dựa vào URL / số hiệu từ metadata mà crawler đã link).
+        """
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                head = f.read(HEAD_CHARS)
+        except OSError:
+            head = ""
+        # file không theo quy ước {sha1}.txt và không có số hiệu → khóa theo tên file
+        return (self.link(sha1_of_path(path), so_hieu_from_text(head), urls)
+                or self._link_raw(f"file:{os.path.basename(path)}"))
+
+    def _link_raw(self, key: str) -> str:
+        with self._lock:
+            r = self._find(key)
+            if r is None:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM doc_key").fetchone()[0]
+                self.conn.execute("INSERT INTO doc_key(key, parent, seq) VALUES (?,?,?)", (key, key, seq))
+                r = key
+        return r
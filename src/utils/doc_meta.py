@@ -0,0 +1,145 @@
+# src/utils/doc_meta.py
+"""
+Metadata suy ra từ một dòng thảo luận: thời gian, đơn vị ban hành, mã văn bản, URL chuẩn hóa.
+Dùng chung cho dashboard và bước tổng hợp cube (scripts/build_dashboard_cubes.py).
+"""
+from __future__ import annotations
+import re
+import numpy as np
+import pandas as pd
+
+LOCAL_TZ = "Asia/Ho_Chi_Minh"
+UNKNOWN_AGENCY = "Khác/Không rõ"
+
+AGENCY_HINTS = {
+    r"\bttg\b": "Thủ tướng Chính phủ",
+    r"\bcp\b": "Chính phủ",
+    r"\bbkhcn\b": "Bộ KH&CN",
+    r"\bbtc\b": "Bộ Tài chính",
+    r"\bbqp\b": "Bộ Quốc phòng",
+    r"\bbgd&dt\b|\bbgd\b": "Bộ GD&ĐT",
+    r"\bmoj\b|\bbtp\b": "Bộ Tư pháp",
+    r"\bbcvt\b|\bboxntt\b": "Bộ TT&TT",
+    r"\bbkh&dt\b|\bbkhdt\b": "Bộ KH&ĐT",
+    r"\bmoit\b|\bbct\b": "Bộ Công Thương",
+    r"\bbnn&ptnt\b|\bbnn\b": "Bộ NN&PTNT",
+    r"\bgiao thông\b|\bbgtvt\b": "Bộ GTVT",
+}
+AGENCY_TOKENS = {
+    "TTG":"Thủ tướng Chính phủ", "CP":"Chính phủ", "BTC":"Bộ Tài chính",
+    "BKHCN":"Bộ KH&CN", "BQP":"Bộ Quốc phòng", "BGD":"Bộ GD&ĐT",
+    "MOJ":"Bộ Tư pháp", "BCT":"Bộ Công Thương", "MOIT":"Bộ Công Thương",
+    "BNN":"Bộ NN&PTNT", "GTVT":"Bộ GTVT"
+}
+AGENCY_TOKEN_PAT = re.compile(r"[-_/](ttg|cp|btc|bkhcn|bqp|bgd|moj|btp|bct|moit|bnn|gtvt)[-_.]")
+LAW_PAT = re.compile(r"\b(\d{2,4}[-_/]?(ttg|cp|btc|bkhcn|bqp|bgd|moj|btp|bct|moit|bnn|gtvt))\b", re.I)
+
+def to_dt(x):
+    """Parse về datetime; convert sang LOCAL_TZ rồi bỏ tz (naive)."""
+    dt = pd.to_datetime(x, errors="coerce", utc=True)
+    if pd.isna(dt):
+        return pd.NaT
+    try:
+        dt = dt.tz_convert(LOCAL_TZ)
+    except Exception:
+        try:
+            dt = dt.tz_localize("UTC").tz_convert(LOCAL_TZ)
+        except Exception:
+            pass
+    return dt.tz_localize(None)
+
+def to_dt_series(s: pd.Series) -> pd.Series:
+    """Bản vector của to_dt cho cả cột (parse một lượt thay vì từng ô)."""
+    dt = pd.to_datetime(s, errors="coerce", utc=True, format="mixed")
+    return dt.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+
+def guess_agency_from_path(s: str) -> str:
+    if not isinstance(s, str): return UNKNOWN_AGENCY
+    s_low = s.lower()
+    for pat, lab in AGENCY_HINTS.items():
+        if re.search(pat, s_low):
+            return lab
+    m = AGENCY_TOKEN_PAT.search(s_low)
+    if m:
+        return AGENCY_TOKENS.get(m.group(1).upper(), UNKNOWN_AGENCY)
+    return UNKNOWN_AGENCY
+
+def extract_law_id(text):
+    if not isinstance(text, str): return None
+    m = LAW_PAT.search(text.lower())
+    return m.group(1).upper() if m else None
+
+def agency_law_table(paths: pd.Series) -> pd.DataFrame:
+    """
+    agency + law_id cho từng doc_path khác nhau (index = doc_path), cùng kết quả với
+    guess_agency_from_path / extract_law_id nhưng chạy vector trên tập giá trị duy nhất:
+    mọi kết quả tìm kiếm của một văn bản dùng chung một doc_path nên số giá trị duy nhất nhỏ hơn rất nhiều.
+    """
+    uniq = pd.Index(paths.dropna().astype(str).unique())
+    low = pd.Series(uniq.str.lower(), index=uniq)
+    # gợi ý đầu tiên khớp thắng (giữ thứ tự AGENCY_HINTS), rồi tới token trong tên file
+    conds = [low.str.contains(pat, regex=True).to_numpy(dtype=bool) for pat in AGENCY_HINTS]
+    hinted = np.select(conds, list(AGENCY_HINTS.values()), default="") if conds else np.full(len(low), "")
+    token = low.str.extract(AGENCY_TOKEN_PAT, expand=False).str.upper().map(AGENCY_TOKENS)
+    agency = pd.Series(hinted, index=uniq).replace("", np.nan).fillna(token).fillna(UNKNOWN_AGENCY)
+    law_id = low.str.extract(LAW_PAT, expand=True)[0].str.upper()
+    return pd.DataFrame({"agency": agency, "law_id": law_id}, index=uniq)
+
+def enrich_agency_law(df: pd.DataFrame) -> pd.DataFrame:
+    """Thêm cột agency, law_id (suy ra từ doc_path) bằng bảng tra theo doc_path duy nhất."""
+    if "doc_path" not in df.columns:
+        df["agency"] = UNKNOWN_AGENCY
+        df["law_id"] = None
+        return df
+    tbl = agency_law_table(df["doc_path"])
+    paths = df["doc_path"].where(df["doc_path"].isna(), df["doc_path"].astype(str))
+    df["agency"] = paths.map(tbl["agency"]).fillna(UNKNOWN_AGENCY)
+    df["law_id"] = paths.map(tbl["law_id"])
+    return df
+
+def normalize_url(u):
+    if not isinstance(u, str): return u
+    u = u.strip()
+    u = re.sub(r"https?://(www\.)?", "https://", u)
+    u = re.sub(r"(\?|&)(utm_[^=]+|fbclid|gclid)=[^&]+", "", u)
+    return u.rstrip("?&")
+
+def extract_domain(u):
+    m = re.search(r"https?://([^/]+)/", str(u))
+    return m.group(1).lower() if m else None
+
+def sentiment_score_map(label: str) -> int:
+    l = str(label).lower()
+    return 1 if l == "positive" else (-1 if l == "negative" else 0)
+
+def add_meta_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Thêm các cột suy ra cho bảng kết quả cảm xúc theo dòng (published_dt, agency, law_id, text_all, url_norm, domain)."""
+    df["published_dt"] = to_dt_series(df["published"]) if "published" in df.columns else pd.NaT
+    # analyze_sentiment.py đã ghi sẵn agency/law_id vào kết quả → không tính lại
+    if not {"agency", "law_id"} <= set(df.columns):
+        enrich_agency_law(df)
+    text_cols = [c for c in ["title","snippet"] if c in df.columns]
+    df["text_all"] = df[text_cols].fillna("").agg(". ".join, axis=1) if text_cols else ""
+    if "url" in df.columns:
+        df["url_norm"] = df["url"].apply(normalize_url)
+        df["domain"] = df["url"].apply(extract_domain)
+    return df
+
+# ======== Cube tổng hợp sẵn cho dashboard ========
+CUBE_DIMS = ["period", "period_start", "agency", "law_id", "domain", "sentiment"]
+
+def period_bounds(dt: pd.Series, freq: str):
+    """(nhãn kỳ, ngày đầu kỳ). Nhãn giống pd.Grouper(freq=...): tuần → Chủ nhật cuối tuần, tháng → ngày cuối tháng."""
+    per = pd.to_datetime(dt).dt.to_period("W-SUN" if freq == "W" else "M")
+    return per.dt.end_time.dt.normalize(), per.dt.start_time
+
+def build_cube(rows: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Số bài theo (kỳ × agency × law_id × domain × sentiment) từ bảng theo dòng đã add_meta_columns."""
+    c = rows.copy()
+    c["period"], c["period_start"] = period_bounds(c["published_dt"], freq)
+    for col in ("agency", "law_id", "domain", "sentiment"):
+        if col not in c.columns:
+            c[col] = None
+    cube = c.groupby(CUBE_DIMS, dropna=False).size().rename("count").reset_index()
+    cube["count"] = cube["count"].astype("int64")
+    return cube
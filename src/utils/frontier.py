@@ -0,0 +1,217 @@
+# src/utils/frontier.py
+"""
+Frontier/checkpoint của crawler, lưu trên SQLite (outputs/state/frontier.sqlite).
+
+Ghi lại con trỏ phân trang của từng nguồn, các detail URL đã phát hiện, các file đính kèm
+cùng trạng thái tải/trích xuất, và robots.txt đã tải — để chạy lại sau khi crash thì tiếp tục
+đúng chỗ dừng thay vì đi lại từ trang 1.
+"""
+from __future__ import annotations
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS list_cursor (
+    source     TEXT NOT NULL,
+    cursor_key TEXT NOT NULL,
+    next_page  INTEGER NOT NULL,
+    done       INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (source, cursor_key)
+);
+CREATE TABLE IF NOT EXISTS detail (
+    detail_url TEXT PRIMARY KEY,
+    source     TEXT NOT NULL,
+    list_url   TEXT,
+    status     TEXT NOT NULL DEFAULT 'pending',   -- pending | done | failed
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_detail_source ON detail(source, status);
+CREATE TABLE IF NOT EXISTS attachment (
+    download_url TEXT PRIMARY KEY,
+    detail_url   TEXT,
+    source       TEXT,
+    sha1         TEXT,
+    local_path   TEXT,
+    txt_path     TEXT,
+    text_len     INTEGER,
+    status       TEXT NOT NULL DEFAULT 'pending', -- pending | fetched | extracted | failed
+    error        TEXT,
+    updated_at   TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_attachment_source ON attachment(source, status);
+CREATE TABLE IF NOT EXISTS crawled_detail (   -- không bị xoá khi xong nguồn; dùng cho incremental
+    detail_url TEXT PRIMARY KEY,
+    source     TEXT,
+    crawled_at TEXT
+);
+CREATE TABLE IF NOT EXISTS robots (
+    base       TEXT PRIMARY KEY,
+    body       TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class Frontier:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # autocommit: mỗi thay đổi ghi xuống đĩa ngay → crash không mất checkpoint
+        self.conn = sqlite3.connect(str(path), isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    # ---------- list cursors ----------
+    def get_cursor(self, source: str, key: str) -> Optional[sqlite3.Row]:
+        return self.conn.execute(
+            "SELECT next_page, done FROM list_cursor WHERE source=? AND cursor_key=?", (source, key)
+        ).fetchone()
+
+    def set_cursor(self, source: str, key: str, next_page: int, done: bool = False):
+        self.conn.execute(
+            "INSERT INTO list_cursor(source, cursor_key, next_page, done, updated_at) VALUES (?,?,?,?,?) "
+            "ON CONFLICT(source, cursor_key) DO UPDATE SET next_page=excluded.next_page, "
+            "done=excluded.done, updated_at=excluded.updated_at",
+            (source, key, next_page, int(done), _now()),
+        )
+
+    # ---------- details ----------
+    def add_details(self, source: str, list_url: str, urls: Iterable[str]):
+        now = _now()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO detail(detail_url, source, list_url, updated_at) VALUES (?,?,?,?)",
+            [(u, source, list_url, now) for u in urls],
+        )
+
+    def details(self, source: str, status: Optional[str] = None) -> List[str]:
+        if status is None:
+            rows = self.conn.execute("SELECT detail_url FROM detail WHERE source=? ORDER BY rowid", (source,))
+        else:
+            rows = self.conn.execute(
+                "SELECT detail_url FROM detail WHERE source=? AND status=? ORDER BY rowid", (source, status)
+            )
+        return [r[0] for r in rows]
+
+    def detail_status(self, detail_url: str) -> Optional[str]:
+        row = self.conn.execute("SELECT status FROM detail WHERE detail_url=?", (detail_url,)).fetchone()
+        return row[0] if row else None
+
+    def mark_detail(self, detail_url: str, status: str):
+        self.conn.execute(
+            "UPDATE detail SET status=?, updated_at=? WHERE detail_url=?", (status, _now(), detail_url)
+        )
+
+    def remember_crawled(self, detail_url: str, source: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO crawled_detail(detail_url, source, crawled_at) VALUES (?,?,?)",
+            (detail_url, source, _now()),
+        )
+
+    def crawled_details(self) -> Set[str]:
+        return {r[0] for r in self.conn.execute("SELECT detail_url FROM crawled_detail")}
+
+    # ---------- attachments ----------
+    def attachment(self, download_url: str) -> Optional[sqlite3.Row]:
+        return self.conn.execute("SELECT * FROM attachment WHERE download_url=?", (download_url,)).fetchone()
+
+    def add_attachment(self, download_url: str, detail_url: str, source: str):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO attachment(download_url, detail_url, source, updated_at) VALUES (?,?,?,?)",
+            (download_url, detail_url, source, _now()),
+        )
+
+    def mark_fetched(self, download_url: str, sha1: str, local_path: str):
+        self.conn.execute(
+            "UPDATE attachment SET sha1=?, local_path=?, status='fetched', error=NULL, updated_at=? "
+            "WHERE download_url=?",
+            (sha1, local_path, _now(), download_url),
+        )
+
+    def mark_extracted(self, download_url: str, txt_path: str, text_len: Optional[int]):
+        self.conn.execute(
+            "UPDATE attachment SET txt_path=?, text_len=?, status='extracted', error=NULL, updated_at=? "
+            "WHERE download_url=?",
+            (txt_path, text_len, _now(), download_url),
+        )
+
+    def mark_attachment_failed(self, download_url: str, error: str):
+        self.conn.execute(
+            "UPDATE attachment SET status='failed', error=?, updated_at=? WHERE download_url=?",
+            (error[:500], _now(), download_url),
+        )
+
+    def extracted_sha1s(self) -> Set[str]:
+        rows = self.conn.execute("SELECT DISTINCT sha1 FROM attachment WHERE status='extracted' AND sha1 IS NOT NULL")
+        return {r[0] for r in rows}
+
+    # ---------- vòng đời một nguồn ----------
+    def complete_source(self, source: str):
+        """
+        Nguồn đã chạy trọn: xoá checkpoint của nguồn để lượt sau đi lại từ đầu
+        (checkpoint chỉ có ý nghĩa khi một lượt bị ngắt giữa chừng).
+        """
+        with self.transaction():
+            self.conn.execute("DELETE FROM list_cursor WHERE source=?", (source,))
+            self.conn.execute("DELETE FROM detail WHERE source=?", (source,))
+            self.conn.execute("DELETE FROM attachment WHERE source=?", (source,))
+
+    # ---------- robots.txt ----------
+    def get_robots(self, base: str, max_age_s: float) -> Optional[str]:
+        row = self.conn.execute("SELECT body, fetched_at FROM robots WHERE base=?", (base,)).fetchone()
+        if row and time.time() - row["fetched_at"] <= max_age_s:
+            return row["body"]
+        return None
+
+    def put_robots(self, base: str, body: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO robots(base, body, fetched_at) VALUES (?,?,?)", (base, body, time.time())
+        )
+
+class ListCursor:
+    """Con trỏ phân trang của một nguồn; lister gọi advance() sau mỗi trang đã xử lý xong."""
+
+    def __init__(self, frontier: Frontier, source: str, list_url: str):
+        self.frontier = frontier
+        self.source = source
+        self.list_url = list_url
+
+    def known(self) -> List[str]:
+        return self.frontier.details(self.source)
+
+    def is_done(self, key: str) -> bool:
+        row = self.frontier.get_cursor(self.source, key)
+        return bool(row and row["done"])
+
+    def start(self, key: str, default: int) -> int:
+        row = self.frontier.get_cursor(self.source, key)
+        return int(row["next_page"]) if row else default
+
+    def advance(self, key: str, page: int, new_urls: List[str]):
+        with self.frontier.transaction():
+            self.frontier.add_details(self.source, self.list_url, new_urls)
+            self.frontier.set_cursor(self.source, key, page + 1)
+
+    def finish(self, key: str, page: int):
+        self.frontier.set_cursor(self.source, key, page + 1, done=True)
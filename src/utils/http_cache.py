@@ -0,0 +1,73 @@
+# src/utils/http_cache.py
+"""
+Cache HTTP có điều kiện (ETag / Last-Modified) cho file đính kèm, lưu trên SQLite
+(outputs/state/http_cache.sqlite).
+
+Mỗi URL nhớ validator của lần tải gần nhất cùng SHA-1 và đường dẫn file đã lưu; lượt sau gửi
+If-None-Match / If-Modified-Since, server trả 304 thì dùng lại file cũ thay vì tải lại cả body.
+"""
+from __future__ import annotations
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    url            TEXT PRIMARY KEY,
+    etag           TEXT,
+    last_modified  TEXT,
+    content_length INTEGER,
+    sha1           TEXT NOT NULL,
+    local_path     TEXT NOT NULL,
+    fetched_at     TEXT,
+    validated_at   TEXT
+);
+"""
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class HttpCache:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path), isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, url: str) -> Optional[sqlite3.Row]:
+        """Bản ghi của URL, chỉ khi file đã lưu còn trên đĩa (file bị xoá → coi như chưa cache)."""
+        row = self.conn.execute("SELECT * FROM http_cache WHERE url=?", (url,)).fetchone()
+        if row and Path(row["local_path"]).exists():
+            return row
+        return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        row = self.get(url)
+        if row is None:
+            return {}
+        headers = {}
+        if row["etag"]:
+            headers["If-None-Match"] = row["etag"]
+        if row["last_modified"]:
+            headers["If-Modified-Since"] = row["last_modified"]
+        return headers
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str],
+            content_length: Optional[int], sha1: str, local_path: str):
+        now = _now()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO http_cache(url, etag, last_modified, content_length, sha1, "
+            "local_path, fetched_at, validated_at) VALUES (?,?,?,?,?,?,?,?)",
+            (url, etag, last_modified, content_length, sha1, local_path, now, now),
+        )
+
+    def touch(self, url: str):
+        """Server xác nhận 304 — chỉ cập nhật thời điểm kiểm tra."""
+        self.conn.execute("UPDATE http_cache SET validated_at=? WHERE url=?", (_now(), url))
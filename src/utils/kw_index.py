@@ -0,0 +1,60 @@
+"""
+Chỉ mục ngược keyword → bitmap dòng cho tab Topics của dashboard.
+
+Bitmap là int Python (bit i = dòng i chứa keyword, cùng nghĩa `kw in text`); đếm theo sentiment và
+đồng xuất hiện chỉ còn là AND + bit_count() thay vì quét lại toàn bộ văn bản cho mỗi keyword/cặp.
+Có pyahocorasick → một lượt quét mỗi dòng cho mọi keyword; không có → mỗi keyword quét một lượt.
+"""
+import itertools
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import ahocorasick
+    HAS_AC = True
+except Exception:
+    HAS_AC = False
+
+def _bitmap(rows: Sequence[int], n: int) -> int:
+    buf = bytearray((n + 7) // 8)
+    for i in rows:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+class KeywordIndex:
+    def __init__(self, texts: Sequence[str], keywords: Sequence[str], labels: Sequence[str] = ()):
+        """`texts` đã lower(); `labels` (tùy chọn) là nhãn sentiment cùng thứ tự dòng."""
+        self.n = len(texts)
+        self.keywords = [k for k in dict.fromkeys(keywords) if k]
+        hits: Dict[str, List[int]] = {k: [] for k in self.keywords}
+        if HAS_AC and self.keywords:
+            A = ahocorasick.Automaton()
+            for j, k in enumerate(self.keywords):
+                A.add_word(k, j)
+            A.make_automaton()
+            for i, t in enumerate(texts):
+                for j in {j for _, j in A.iter(t)}:
+                    hits[self.keywords[j]].append(i)
+        else:
+            for k in self.keywords:
+                hits[k] = [i for i, t in enumerate(texts) if k in t]
+        self.bits: Dict[str, int] = {k: _bitmap(v, self.n) for k, v in hits.items()}
+
+        by_label: Dict[str, List[int]] = {}
+        for i, l in enumerate(labels):
+            by_label.setdefault(l, []).append(i)
+        self.label_bits: Dict[str, int] = {l: _bitmap(v, self.n) for l, v in by_label.items()}
+
+    def freq(self, kw: str) -> int:
+        return self.bits.get(kw, 0).bit_count()
+
+    def label_counts(self, kw: str) -> Dict[str, int]:
+        b = self.bits.get(kw, 0)
+        return {l: (b & lb).bit_count() for l, lb in self.label_bits.items()}
+
+    def cooccurrence(self, keywords: Sequence[str], min_count: int = 1) -> List[Tuple[str, str, int]]:
+        out = []
+        for a, b in itertools.combinations(sorted(set(keywords)), 2):
+            c = (self.bits.get(a, 0) & self.bits.get(b, 0)).bit_count()
+            if c >= min_count:
+                out.append((a, b, c))
+        return out
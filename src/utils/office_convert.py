@@ -0,0 +1,228 @@
+# src/utils/office_convert.py
+"""
+Chuyển .doc → text qua LibreOffice mà không tốn 2–5 s khởi động soffice cho mỗi file.
+
+Hai chế độ:
+- unoserver có sẵn (`pip install unoserver`): OfficeServerPool giữ N instance LibreOffice chạy nền,
+  ghi danh sách port vào biến môi trường LO_UNO_PORTS để các worker process (fork/spawn sau đó)
+  gọi `unoconvert` tới server đang ấm. Port do OS cấp (port trống) nên crawler và reextract_raw
+  chạy cùng lúc không đụng port của nhau; đặt LO_BASE_PORT để dùng dải port cố định.
+- không có unoserver: `batch_docs_to_text` convert cả lô file trong một lần gọi soffice
+  (mỗi lô một profile riêng để các soffice chạy song song không giẫm lên nhau).
+
+Mọi output đều ghi vào thư mục tạm, không ghi cạnh file gốc trong kho SHA-1.
+"""
+from __future__ import annotations
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger("crawler.extract")
+
+LO_PORTS_ENV = "LO_UNO_PORTS"     # "2003,2005,..." — port XML-RPC của các unoserver đang chạy
+BASE_PORT = int(os.environ["LO_BASE_PORT"]) if os.environ.get("LO_BASE_PORT") else None   # None → port trống
+START_TIMEOUT_S = 60
+SPAWN_RETRIES = 3                 # server thoát ngay (port bị chiếm trước khi kịp bind) → thử port khác
+CONVERT_TIMEOUT_S = 120
+BATCH_SIZE = 50                   # số file mỗi lần gọi soffice ở chế độ batch
+
+def soffice_bin() -> Optional[str]:
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+def unoserver_available() -> bool:
+    return bool(shutil.which("unoserver") and shutil.which("unoconvert") and soffice_bin())
+
+def native_doc_tool() -> bool:
+    """antiword/catdoc có sẵn → .doc không cần tới LibreOffice (không cần dựng unoserver)."""
+    return bool(shutil.which("antiword") or shutil.which("catdoc"))
+
+def _read_txt(p: Path) -> Optional[str]:
+    if p.exists():
+        return p.read_text(encoding="utf-8", errors="ignore").strip()
+    return None
+
+def _reserve_ports(n: int) -> List[socket.socket]:
+    """
+    n port trống khác nhau do OS cấp, giữ bằng socket đang bind — đóng ngay trước khi spawn server
+    để không process nào khác (kể cả pool khác) nhận được cùng port trong lúc chờ.
+    """
+    socks = []
+    for _ in range(n):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0))
+        socks.append(s)
+    return socks
+
+def _port_open(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(0.5)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+# =============================
+# Chế độ server (unoserver)
+# =============================
+class OfficeServerPool:
+    """
+    N unoserver chạy nền, mỗi cái một profile LibreOffice riêng.
+    Dùng như context manager; start() export LO_UNO_PORTS để worker process kế thừa.
+    """
+
+    def __init__(self, size: int = 2, base_port: Optional[int] = BASE_PORT):
+        self.size = max(1, size)
+        self.base_port = base_port
+        self.ports: List[int] = []
+        self._procs: List[subprocess.Popen] = []
+        self._profiles: List[tempfile.TemporaryDirectory] = []
+
+    def _launch(self, profile: tempfile.TemporaryDirectory, port: int, uno_port: int) -> subprocess.Popen:
+        return subprocess.Popen(
+            ["unoserver", "--interface", "127.0.0.1", "--port", str(port), "--uno-port", str(uno_port),
+             "--user-installation", Path(profile.name).as_uri()],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def _spawn_free(self, profile: tempfile.TemporaryDirectory):
+        socks = _reserve_ports(2)          # listener + uno cùng lúc → không bao giờ trùng nhau
+        port, uno_port = (s.getsockname()[1] for s in socks)
+        for s in socks:
+            s.close()
+        return self._launch(profile, port, uno_port), port
+
+    def start(self) -> "OfficeServerPool":
+        for i in range(self.size):
+            profile = tempfile.TemporaryDirectory(prefix="lo_profile_")
+            if self.base_port is None:
+                proc, port = self._spawn_free(profile)
+            else:
+                port, uno_port = self.base_port + 2 * i, self.base_port + 2 * i + 1
+                if _port_open(port):
+                    logger.warning(f"[LO] port {port} đang được dùng → bỏ qua server #{i}")
+                    profile.cleanup()
+                    continue
+                proc = self._launch(profile, port, uno_port)
+            self._profiles.append(profile)
+            self._procs.append(proc)
+            self.ports.append(port)
+        retries = [0] * len(self.ports)
+        deadline = time.monotonic() + START_TIMEOUT_S
+        # port mở nhưng server của mình đã thoát → port đó thuộc process khác, không tính là sẵn sàng
+        up = lambda k: self._procs[k].poll() is None and _port_open(self.ports[k])
+        while time.monotonic() < deadline and not all(up(k) for k in range(len(self.ports))):
+            for k, proc in enumerate(self._procs):
+                # server thoát trước khi bind: port vừa nhả đã bị process khác lấy → thử cặp port mới
+                if proc.poll() is not None and self.base_port is None and retries[k] < SPAWN_RETRIES:
+                    retries[k] += 1
+                    logger.warning(f"[LO] unoserver trên port {self.ports[k]} thoát → thử port khác")
+                    self._procs[k], self.ports[k] = self._spawn_free(self._profiles[k])
+            time.sleep(0.5)
+        ready = [self.ports[k] for k in range(len(self.ports)) if up(k)]
+        if not ready:
+            logger.warning("unoserver không khởi động được → dùng soffice từng file")
+            self.stop()
+            return self
+        self.ports = ready
+        os.environ[LO_PORTS_ENV] = ",".join(map(str, ready))
+        logger.info(f"[LO] {len(ready)} unoserver sẵn sàng trên port {ready}")
+        return self
+
+    def stop(self):
+        os.environ.pop(LO_PORTS_ENV, None)
+        for p in self._procs:
+            p.terminate()
+        for p in self._procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        for d in self._profiles:
+            d.cleanup()
+        self._procs, self._profiles, self.ports = [], [], []
+
+    def __enter__(self) -> "OfficeServerPool":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def server_ports() -> List[int]:
+    raw = os.environ.get(LO_PORTS_ENV, "")
+    return [int(x) for x in raw.split(",") if x.strip()]
+
+def doc_to_text_via_server(doc_path: Path) -> Optional[str]:
+    """Convert qua unoserver đang chạy (nếu có); worker chọn server theo pid để chia tải."""
+    ports = server_ports()
+    if not ports or not shutil.which("unoconvert"):
+        return None
+    port = ports[os.getpid() % len(ports)]
+    with tempfile.TemporaryDirectory(prefix="lo_out_") as tmp:
+        out = Path(tmp) / f"{doc_path.stem}.txt"
+        try:
+            subprocess.run(
+                ["unoconvert", "--host", "127.0.0.1", "--port", str(port), "--convert-to", "txt",
+                 str(doc_path), str(out)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=CONVERT_TIMEOUT_S,
+            )
+            return _read_txt(out)
+        except Exception as e:
+            logger.warning(f"unoconvert failed for {doc_path.name} (port {port}): {e}")
+    return None
+
+# =============================
+# Chế độ soffice (không có server)
+# =============================
+def _soffice_convert(paths: Sequence[Path], out_dir: Path, timeout_s: int) -> bool:
+    soffice = soffice_bin()
+    if not soffice or not paths:
+        return False
+    with tempfile.TemporaryDirectory(prefix="lo_profile_") as profile:
+        try:
+            subprocess.run(
+                [soffice, f"-env:UserInstallation={Path(profile).as_uri()}", "--headless",
+                 "--convert-to", "txt:Text", "--outdir", str(out_dir), *map(str, paths)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=timeout_s,
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"LibreOffice convert-to txt failed ({len(paths)} file): {e}")
+            return False
+
+def doc_to_text_via_soffice(doc_path: Path) -> Optional[str]:
+    """Một file, một lần khởi động soffice; output vào thư mục tạm."""
+    with tempfile.TemporaryDirectory(prefix="lo_out_") as tmp:
+        if _soffice_convert([doc_path], Path(tmp), CONVERT_TIMEOUT_S):
+            return _read_txt(Path(tmp) / f"{doc_path.stem}.txt")
+    return None
+
+def batch_docs_to_text(paths: Sequence[Path], workers: int = 2,
+                       batch_size: int = BATCH_SIZE) -> Dict[Path, str]:
+    """
+    Convert nhiều .doc với số lần khởi động soffice tối thiểu: chia thành lô `batch_size`,
+    tối đa `workers` soffice chạy song song. Trả về {path: text} cho các file convert được.
+    """
+    paths = list(paths)
+    if not paths or not soffice_bin():
+        return {}
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+    def run(batch: List[Path]) -> Dict[Path, str]:
+        res: Dict[Path, str] = {}
+        with tempfile.TemporaryDirectory(prefix="lo_out_") as tmp:
+            _soffice_convert(batch, Path(tmp), CONVERT_TIMEOUT_S * len(batch))
+            for p in batch:
+                txt = _read_txt(Path(tmp) / f"{p.stem}.txt")
+                if txt:
+                    res[p] = txt
+        return res
+
+    out: Dict[Path, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for res in ex.map(run, batches):
+            out.update(res)
+    return out
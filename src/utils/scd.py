@@ -1,44 +1,176 @@
 import os, orjson, glob
+from collections import defaultdict
 from datetime import datetime, timezone
 
+# Bố cục trong out_dir:
+#   {site}.jsonl                 — log các version (append-only; chỉ compaction mới ghi lại)
+#   _scd/{site}.closed.jsonl     — log các version bị đóng: số dòng của version trong {site}.jsonl → record_valid_to
+#   _scd/{site}.index.json       — khóa (url, so_hieu) → số dòng + content_hash của version hiện tại
+# Compaction ghi lại cờ nhưng giữ nguyên thứ tự/số dòng nên số dòng là id ổn định của version.
+# is_current/record_valid_to trong {site}.jsonl chỉ đúng sau compaction; đọc lịch sử qua read_history().
+SCD_DIR = "_scd"
+COMPACT_MIN_CLOSED = 1000      # compaction khi log đóng có ít nhất ngần này dòng ...
+COMPACT_RATIO = 0.2            # ... và chiếm >= 20% số version
+
 def _jsonl_path(out_dir: str, site: str):
     os.makedirs(out_dir, exist_ok=True)
     return os.path.join(out_dir, f"{site}.jsonl")
 
-def scd2_upsert_many(docs, out_dir="outputs/jsonl"):
+def _scd_paths(out_dir: str, site: str):
+    d = os.path.join(out_dir, SCD_DIR)
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, f"{site}.closed.jsonl"), os.path.join(d, f"{site}.index.json")
+
+def _key(rec):
+    return f'{rec.get("url","")}\x1f{rec.get("so_hieu","")}'
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def _iter_jsonl(path):
+    for _, o in _iter_lines(path):
+        if o is not None:
+            yield o
+
+def _iter_lines(path):
+    """(số dòng, record | None nếu dòng hỏng) — đếm cả dòng hỏng để số dòng khớp file."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for i, line in enumerate(f):
+            try:
+                yield i, orjson.loads(line)
+            except Exception:
+                yield i, None
+
+def _size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def _write_atomic(path, data: bytes):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _load_closed(closed_path):
+    """số dòng version → record_valid_to."""
+    return {c["line"]: c["record_valid_to"] for c in _iter_jsonl(closed_path)}
+
+def _rebuild_index(path, closed_path):
+    """Dựng lại index từ log version + log đóng (khi index mất/hỏng/lệch với file)."""
+    closed = _load_closed(closed_path)
+    index, versions = {}, 0
+    for i, o in _iter_lines(path):
+        versions = i + 1
+        if o is None:
+            continue
+        if o.get("is_current", True) and i not in closed:
+            index[_key(o)] = {"line": i, "content_hash": o.get("content_hash")}
+    return {"versions": versions, "size": _size(path), "closed": len(closed), "current": index}
+
+def _load_index(path, closed_path, index_path):
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "rb") as f:
+                idx = orjson.loads(f.read())
+            # file bị ghi ngoài engine (hoặc crash giữa append và ghi index) → dựng lại
+            if idx.get("size") == _size(path):
+                return idx
+        except Exception:
+            pass
+    return _rebuild_index(path, closed_path)
+
+def scd2_upsert_many(docs, out_dir=None, backend="jsonl"):
     # append-only; đóng record cũ (is_current=False) khi gặp content_hash mới cùng “khóa”: (url, so_hieu)
-    index = {}
+    # backend="parquet": lưu lịch sử dạng cột (utils/scd_parquet.py) để truy vấn as-of/diff bằng DuckDB,
+    # root riêng (mặc định outputs/parquet) để không lẫn với các file JSONL
+    if backend == "parquet":
+        from .scd_parquet import ParquetSCD2
+        ParquetSCD2(out_dir or "outputs/parquet").upsert_many(docs)
+        return
+    out_dir = out_dir or "outputs/jsonl"
+    by_site = defaultdict(list)
     for d in docs:
-        site = d.get("source_site","unknown")
-        p = _jsonl_path(out_dir, site)
-        _scd2_upsert_one(d, p)
-
-def _scd2_upsert_one(rec, path):
-    key = (rec.get("url",""), rec.get("so_hieu",""))
-    now = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
-    rec["record_valid_from"] = rec.get("record_valid_from") or now
-    # đọc cũ (stream)
-    old = []
-    if os.path.exists(path):
-        with open(path,"rb") as f:
-            for line in f:
-                try:
-                    oldrec = orjson.loads(line)
-                    old.append(oldrec)
-                except: pass
-    # kiểm tra current
-    changed = True
-    for o in reversed(old):
-        if o.get("is_current") and (o.get("url",""), o.get("so_hieu",""))==key:
-            if o.get("content_hash")==rec.get("content_hash"):
-                changed = False
-            else:
+        by_site[d.get("source_site","unknown")].append(d)
+    for site, recs in by_site.items():
+        _scd2_upsert_site(recs, out_dir, site)
+
+def _scd2_upsert_site(recs, out_dir, site):
+    """Một lượt cho cả lô của một site: mỗi file chỉ mở một lần để append, index ghi lại một lần."""
+    path = _jsonl_path(out_dir, site)
+    closed_path, index_path = _scd_paths(out_dir, site)
+    idx = _load_index(path, closed_path, index_path)
+    current = idx["current"]
+    now = _now()
+
+    new_lines, closed_lines = [], []
+    for rec in recs:
+        k = _key(rec)
+        cur = current.get(k)
+        if cur and cur.get("content_hash") == rec.get("content_hash"):
+            continue
+        if cur:
+            closed_lines.append(orjson.dumps({"line": cur["line"], "record_valid_to": now}) + b"\n")
+        rec["record_valid_from"] = rec.get("record_valid_from") or now
+        rec.setdefault("is_current", True)
+        line = idx.get("versions", 0) + len(new_lines)
+        new_lines.append(orjson.dumps(rec) + b"\n")
+        current[k] = {"line": line, "content_hash": rec.get("content_hash")}
+
+    if not new_lines:
+        return
+    if closed_lines:
+        with open(closed_path, "ab") as f:
+            f.writelines(closed_lines)
+    with open(path, "ab") as f:
+        f.writelines(new_lines)
+    idx["versions"] = idx.get("versions", 0) + len(new_lines)
+    idx["size"] = _size(path)
+    idx["closed"] = idx.get("closed", 0) + len(closed_lines)
+    _write_atomic(index_path, orjson.dumps(idx))
+
+    if idx["closed"] >= COMPACT_MIN_CLOSED and idx["closed"] >= COMPACT_RATIO * idx["versions"]:
+        compact_site(out_dir, site)
+
+def read_history(out_dir, site):
+    """Toàn bộ version của site, đã áp log đóng (is_current/record_valid_to đúng)."""
+    path = _jsonl_path(out_dir, site)
+    closed_path, _ = _scd_paths(out_dir, site)
+    closed = _load_closed(closed_path)
+    for i, o in _iter_lines(path):
+        if o is None:
+            continue
+        to = closed.get(i)
+        if to is not None:
+            o["is_current"] = False
+            o["record_valid_to"] = to
+        yield o
+
+def compact_site(out_dir, site):
+    """Ghi lại {site}.jsonl với các version đã đóng, rồi xoá log đóng và dựng lại index."""
+    path = _jsonl_path(out_dir, site)
+    closed_path, index_path = _scd_paths(out_dir, site)
+    if not os.path.exists(closed_path):
+        return
+    closed = _load_closed(closed_path)
+    tmp = path + ".compact"
+    with open(path, "rb") as src, open(tmp, "wb") as f:
+        for i, line in enumerate(src):
+            to = closed.get(i)
+            if to is not None:
+                o = orjson.loads(line)
                 o["is_current"] = False
-                o["record_valid_to"] = now
-            break
-    # ghi lại
-    with open(path,"wb") as f:
-        for o in old:
-            f.write(orjson.dumps(o)+b"\n")
-        if changed:
-            f.write(orjson.dumps(rec)+b"\n")
+                o["record_valid_to"] = to
+                line = orjson.dumps(o) + b"\n"
+            f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    os.unlink(closed_path)
+    _write_atomic(index_path, orjson.dumps(_rebuild_index(path, closed_path)))
+
+def compact_all(out_dir="outputs/jsonl"):
+    for p in glob.glob(os.path.join(out_dir, "*.jsonl")):
+        compact_site(out_dir, os.path.basename(p)[:-len(".jsonl")])
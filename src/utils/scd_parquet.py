@@ -0,0 +1,251 @@
+"""
+Backend SCD2 dạng cột: lịch sử version lưu thành Parquet phân vùng theo source_site, truy vấn qua DuckDB.
+
+Bố cục trong root:
+  versions/source_site={site}/part-*.parquet   — mỗi version một dòng (version_id, url, so_hieu, content_hash,
+                                                 record_valid_from, record_valid_to, is_current, ...các field khác)
+  closures/source_site={site}/part-*.parquet   — version_id → record_valid_to khi version bị đóng
+
+Ghi chỉ thêm part mới (không sửa part cũ); compact() gộp part của một site và áp closures vào cột.
+compact() ghi part gộp dưới tên tạm (*.parquet.compact, không khớp glob) và một marker _compact.json
+liệt kê part cũ; marker là điểm commit — crash giữa chừng thì lần đọc/ghi sau hoàn tất nốt (xoá part cũ,
+đổi tên part gộp), chưa có marker thì bỏ file tạm. Không lúc nào part gộp và part cũ cùng được đọc.
+as_of()/diff()/history() đọc qua DuckDB: lọc source_site cắt phân vùng. Khi còn closures chưa compact,
+record_valid_to / is_current chỉ có sau LEFT JOIN với closures nên điều kiện trên hai cột này không được
+đẩy xuống scan Parquet; chạy compact() để ghi chúng vào file thì view đọc thẳng versions (không join).
+"""
+import glob
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+KEY_COLS = ("url", "so_hieu")
+COMPACT_MARKER = "_compact.json"
+COMPACT_SUFFIX = ".compact"
+
+def _ts(v):
+    if isinstance(v, datetime):
+        return v if v.tzinfo else v.replace(tzinfo=timezone.utc)
+    if v:
+        try:
+            return _ts(datetime.fromisoformat(str(v).replace("Z", "+00:00")))
+        except ValueError:
+            pass
+    return None
+
+def _part_name():
+    return f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+
+def _sql_str(s):
+    return "'" + str(s).replace("'", "''") + "'"
+
+class ParquetSCD2:
+    def __init__(self, root="outputs/parquet"):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.closures_dir = os.path.join(root, "closures")
+
+    # ---------- ghi ----------
+    def _site_dir(self, base, site):
+        d = os.path.join(base, f"source_site={site}")
+        os.makedirs(d, exist_ok=True)
+        return d
+
+    def _write_part(self, base, site, table):
+        d = self._site_dir(base, site)
+        name = _part_name()
+        tmp = os.path.join(d, name + ".tmp")   # không khớp glob *.parquet khi đang ghi
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, os.path.join(d, name))
+
+    def _current_of_site(self, site):
+        """khóa (url, so_hieu) → (version_id, content_hash) của version hiện tại."""
+        self._recover()
+        if not self._has_parts(self.versions_dir, site):
+            return {}
+        with duckdb.connect() as con:
+            rows = con.execute(
+                f"SELECT url, so_hieu, version_id, content_hash FROM ({self._view_sql()}) "
+                "WHERE source_site = ? AND is_current", [site]
+            ).fetchall()
+        return {(u or "", s or ""): (vid, h) for u, s, vid, h in rows}
+
+    def upsert_many(self, docs):
+        """Như scd2_upsert_many: cùng khóa (url, so_hieu) mà content_hash đổi thì đóng version cũ."""
+        by_site = {}
+        for d in docs:
+            by_site.setdefault(d.get("source_site", "unknown"), []).append(d)
+        for site, recs in by_site.items():
+            self._upsert_site(site, recs)
+
+    def _upsert_site(self, site, recs):
+        current = self._current_of_site(site)
+        now = datetime.now(timezone.utc)
+        new_rows, closures = [], []
+        for rec in recs:
+            k = (rec.get("url", "") or "", rec.get("so_hieu", "") or "")
+            cur = current.get(k)
+            if cur and cur[1] == rec.get("content_hash"):
+                continue
+            if cur:
+                closures.append({"version_id": cur[0], "record_valid_to": now})
+            row = {c: v for c, v in rec.items() if c != "source_site"}
+            for c in KEY_COLS:   # cột khóa luôn có mặt để truy vấn/diff không phụ thuộc schema từng part
+                row[c] = row.get(c) or ""
+            row["version_id"] = uuid.uuid4().hex
+            row["record_valid_from"] = _ts(rec.get("record_valid_from")) or now
+            row["record_valid_to"] = None
+            row["is_current"] = True
+            new_rows.append(row)
+            current[k] = (row["version_id"], rec.get("content_hash"))
+        if not new_rows:
+            return
+        self._write_part(self.versions_dir, site, self._to_table(new_rows))
+        if closures:
+            self._write_part(self.closures_dir, site, pa.Table.from_pylist(closures, schema=pa.schema([
+                ("version_id", pa.string()), ("record_valid_to", pa.timestamp("us", tz="UTC"))])))
+
+    @staticmethod
+    def _to_table(rows):
+        # from_pylist lấy tên cột từ dòng đầu → chuẩn hóa mọi dòng về hợp các khóa, thiếu thì None
+        cols = list(dict.fromkeys(c for r in rows for c in r))
+        table = pa.Table.from_pylist([{c: r.get(c) for c in cols} for r in rows])
+        # cột toàn null → string, để các part ghép được với nhau (union_by_name)
+        fields = []
+        for f in table.schema:
+            if pa.types.is_null(f.type):
+                f = f.with_type(pa.string())
+            if f.name in ("record_valid_from", "record_valid_to"):
+                f = f.with_type(pa.timestamp("us", tz="UTC"))
+            if f.name == "is_current":
+                f = f.with_type(pa.bool_())
+            fields.append(f)
+        return table.cast(pa.schema(fields))
+
+    # ---------- đọc ----------
+    @staticmethod
+    def _has_parts(base, site=None):
+        d = os.path.join(base, f"source_site={site}") if site else base
+        if not os.path.isdir(d):
+            return False
+        return any(name.endswith(".parquet") for _, _, files in os.walk(d) for name in files)
+
+    def _view_sql(self):
+        v = (f"read_parquet({_sql_str(os.path.join(self.versions_dir, '*', '*.parquet'))}, "
+             "hive_partitioning=true, union_by_name=true)")
+        if not self._has_parts(self.closures_dir):
+            return f"SELECT * FROM {v}"
+        c = (f"read_parquet({_sql_str(os.path.join(self.closures_dir, '*', '*.parquet'))}, "
+             "hive_partitioning=true)")
+        return (
+            "SELECT v.* REPLACE (coalesce(v.record_valid_to, c.closed_to) AS record_valid_to, "
+            "v.is_current AND c.closed_to IS NULL AS is_current) "
+            f"FROM {v} v LEFT JOIN (SELECT version_id, min(record_valid_to) AS closed_to "
+            f"FROM {c} GROUP BY version_id) c USING (version_id)"
+        )
+
+    def query(self, sql_where="TRUE", params=None, columns="*"):
+        """SELECT {columns} trên toàn bộ lịch sử với điều kiện tuỳ ý → pandas.DataFrame."""
+        self._recover()
+        if not self._has_parts(self.versions_dir):
+            return None
+        with duckdb.connect() as con:
+            return con.execute(
+                f"SELECT {columns} FROM ({self._view_sql()}) WHERE {sql_where}", params or []
+            ).df()
+
+    def history(self, site=None, where="TRUE", params=None, columns="*"):
+        if site:
+            where, params = f"source_site = ? AND ({where})", [site, *(params or [])]
+        return self.query(where, params, columns)
+
+    def as_of(self, ts, site=None, where="TRUE", params=None, columns="*"):
+        """Các văn bản đang là version hiện hành tại thời điểm `ts`."""
+        cond = "record_valid_from <= ? AND (record_valid_to IS NULL OR record_valid_to > ?)"
+        return self.history(site, f"{cond} AND ({where})", [_ts(ts), _ts(ts), *(params or [])], columns)
+
+    def diff(self, t0, t1, site=None):
+        """Khác biệt giữa hai thời điểm: added / removed / changed theo khóa (url, so_hieu)."""
+        self._recover()
+        if not self._has_parts(self.versions_dir):
+            return None
+        site_cond = "AND source_site = ?" if site else ""
+        snap = ("SELECT source_site, url, so_hieu, version_id, content_hash FROM ({view}) "
+                "WHERE record_valid_from <= ? AND (record_valid_to IS NULL OR record_valid_to > ?) " + site_cond)
+        view = self._view_sql()
+        params = []
+        for t in (t0, t1):
+            params += [_ts(t), _ts(t)] + ([site] if site else [])
+        sql = f"""
+            WITH a AS ({snap.format(view=view)}), b AS ({snap.format(view=view)})
+            SELECT coalesce(b.source_site, a.source_site) AS source_site,
+                   coalesce(b.url, a.url) AS url, coalesce(b.so_hieu, a.so_hieu) AS so_hieu,
+                   CASE WHEN a.version_id IS NULL THEN 'added'
+                        WHEN b.version_id IS NULL THEN 'removed'
+                        ELSE 'changed' END AS change,
+                   a.version_id AS version_before, b.version_id AS version_after,
+                   a.content_hash AS hash_before, b.content_hash AS hash_after
+            FROM a FULL OUTER JOIN b
+              ON a.source_site = b.source_site AND a.url IS NOT DISTINCT FROM b.url
+             AND a.so_hieu IS NOT DISTINCT FROM b.so_hieu
+            WHERE a.version_id IS DISTINCT FROM b.version_id
+        """
+        with duckdb.connect() as con:
+            return con.execute(sql, params).df()
+
+    # ---------- bảo trì ----------
+    def _recover(self):
+        """Hoàn tất / bỏ dở các lần compact() bị ngắt (xem docstring module)."""
+        if not os.path.isdir(self.versions_dir):
+            return
+        for marker in glob.glob(os.path.join(self.versions_dir, "*", COMPACT_MARKER)):
+            self._finish_compact(marker)
+        # crash trước commit: part gộp / marker đang ghi dở → bỏ, part cũ vẫn nguyên
+        for leftover in glob.glob(os.path.join(self.versions_dir, "*", "*" + COMPACT_SUFFIX)) + \
+                glob.glob(os.path.join(self.versions_dir, "*", COMPACT_MARKER + ".tmp")):
+            os.unlink(leftover)
+
+    def _finish_compact(self, marker):
+        d = os.path.dirname(marker)
+        with open(marker, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        for rel in plan["old"]:
+            p = os.path.join(self.root, rel)
+            if os.path.exists(p):
+                os.unlink(p)
+        pending = os.path.join(d, plan["new"] + COMPACT_SUFFIX)
+        if os.path.exists(pending):
+            os.replace(pending, os.path.join(d, plan["new"]))
+        os.unlink(marker)
+
+    def compact(self, site=None):
+        """Gộp các part của site (hoặc mọi site) thành một part, áp closures vào cột rồi xoá part cũ."""
+        self._recover()
+        sites = [site] if site else [
+            d.split("=", 1)[1] for d in os.listdir(self.versions_dir) if d.startswith("source_site=")
+        ] if os.path.isdir(self.versions_dir) else []
+        for s in sites:
+            old = [os.path.join(b, f"source_site={s}", n) for b in (self.versions_dir, self.closures_dir)
+                   if os.path.isdir(os.path.join(b, f"source_site={s}"))
+                   for n in os.listdir(os.path.join(b, f"source_site={s}")) if n.endswith(".parquet")]
+            if len(old) <= 1:
+                continue
+            with duckdb.connect() as con:
+                table = con.execute(
+                    f"SELECT * EXCLUDE (source_site) FROM ({self._view_sql()}) WHERE source_site = ?", [s]
+                ).to_arrow_table()
+            d = self._site_dir(self.versions_dir, s)
+            name = _part_name()
+            pq.write_table(table, os.path.join(d, name + COMPACT_SUFFIX), compression="zstd")
+            marker = os.path.join(d, COMPACT_MARKER)
+            with open(marker + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"new": name, "old": [os.path.relpath(p, self.root) for p in old]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(marker + ".tmp", marker)      # commit
+            self._finish_compact(marker)
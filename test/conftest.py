@@ -0,0 +1,8 @@
+import os
+import sys
+
+# chạy `pytest test` từ gốc repo: import theo dạng src.utils.xxx như trong code
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# các script đọc dữ liệu thật (đường dẫn cục bộ), không phải test
+collect_ignore = ["test_metadata.py", "test_read_jsonl.py", "test_read_parquet.py", "tree.py"]
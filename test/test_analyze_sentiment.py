@@ -0,0 +1,62 @@
+import pandas as pd
+
+from src.scripts.analyze_sentiment import HFClassifier, dedupe_docs
+from src.utils.doc_identity import DocIdentity
+
+
+class FakeHF(HFClassifier):
+    """HFClassifier không tải mô hình: _forward chấm theo độ dài, lỗi nếu có câu chứa "BAD"."""
+
+    def __init__(self, batch_size=4):
+        self.batch_size = batch_size
+        self.name = "hf"
+        self.cache_key = "hf:fake"
+        self.calls = []
+
+    def _forward(self, texts):
+        self.calls.append(list(texts))
+        if any("BAD" in t for t in texts):
+            raise RuntimeError("bad input")
+        return [{"positive": 1.0, "neutral": 0.0, "negative": 0.0} if len(t) % 2 else
+                {"positive": 0.0, "neutral": 0.0, "negative": 1.0} for t in texts]
+
+
+def test_batch_keeps_input_order():
+    clf = FakeHF(batch_size=2)
+    texts = ["aaa", "b", "cc", "dddd", "e"]
+    got = clf.predict_scores_batch(texts)
+    assert [max(d, key=d.get) for d in got] == ["positive", "positive", "negative", "negative", "positive"]
+    assert all(len(c) <= 2 for c in clf.calls)
+
+
+def test_failed_batch_falls_back_to_single_items():
+    clf = FakeHF(batch_size=4)
+    got = clf.predict_scores_batch(["a", "bb", "BAD", "ccc"])
+    assert [max(d, key=d.get) for d in got] == ["positive", "negative", "neutral", "positive"]
+
+
+def test_failed_scores_are_not_cached(tmp_path):
+    from src.scripts.analyze_sentiment import ScoreCache, score_texts
+
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    clf = FakeHF()
+    got = score_texts(["ok", "BAD one", "ok"], clf, cache)
+    assert max(got["BAD one"], key=got["BAD one"].get) == "neutral"
+    assert set(cache.get_many(clf.cache_key, ["ok", "BAD one"])) == {"ok"}
+    cache.close()
+
+
+def test_dedupe_docs_without_doc_columns_is_a_no_op(tmp_path):
+    df = pd.DataFrame({"url": ["u", "u"], "title": ["a", "b"]})
+    out = dedupe_docs(df, DocIdentity(tmp_path / "id.sqlite"))
+    assert out.equals(df)
+
+
+def test_dedupe_docs_merges_rows_of_linked_documents(tmp_path):
+    ident = DocIdentity(tmp_path / "id.sqlite")
+    a, b = "a" * 40, "b" * 40
+    ident.link(sha1=a, urls=["https://chinhphu.vn/dt/1"])
+    ident.link(sha1=b, urls=["https://chinhphu.vn/dt/1"])
+    df = pd.DataFrame({"doc_path": [f"/t/{a}.txt", f"/t/{b}.txt", "/t/khac.txt"], "url": ["u", "u", "u"]})
+    out = dedupe_docs(df, ident)
+    assert list(out["doc_path"]) == [f"/t/{a}.txt", "/t/khac.txt"]
@@ -0,0 +1,50 @@
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.scripts.build_discussion_index import FLAT_SCHEMA, error_only, flat_rows, merge_parts, repair_jsonl
+
+
+def _rec(doc_id, results):
+    return {"doc_id": doc_id, "doc_path": f"{doc_id}.txt", "results": results}
+
+
+def test_repair_jsonl_truncates_partial_line_and_skips_error_only(tmp_path):
+    path = tmp_path / "index.jsonl"
+    ok = _rec("a", [{"query": "q", "engine": "DDG", "title": "t", "url": "u"}])
+    failed = _rec("b", [{"query": "q", "engine": "DDG", "error": "Ratelimit"}])
+    empty = _rec("c", [])
+    path.write_text("".join(json.dumps(r) + "\n" for r in (ok, failed, empty)) + '{"doc_id": "d", "res',
+                    encoding="utf-8")
+    assert repair_jsonl(str(path)) == {"a", "c"}
+    # record lỗi bị bỏ → lượt resume ghi lại "b" không tạo dòng trùng doc_id
+    assert [json.loads(l)["doc_id"] for l in path.read_text(encoding="utf-8").splitlines()] == ["a", "c"]
+
+
+def test_error_results_are_not_flattened():
+    rec = _rec("a", [{"query": "q1", "engine": "DDG", "error": "x"},
+                     {"query": "q2", "engine": "DDG", "title": "t", "url": "u"}])
+    assert not error_only(rec)
+    assert [r["query"] for r in flat_rows(rec)] == ["q2"]
+    assert error_only(_rec("b", [{"query": "q", "error": "x"}]))
+
+
+def test_canonical_id_reaches_flat_parquet_and_old_parts_still_merge(tmp_path):
+    parts = tmp_path / "parts"
+    parts.mkdir()
+    old = pa.table({c: ["x"] for c in FLAT_SCHEMA.names if c != "canonical_id"})
+    pq.write_table(old, parts / "part-00000.parquet")
+    rec = dict(_rec("a", [{"query": "q", "engine": "DDG", "title": "t", "url": "u"}]), canonical_id="sha1:" + "a" * 40)
+    pq.write_table(pa.Table.from_pylist(list(flat_rows(rec)), schema=FLAT_SCHEMA), parts / "part-00001.parquet")
+    out = tmp_path / "index.parquet"
+    assert merge_parts(str(parts), str(out)) == 2
+    assert pq.read_table(out).column("canonical_id").to_pylist() == [None, "sha1:" + "a" * 40]
+
+
+def test_repair_jsonl_truncates_without_error_records(tmp_path):
+    path = tmp_path / "index.jsonl"
+    ok = _rec("a", [{"query": "q", "engine": "DDG", "title": "t", "url": "u"}])
+    path.write_text(json.dumps(ok) + "\n" + '{"doc_id": "d"', encoding="utf-8")
+    assert repair_jsonl(str(path)) == {"a"}
+    assert path.read_text(encoding="utf-8") == json.dumps(ok) + "\n"
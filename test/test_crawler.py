@@ -0,0 +1,175 @@
+import asyncio
+import importlib.util
+import time
+from pathlib import Path
+
+import pytest
+
+from src.utils.doc_identity import DocIdentity
+from src.utils.frontier import Frontier
+
+ROOT = Path(__file__).resolve().parents[1]
+spec = importlib.util.spec_from_file_location("crawler", ROOT / "src" / "crawlers" / "crawl4ai_runner_V2.0.py")
+cr = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cr)
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.url = ""
+
+    async def goto(self, url, wait_until=None):
+        self.url = url
+        await asyncio.sleep(0.01)
+
+    async def wait_for_timeout(self, ms):
+        await asyncio.sleep(0)
+
+    async def content(self):
+        p = int(self.url.split("page=")[1]) if "page=" in self.url else 0
+        if p > 2:
+            return "<html></html>"
+        return "".join(f'<a href="https://chinhphu.vn/du-thao-{p}-{i}">x</a>' for i in range(2))
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCtx:
+    async def new_page(self):
+        return FakePage()
+
+
+def test_lister_and_details_share_one_page_without_deadlock():
+    # pool 1 page, host 1 slot: thứ tự khóa page→slot ở lister và slot→page ở detail từng kẹt nhau
+    async def run():
+        pool = await cr.PagePool(FakeCtx(), 1).start()
+        lim = cr.HostLimiter(1, 0.0)
+
+        async def detail(page, url):
+            return [url + "/a.pdf"]
+
+        lister = cr.cp_list_detail_urls(pool, lim, "https://chinhphu.vn/du-thao-vbqppl")
+        details = [cr.fetch_detail(pool, lim, detail, f"https://chinhphu.vn/du-thao-x{i}") for i in range(3)]
+        return await asyncio.wait_for(asyncio.gather(lister, *details), 5)
+
+    urls, *files = asyncio.run(run())
+    assert len(urls) == 4
+    assert files == [([f"https://chinhphu.vn/du-thao-x{i}/a.pdf"], None) for i in range(3)]
+
+
+def test_pool_size_counts_hosts_without_rules():
+    lim = cr.HostLimiter(4, 0.0, {"chinhphu.vn": (3, 1.0)})
+    sources = [cr.Source("CP", "https://chinhphu.vn/a", None, None),
+               cr.Source("X1", "https://other.gov.vn/a", None, None),
+               cr.Source("X2", "https://other.gov.vn/b", None, None),
+               cr.Source("Y", "https://www.third.gov.vn/a", None, None)]
+    assert cr.pool_size_for(sources, lim) == max(cr.DETAIL_WORKERS, 3 + 4 + 4)
+
+
+class FakeStage(cr.ExtractStage):
+    """ExtractStage thật (hàng đợi + gộp job theo sha1) nhưng worker là thread, trích chậm có chủ đích."""
+
+    def __init__(self):
+        super().__init__(workers=2, timeout_s=5)
+
+    def start(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(2)
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        return self
+
+
+@pytest.fixture
+def crawl_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(cr, "OUT_TXT_DIR", tmp_path / "txt")
+    monkeypatch.setattr(cr, "OUT_CSV", tmp_path / "all.csv")
+    (tmp_path / "txt").mkdir()
+    blobs = {}
+
+    async def fake_download(dl, url, referer=None):
+        sha1 = blobs[url]
+        p = tmp_path / f"{sha1}.pdf"
+        p.write_bytes(b"%PDF-")
+        return p, sha1
+
+    calls = []
+
+    def fake_extract(local_path, txt_path, timeout_s=None):
+        calls.append(local_path)
+        time.sleep(0.2)
+        Path(txt_path).write_text("Dự thảo\nSố: /TTr-BTC", encoding="utf-8")
+        return 20
+
+    monkeypatch.setattr(cr, "http_download_stream", fake_download)
+    monkeypatch.setattr(cr, "extract_to_file", fake_extract)
+    monkeypatch.setattr(cr, "append_manifest", lambda *a, **k: True)
+    frontier = Frontier(tmp_path / "frontier.sqlite")
+    identity = DocIdentity(tmp_path / "id.sqlite")
+    yield blobs, calls, frontier, identity
+    frontier.close()
+    identity.close()
+
+
+SRC = cr.Source("CP", "https://chinhphu.vn/du-thao-vbqppl", None, None)
+
+
+def test_duplicate_sha1_waits_for_txt_before_marking_extracted(crawl_env, monkeypatch):
+    blobs, calls, frontier, identity = crawl_env
+    blobs.update({"https://a.vn/1.pdf": "a" * 40, "https://b.vn/2.pdf": "a" * 40})
+    marked = []
+    orig = frontier.mark_extracted
+
+    def check_mark(url, txt, n):
+        marked.append((url, Path(txt).exists()))
+        orig(url, txt, n)
+
+    monkeypatch.setattr(frontier, "mark_extracted", check_mark)
+
+    async def run():
+        stage = FakeStage().start()
+        seen = set()
+        try:
+            return await asyncio.gather(*(
+                cr.process_download(SRC, None, stage, frontier, identity, f"https://x.vn/d{i}", u, seen)
+                for i, u in enumerate(blobs)))
+        finally:
+            await stage.close()
+
+    assert asyncio.run(run()) == [True, True]
+    assert len(calls) == 1
+    assert sorted(marked) == [("https://a.vn/1.pdf", True), ("https://b.vn/2.pdf", True)]
+    assert len((cr.OUT_CSV).read_text(encoding="utf-8").splitlines()) == 2   # header + 1 dòng
+
+
+def test_different_files_sharing_detail_url_or_so_hieu_share_doc_id(crawl_env):
+    blobs, calls, frontier, identity = crawl_env
+    blobs.update({"https://chinhphu.vn/f/v1.pdf": "a" * 40, "https://chinhphu.vn/f/v2.pdf": "b" * 40,
+                  "https://mst.gov.vn/f/x.pdf": "c" * 40, "https://quochoi.vn/f/y.pdf": "d" * 40})
+
+    async def run():
+        stage = FakeStage().start()
+        seen = set()
+        try:
+            # cùng trang chi tiết, hai file khác nội dung
+            await cr.process_download(SRC, None, stage, frontier, identity, "https://chinhphu.vn/dt/1",
+                                      "https://chinhphu.vn/f/v1.pdf", seen, "12/2025/NĐ-CP")
+            await cr.process_download(SRC, None, stage, frontier, identity, "https://chinhphu.vn/dt/1",
+                                      "https://chinhphu.vn/f/v2.pdf", seen)
+            # nguồn khác, chỉ chung số hiệu lấy từ metadata trang chi tiết
+            await cr.process_download(SRC, None, stage, frontier, identity, "https://mst.gov.vn/vb/9",
+                                      "https://mst.gov.vn/f/x.pdf", seen, "12/2025/nđ-cp")
+            # không chung gì
+            await cr.process_download(SRC, None, stage, frontier, identity, "https://quochoi.vn/dt/5",
+                                      "https://quochoi.vn/f/y.pdf", seen)
+        finally:
+            await stage.close()
+
+    asyncio.run(run())
+    ids = [identity.lookup(sha1=h) for h in ("a" * 40, "b" * 40, "c" * 40, "d" * 40)]
+    assert ids[0] == ids[1] == ids[2] != ids[3]
+    assert len(calls) == 4                      # mỗi nội dung vẫn được trích riêng
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+from src.utils.dash_query import DashStore, build_db  # noqa: E402
+from src.utils.doc_meta import build_cube  # noqa: E402
+
+
+@pytest.fixture()
+def cube_dir(tmp_path):
+    df = pd.DataFrame({
+        "published_dt": pd.to_datetime(["2025-01-05", "2025-02-10", None, "2025-03-01"]),
+        "agency": ["Chính phủ", "Bộ Tài chính", "Chính phủ", "Chính phủ"],
+        "law_id": ["15CP", None, "15CP", "20BTC"],
+        "text_all": ["Góp ý dự thảo", "Thuế mới", "Không có ngày", "dự thảo thông tư"],
+        "sentiment": ["positive", "negative", "neutral", "neutral"],
+    })
+    df.to_parquet(tmp_path / "rows.parquet", index=False)
+    return tmp_path
+
+
+@pytest.mark.parametrize("with_db", [False, True])
+def test_filters_match_pandas(cube_dir, with_db):
+    if with_db:
+        build_db(str(cube_dir))
+    store = DashStore(str(cube_dir))
+    assert store.distinct("agency") == ["Bộ Tài chính", "Chính phủ"]
+    assert store.date_bounds() == (pd.Timestamp("2025-01-05"), pd.Timestamp("2025-03-01"))
+    assert store.count(agencies=[]) == 0
+    got = store.rows(agencies=["Chính phủ"], d_from="2025-01-01", d_to="2025-12-31")
+    assert got["text_all"].tolist() == ["Góp ý dự thảo", "dự thảo thông tư"]
+    assert store.count(law_ids=["15CP"]) == 2
+    assert store.count(q="dự thảo") == 2
+    store.close()
+
+
+def test_store_is_usable_from_many_threads(cube_dir):
+    build_db(str(cube_dir))
+    store = DashStore(str(cube_dir))
+    with ThreadPoolExecutor(8) as ex:
+        counts = list(ex.map(lambda i: store.count(agencies=["Chính phủ"]) + len(store.rows(limit=2)), range(64)))
+    assert counts == [5] * 64
+    store.close()
+
+
+def _canon(cube):
+    return (cube.astype({"law_id": object, "domain": object}).where(cube.notna(), None)
+                .sort_values(["period", "agency", "law_id", "sentiment"], na_position="first", key=lambda s: s.astype(str))
+                .reset_index(drop=True)[list(cube.columns)])
+
+
+@pytest.mark.parametrize("with_db", [False, True])
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_sql_cube_matches_build_cube(cube_dir, with_db, freq):
+    if with_db:
+        build_db(str(cube_dir))
+    store = DashStore(str(cube_dir))
+    filters = dict(agencies=["Chính phủ", "Bộ Tài chính"], q="")
+    want = build_cube(store.rows(**filters), freq)
+    got = store.cube(freq, **filters)
+    assert list(got.columns) == list(want.columns)
+    pd.testing.assert_frame_equal(_canon(got), _canon(want), check_dtype=False)
+    assert got["count"].sum() == store.count(**filters)
+    store.close()
+
+
+def test_rows_are_paged_and_partial_words_match(cube_dir):
+    build_db(str(cube_dir))
+    store = DashStore(str(cube_dir))
+    whole = store.rows(columns=["text_all"])["text_all"].tolist()
+    pages = [store.rows(columns=["text_all"], limit=3, offset=o)["text_all"].tolist() for o in (0, 3)]
+    assert pages[0] + pages[1] == whole and len(pages[1]) == 1
+    # mặc định tìm chuỗi con như bản pandas, kể cả khi có FTS
+    assert store.count(q="thả") == 2
+    store.close()
@@ -0,0 +1,85 @@
+import threading
+
+from src.pipeline import discussion_miner as dm
+from src.pipeline.searchers import SearchResult
+
+
+class FakeEngine:
+    def __init__(self, name="fake"):
+        self.name = name
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def search(self, query, max_results=8):
+        with self._lock:
+            self.calls.append(query)
+        return [SearchResult(title=f"{query} #{i}", url=f"https://x/{query}/{i}", snippet="",
+                             source=self.name, published=None, extra=None) for i in range(2)]
+
+
+def test_dispatcher_evicts_completed_futures():
+    eng = FakeEngine()
+    d = dm.QueryDispatcher([eng], workers=2)
+    futs = [d.submit(eng, "Nghị định 15", 5) for _ in range(3)]
+    for f in futs:
+        f.result()
+    d.shutdown()
+    assert d._inflight == {}
+    assert d.sent + d.deduped == 3
+
+
+def test_dispatcher_sends_each_query_once_without_cache():
+    eng = FakeEngine()
+    d = dm.QueryDispatcher([eng], workers=2)
+    first = d.submit(eng, "Nghị định 15", 5).result()
+    again = d.submit(eng, "  nghị định   15 ", 5).result()     # sau khi lượt đầu đã xong
+    d.shutdown()
+    assert eng.calls == ["Nghị định 15"]
+    assert again == first and d.sent == 1 and d.deduped == 1
+
+
+def test_dispatcher_retries_failed_queries():
+    class Flaky(FakeEngine):
+        def search(self, query, max_results=8):
+            if not self.calls:
+                self.calls.append(query)
+                raise RuntimeError("rate limit")
+            return super().search(query, max_results)
+
+    eng = Flaky()
+    d = dm.QueryDispatcher([eng], workers=1)
+    try:
+        d.submit(eng, "q", 5).result()
+    except RuntimeError:
+        pass
+    assert len(d.submit(eng, "q", 5).result()) == 2
+    d.shutdown()
+    assert eng.calls == ["q", "q"]
+
+
+def test_mine_many_skips_failing_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(dm, "build_queries", lambda text, path, max_q=8: [f"q {len(text)}"])
+    good = []
+    for i in range(5):
+        p = tmp_path / f"doc{i}.txt"
+        p.write_text("x" * (i + 1), encoding="utf-8")
+        good.append(str(p))
+    files = good[:2] + [str(tmp_path / "missing.txt")] + good[2:]
+    eng = FakeEngine()
+    got = list(dm.mine_many(files, workers=2, engines=[eng]))
+    assert sorted(d.doc_id for d in got) == [f"doc{i}" for i in range(5)]
+    assert all(len(d.results) == 2 for d in got)
+
+
+def test_single_worker_is_sequential(tmp_path, monkeypatch):
+    monkeypatch.setattr(dm, "build_queries", lambda text, path, max_q=8: ["q1", "q2"])
+    monkeypatch.setattr(dm, "QueryDispatcher", None)    # workers=1 không dựng thread pool
+    files = []
+    for i in range(3):
+        p = tmp_path / f"doc{i}.txt"
+        p.write_text("x", encoding="utf-8")
+        files.append(str(p))
+    eng = FakeEngine()
+    got = list(dm.mine_many(files + [str(tmp_path / "missing.txt")], workers=1, engines=[eng]))
+    assert [d.doc_id for d in got] == ["doc0", "doc1", "doc2"]
+    assert eng.calls == ["q1", "q2"] * 3
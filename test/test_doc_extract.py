@@ -0,0 +1,46 @@
+import multiprocessing
+import signal
+import time
+
+import pytest
+
+from src.utils import doc_extract as de
+
+
+def _no_doc_tools(monkeypatch):
+    monkeypatch.setattr(de, "native_doc_tool", lambda: False)
+    monkeypatch.setattr(de, "soffice_bin", lambda: None)
+
+
+def test_doc_without_tool_is_not_recorded(tmp_path, monkeypatch):
+    _no_doc_tools(monkeypatch)
+    assert de.append_manifest(tmp_path, "a" * 40, str(tmp_path / ("a" * 40 + ".doc")), 0, 0.1) is False
+    assert de.load_manifest(tmp_path) == {}
+
+
+def test_doc_with_tool_is_recorded_even_when_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(de, "native_doc_tool", lambda: True)
+    assert de.append_manifest(tmp_path, "b" * 40, "x/" + "b" * 40 + ".doc", 0, 0.1)
+    rec = de.load_manifest(tmp_path)["b" * 40]
+    assert rec["extractor_version"] == de.EXTRACTOR_VERSION and rec["text_len"] == 0
+
+
+def test_non_empty_and_pdf_results_are_recorded(tmp_path, monkeypatch):
+    _no_doc_tools(monkeypatch)
+    de.append_manifest(tmp_path, "c" * 40, "c.doc", 12, 0.1)
+    de.append_manifest(tmp_path, "d" * 40, "d.pdf", 0, 0.1)
+    assert set(de.load_manifest(tmp_path)) == {"c" * 40, "d" * 40}
+
+
+def test_pool_map_timeout_kills_workers():
+    old = signal.signal(signal.SIGALRM, de._on_alarm)
+    signal.alarm(1)
+    t0 = time.monotonic()
+    try:
+        with pytest.raises(de.ExtractTimeout):
+            de._pool_map(time.sleep, [(30,), (30,), (30,)], 2)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, old)
+    assert time.monotonic() - t0 < 10
+    assert not [p for p in multiprocessing.active_children() if p.is_alive()]
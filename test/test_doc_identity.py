@@ -0,0 +1,87 @@
+import sqlite3
+
+from src.utils.doc_identity import DocIdentity, norm_so_hieu, sha1_of_path, so_hieu_from_meta, so_hieu_from_text
+
+A, B, C = "a" * 40, "b" * 40, "c" * 40
+
+
+def test_so_hieu_from_head_only():
+    text = "CHÍNH PHỦ\nSố: 260/2025/NĐ–CP\n...căn cứ Nghị định số 15/2020/NĐ-CP..."
+    assert so_hieu_from_text(text) == "260/2025/NĐ-CP"
+    assert so_hieu_from_text("Số 12/2024/QĐ-TTg ngày") == "12/2024/QĐ-TTG"
+    assert so_hieu_from_text("x" * 3000 + "Số: 1/2025/NĐ-CP") is None
+    assert norm_so_hieu(" 260 / 2025 / nđ - cp ") == "260/2025/NĐ-CP"
+
+
+def test_sha1_of_path():
+    assert sha1_of_path(f"/x/{A.upper()}.txt") == A
+    assert sha1_of_path("/x/nghi-dinh.txt") is None
+
+
+def test_union_keeps_oldest_root(tmp_path):
+    ident = DocIdentity(tmp_path / "id.sqlite")
+    first = ident.link(sha1=A, so_hieu="260/2025/NĐ-CP")
+    second = ident.link(sha1=B, urls=["https://www.example.gov.vn/doc?utm_source=x"])
+    assert first == f"sha1:{A}" and second == f"sha1:{B}"
+    merged = ident.link(so_hieu="260/2025/nđ-cp", urls=["https://example.gov.vn/doc/"])
+    assert merged == first
+    assert ident.lookup(sha1=B) == first
+    assert ident.lookup(sha1=C) is None
+
+
+def test_done_moves_to_new_root_on_union(tmp_path):
+    ident = DocIdentity(tmp_path / "id.sqlite")
+    a = ident.link(sha1=A)
+    b = ident.link(sha1=B)
+    ident.mark_done(b, "mine", "ref-b")
+    ident.link(sha1=A, so_hieu="1/2025/NĐ-CP")
+    ident.link(sha1=B, so_hieu="1/2025/NĐ-CP")
+    assert ident.lookup(sha1=B) == a
+    assert ident.done(a, "mine") == "ref-b"
+
+
+def test_versions_sharing_a_number_are_not_deduped_for_extraction(tmp_path):
+    ident = DocIdentity(tmp_path / "id.sqlite")
+    v1, v2 = tmp_path / f"{A}.txt", tmp_path / f"{B}.txt"
+    v1.write_text("Số: 5/2025/TT-BTC\nDự thảo 1", encoding="utf-8")
+    v2.write_text("Số: 5/2025/TT-BTC\nDự thảo 2", encoding="utf-8")
+
+    d1 = ident.link_text_file(str(v1))
+    ident.mark_done(d1, "extract", str(v1), sha1=A)
+    d2 = ident.link_text_file(str(v2))
+    assert d2 == d1                                   # cùng nhóm văn bản ...
+    assert ident.done(d2, "extract", sha1=B) is None  # ... nhưng bản mới vẫn phải trích
+    ident.mark_done(d2, "extract", str(v2), sha1=B)
+    assert ident.done(d1, "extract", sha1=A) == str(v1)
+    assert ident.done(d1, "extract", sha1=B) == str(v2)
+
+
+def test_changed_content_at_same_url_is_not_prior(tmp_path):
+    # crawler: tra theo sha1 trước khi trích, không gộp theo URL
+    ident = DocIdentity(tmp_path / "id.sqlite")
+    old = ident.link(sha1=A)
+    ident.mark_done(old, "extract", "old.txt", sha1=A)
+    new = ident.link(sha1=B)
+    assert ident.done(new, "extract", sha1=B) is None
+
+
+def test_migrates_old_done_table(tmp_path):
+    db = tmp_path / "id.sqlite"
+    con = sqlite3.connect(db)
+    con.executescript(
+        "CREATE TABLE doc_done (doc_id TEXT NOT NULL, stage TEXT NOT NULL, ref TEXT, at REAL NOT NULL,"
+        " PRIMARY KEY (doc_id, stage));"
+    )
+    con.execute("INSERT INTO doc_done VALUES (?,?,?,?)", (f"sha1:{A}", "extract", f"/t/{A}.txt", 1.0))
+    con.commit()
+    con.close()
+    ident = DocIdentity(db)
+    assert ident.done(f"sha1:{A}", "extract", sha1=A) == f"/t/{A}.txt"
+
+
+def test_so_hieu_from_meta():
+    assert so_hieu_from_meta("Dự thảo Thông tư", "Số hiệu: 5/2025/TT-BTC Ngày ban hành") == "5/2025/TT-BTC"
+    assert so_hieu_from_meta("Nghị định 260/2025/NĐ-CP quy định chi tiết", "") == "260/2025/NĐ-CP"
+    # số của văn bản được sửa đổi, không phải của chính dự thảo
+    assert so_hieu_from_meta("Dự thảo Nghị định sửa đổi Nghị định 15/2020/NĐ-CP", "") is None
+    assert so_hieu_from_meta("Tờ trình", "Số ký hiệu: /TTr-BTC") is None
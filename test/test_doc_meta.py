@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.doc_meta import (
+    CUBE_DIMS, agency_law_table, build_cube, enrich_agency_law, extract_law_id, guess_agency_from_path,
+    period_bounds,
+)
+
+
+@pytest.fixture()
+def rows():
+    # Chủ nhật / thứ Hai giáp tuần, cuối tháng, cuối năm, thiếu ngày, thiếu law_id/domain
+    dates = ["2025-01-05", "2025-01-06", "2025-01-31 23:30", "2025-02-01", "2024-12-31", None,
+             "2025-01-05 08:00", "2025-03-02", "2025-03-02"]
+    return pd.DataFrame({
+        "published_dt": pd.to_datetime(dates, format="ISO8601"),
+        "agency": ["Chính phủ", "Bộ Tài chính", "Chính phủ", "Chính phủ", "Bộ Tài chính", "Chính phủ",
+                   "Chính phủ", "Bộ Tài chính", "Bộ Tài chính"],
+        "law_id": ["15CP", None, "15CP", "20BTC", None, "15CP", "15CP", None, None],
+        "domain": ["a.vn", "b.vn", None, "a.vn", "a.vn", "b.vn", "a.vn", "b.vn", "b.vn"],
+        "sentiment": ["positive", "negative", "neutral", "neutral", "positive", "negative",
+                      "positive", "neutral", "neutral"],
+    })
+
+
+@pytest.mark.parametrize("freq, grouper", [("W", "W"), ("M", "ME")])
+def test_cube_totals_match_groupby_on_rows(rows, freq, grouper):
+    cube = build_cube(rows, freq)
+    assert list(cube.columns) == CUBE_DIMS + ["count"]
+    assert cube["count"].sum() == len(rows)
+    # theo kỳ: nhãn kỳ của cube trùng nhãn pd.Grouper trên bảng dòng
+    want = rows.groupby(pd.Grouper(key="published_dt", freq=grouper)).size()
+    got = cube.groupby("period")["count"].sum()
+    pd.testing.assert_series_equal(got, want[want > 0], check_names=False, check_freq=False)
+    # theo chiều phân loại (kể cả ô thiếu giá trị)
+    for dims in (["agency", "sentiment"], ["law_id"], ["domain", "sentiment"]):
+        want = rows.groupby(dims, dropna=False).size()
+        got = cube.groupby(dims, dropna=False)["count"].sum()
+        pd.testing.assert_series_equal(got.sort_index(), want.sort_index(), check_names=False)
+
+
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_period_bounds_contain_each_row(rows, freq):
+    end, start = period_bounds(rows["published_dt"], freq)
+    dt = rows["published_dt"]
+    ok = dt.notna()
+    assert (start[ok] <= dt[ok]).all() and (dt[ok].dt.normalize() <= end[ok]).all()
+    assert end[~ok].isna().all()
+    if freq == "W":
+        assert (end[ok].dt.dayofweek == 6).all() and (start[ok].dt.dayofweek == 0).all()
+    else:
+        assert (end[ok] == start[ok] + pd.offsets.MonthEnd(0)).all()
+
+
+def _paths():
+    fixed = [
+        "data/raw/QD-15-TTg.pdf", "vanban/Nghi-dinh-15_2024_ND-CP.docx", "x/thong-tu-20-btc.doc",
+        "MOJ/du-thao.pdf", "bo/BGD&DT/tt-12.pdf", "a/b_bct.txt", "c/moit-99.pdf", "Giao Thông vận tải/qd.pdf",
+        "CP", "12/cp", "no-agency-here.pdf", "", "abc_bkhcn.pdf", "2024-BNN-x", "x-gtvt_15.doc",
+        "123BTC và 45/CP", "vbpl/15ttg.pdf", "Bộ Tư pháp/15-btp.pdf", "x/15CP", "x/15CP",
+    ]
+    frags = ["qd", "15", "2024", "ttg", "cp", "btc", "bkhcn", "bgd&dt", "moj", "btp", "bct", "moit",
+             "bnn", "gtvt", "giao thông", "ND", "-", "_", "/", ".", " ", "BQP", "boxntt", "bkh&dt"]
+    rng = np.random.default_rng(0)
+    rand = ["".join(rng.choice(frags, size=rng.integers(1, 7))) for _ in range(400)]
+    return pd.Series(fixed + rand + [None, np.nan])
+
+
+def test_agency_law_table_matches_per_path_functions():
+    paths = _paths()
+    tbl = agency_law_table(paths)
+    for p in paths.dropna():
+        assert tbl.loc[p, "agency"] == guess_agency_from_path(p), p
+        want = extract_law_id(p)
+        got = tbl.loc[p, "law_id"]
+        assert (got == want) if want is not None else pd.isna(got), p
+
+
+def test_enrich_agency_law_matches_row_wise_apply():
+    df = pd.DataFrame({"doc_path": _paths()})
+    enrich_agency_law(df)
+    assert df["agency"].tolist() == df["doc_path"].apply(guess_agency_from_path).tolist()
+    want = df["doc_path"].apply(extract_law_id)
+    assert df["law_id"].where(df["law_id"].notna(), None).tolist() == want.where(want.notna(), None).tolist()
@@ -0,0 +1,54 @@
+from src.utils.frontier import Frontier, ListCursor
+
+
+def test_cursor_resumes_where_it_stopped(tmp_path):
+    f = Frontier(tmp_path / "frontier.sqlite")
+    cur = ListCursor(f, "CP", "https://chinhphu.vn/du-thao-vbqppl")
+    assert cur.start("pages", 1) == 1 and not cur.is_done("pages")
+    cur.advance("pages", 1, ["d1", "d2"])
+    cur.advance("pages", 2, ["d3"])
+    f.close()
+
+    f = Frontier(tmp_path / "frontier.sqlite")
+    cur = ListCursor(f, "CP", "https://chinhphu.vn/du-thao-vbqppl")
+    assert cur.start("pages", 1) == 3
+    assert cur.known() == ["d1", "d2", "d3"]
+    cur.finish("pages", 3)
+    assert cur.is_done("pages")
+
+
+def test_detail_and_attachment_status(tmp_path):
+    f = Frontier(tmp_path / "frontier.sqlite")
+    f.add_details("QH", "list", ["d1", "d2", "d1"])
+    f.mark_detail("d1", "done")
+    f.mark_detail("d2", "failed")
+    assert f.details("QH") == ["d1", "d2"]
+    assert f.details("QH", status="done") == ["d1"]
+    assert f.detail_status("d2") == "failed"
+
+    f.add_attachment("u1", "d1", "QH")
+    f.mark_fetched("u1", "a" * 40, "/raw/a.pdf")
+    f.mark_extracted("u1", "/txt/a.txt", 120)
+    f.add_attachment("u2", "d2", "QH")
+    f.mark_attachment_failed("u2", "download failed")
+    assert f.attachment("u1")["status"] == "extracted"
+    assert f.attachment("u2")["error"] == "download failed"
+    assert f.extracted_sha1s() == {"a" * 40}
+
+
+def test_complete_source_clears_checkpoint_but_keeps_crawled(tmp_path):
+    f = Frontier(tmp_path / "frontier.sqlite")
+    ListCursor(f, "MST", "l").advance("pages", 1, ["d1"])
+    f.add_details("CP", "l", ["c1"])
+    f.remember_crawled("d1", "MST")
+    f.complete_source("MST")
+    assert f.details("MST") == [] and f.get_cursor("MST", "pages") is None
+    assert f.details("CP") == ["c1"]
+    assert f.crawled_details() == {"d1"}
+
+
+def test_robots_cache_expires(tmp_path):
+    f = Frontier(tmp_path / "frontier.sqlite")
+    f.put_robots("https://x", "User-agent: *")
+    assert f.get_robots("https://x", max_age_s=60) == "User-agent: *"
+    assert f.get_robots("https://x", max_age_s=-1) is None
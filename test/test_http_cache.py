@@ -0,0 +1,25 @@
+from src.utils.http_cache import HttpCache
+
+
+def test_conditional_headers_roundtrip(tmp_path):
+    blob = tmp_path / "abc.pdf"
+    blob.write_bytes(b"%PDF")
+    c = HttpCache(tmp_path / "http_cache.sqlite")
+    url = "https://example.vn/a.pdf"
+    assert c.conditional_headers(url) == {}
+    c.put(url, '"v1"', "Mon, 01 Sep 2025 00:00:00 GMT", 4, "abc", str(blob))
+    assert c.conditional_headers(url) == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Sep 2025 00:00:00 GMT"}
+    before = c.get(url)["validated_at"]
+    c.touch(url)
+    row = c.get(url)
+    assert row["sha1"] == "abc" and row["validated_at"] >= before
+    c.close()
+
+
+def test_missing_file_is_not_a_cache_hit(tmp_path):
+    c = HttpCache(tmp_path / "http_cache.sqlite")
+    c.put("https://example.vn/b.pdf", None, "Tue, 02 Sep 2025 00:00:00 GMT", None, "def",
+          str(tmp_path / "gone.pdf"))
+    assert c.get("https://example.vn/b.pdf") is None
+    assert c.conditional_headers("https://example.vn/b.pdf") == {}
@@ -0,0 +1,58 @@
+import types
+
+import pytest
+
+from src.pipeline import keyword_engine as ke
+
+
+class FakeExtractor:
+    def __init__(self, lan="vi", n=1, top=15):
+        self.top = top
+
+    def extract_keywords(self, text):
+        if "LỖI" in text:
+            raise ValueError("yake failed")
+        words = sorted(set(text.lower().split()))
+        return [(w, 1.0 / len(w)) for w in words][: self.top]
+
+
+@pytest.fixture()
+def fake_yake(monkeypatch, tmp_path):
+    monkeypatch.setattr(ke, "yake", types.SimpleNamespace(KeywordExtractor=FakeExtractor))
+    ke.get_extractor.cache_clear()
+    yield ke.KeywordCache(tmp_path / "kw.sqlite")
+    ke.get_extractor.cache_clear()
+
+
+def test_chunks_split_on_sentence_boundary():
+    text = "a" * 60 + ". " + "b" * 60 + ". " + "c" * 60
+    chunks = ke._chunks(text, max_chars=100, max_chunks=8)
+    assert "".join(chunks) == text
+    assert all(len(c) <= 100 for c in chunks)
+    assert chunks[0].endswith(".")
+    assert len(ke._chunks(text, max_chars=50, max_chunks=2)) == 2
+
+
+def test_batch_dedupes_and_caches(fake_yake, monkeypatch):
+    calls = []
+    real = ke.extract_uncached
+    monkeypatch.setattr(ke, "extract_uncached", lambda t, *a: calls.append(t) or real(t, *a))
+    out = ke.extract_keywords_batch(["thuế mới", "thuế mới", "dự thảo"], cache=fake_yake)
+    assert out[0] == out[1] and out[0][0][0] == "thuế"
+    assert calls == ["thuế mới", "dự thảo"]
+    ke.extract_keywords_batch(["thuế mới"], cache=fake_yake)
+    assert len(calls) == 2
+
+
+def test_failures_are_not_cached(fake_yake):
+    assert ke.extract_keywords_batch(["văn bản LỖI"], cache=fake_yake) == [[]]
+    key = ke.cache_key("văn bản LỖI", "vi", 1, 15, ke.MAX_CHARS, ke.MAX_CHUNKS)
+    assert fake_yake.get_many([key]) == {}
+
+
+def test_default_runs_in_process(fake_yake, monkeypatch):
+    def no_pool(*a, **kw):
+        raise AssertionError("process pool started")
+    monkeypatch.setattr(ke, "ProcessPoolExecutor", no_pool)
+    texts = [f"văn bản số {i}" for i in range(ke.POOL_MIN_BATCH * 2)]
+    assert len(ke.extract_keywords_batch(texts, cache=fake_yake)) == len(texts)
@@ -0,0 +1,45 @@
+import itertools
+import random
+
+import pytest
+
+from src.utils import kw_index
+from src.utils.kw_index import KeywordIndex
+
+WORDS = ["thuế", "đất đai", "nghị định", "doanh nghiệp", "phí", "bảo hiểm", "xe"]
+KEYWORDS = ["thuế", "đất đai", "doanh nghiệp", "phí", "bảo hiểm xã hội", "", "thuế"]
+
+
+def _corpus(n=200, seed=1):
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))) for _ in range(n)]
+    labels = [rng.choice(["positive", "neutral", "negative"]) for _ in range(n)]
+    return texts, labels
+
+
+@pytest.mark.parametrize("has_ac", [False, True])
+def test_matches_brute_force(monkeypatch, has_ac):
+    if has_ac and not kw_index.HAS_AC:
+        pytest.skip("pyahocorasick chưa cài")
+    monkeypatch.setattr(kw_index, "HAS_AC", has_ac)
+    texts, labels = _corpus()
+    idx = KeywordIndex(texts, KEYWORDS, labels)
+    assert idx.keywords == ["thuế", "đất đai", "doanh nghiệp", "phí", "bảo hiểm xã hội"]
+    for k in idx.keywords:
+        rows = [i for i, t in enumerate(texts) if k in t]
+        assert idx.freq(k) == len(rows)
+        want = {l: sum(1 for i in rows if labels[i] == l) for l in set(labels)}
+        assert idx.label_counts(k) == want
+    want_pairs = []
+    for a, b in itertools.combinations(sorted(set(idx.keywords)), 2):
+        c = sum(1 for t in texts if a in t and b in t)
+        if c >= 2:
+            want_pairs.append((a, b, c))
+    assert idx.cooccurrence(idx.keywords, min_count=2) == want_pairs
+
+
+def test_unknown_keyword_and_empty_corpus():
+    idx = KeywordIndex([], ["thuế"])
+    assert idx.freq("thuế") == 0 and idx.freq("khác") == 0
+    assert idx.label_counts("thuế") == {}
+    assert idx.cooccurrence(["thuế", "khác"]) == []
@@ -0,0 +1,63 @@
+import functools
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.scripts import merge_jsonl_discussions as mj
+
+SITES = {
+    "a_site": [
+        {"id": 1, "title": "Góp ý", "meta": {"author": "x", "stats": {"likes": 3}}, "tags": ["a", "b"]},
+        {"id": 2, "title": "Thuế", "meta": {"author": "y"}, "score": 0.5},
+        "not json",
+        {"id": 3, "meta": {"stats": {"likes": 7, "shares": 1}}, "score": 2, "flag": True},
+    ],
+    "b_site": [
+        {"id": 4, "title": "Dự thảo", "empty": {}, "extra": "chỉ có ở site b"},
+        {"id": 5, "score": None, "meta": {"author": "z", "stats": {"likes": 0}}, "flag": False},
+    ],
+}
+
+
+def _write_fixture(in_dir):
+    in_dir.mkdir()
+    rows = []
+    for site, recs in SITES.items():
+        lines = []
+        for r in recs:
+            lines.append(r if isinstance(r, str) else json.dumps(r, ensure_ascii=False))
+            if not isinstance(r, str):
+                rows.append(r)
+        (in_dir / f"{site}.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return rows
+
+
+def _old_merge(rows):
+    """Bản cũ: nạp hết rồi pd.json_normalize; list ghi dạng JSON như bản stream."""
+    df = pd.json_normalize(rows)
+    return df.apply(lambda s: s.map(lambda v: json.dumps(v, separators=(",", ":")) if isinstance(v, list) else v))
+
+
+def _nulls_as_none(df):
+    return df.astype(object).where(df.notna(), None)
+
+
+def test_streaming_merge_matches_json_normalize(tmp_path, monkeypatch):
+    rows = _write_fixture(tmp_path / "jsonl")
+    out_csv, out_pq = tmp_path / "out" / "flat.csv", tmp_path / "out" / "flat.parquet"
+    monkeypatch.setattr(mj, "IN_DIR", str(tmp_path / "jsonl"))
+    monkeypatch.setattr(mj, "OUT_FLAT_CSV", str(out_csv))
+    monkeypatch.setattr(mj, "OUT_PARQUET", str(out_pq))
+    # lô 2 dòng → nhiều row group, lô cuối thiếu
+    monkeypatch.setattr(mj, "iter_batches", functools.partial(mj.iter_batches, batch_rows=2))
+    mj.main()
+
+    want = _old_merge(rows)
+    got = pq.read_table(out_pq).to_pandas()
+    assert pq.ParquetFile(out_pq).num_row_groups == 3
+    assert list(got.columns) == list(want.columns)
+    pd.testing.assert_frame_equal(_nulls_as_none(got), _nulls_as_none(want), check_dtype=False)
+    # CSV: cùng giá trị sau khi đọc lại (số nguyên thiếu giá trị → float ở cả hai bản)
+    pd.testing.assert_frame_equal(pd.read_csv(out_csv), pd.read_csv(pd.io.common.StringIO(want.to_csv(index=False))),
+                                  check_dtype=False)
@@ -0,0 +1,120 @@
+import socket
+
+from src.utils import office_convert as oc
+
+
+class FakeUnoserver:
+    """Giả unoserver: mở socket lắng nghe trên --port như server thật."""
+
+    spawned = []
+
+    def __init__(self, args, **kw):
+        port = int(args[args.index("--port") + 1])
+        FakeUnoserver.spawned.append((port, int(args[args.index("--uno-port") + 1])))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.sock.bind(("127.0.0.1", port))
+            self.sock.listen()
+            self.rc = None
+        except OSError:                    # port đã bị chiếm → server thật thoát ngay
+            self.sock.close()
+            self.rc = 1
+
+    def poll(self):
+        return self.rc
+
+    def terminate(self):
+        self.sock.close()
+
+    def wait(self, timeout=None):
+        return 0
+
+    def kill(self):
+        self.sock.close()
+
+
+def test_concurrent_pools_get_distinct_free_ports(monkeypatch):
+    monkeypatch.setattr(oc.subprocess, "Popen", FakeUnoserver)
+    a = oc.OfficeServerPool(2, base_port=None).start()
+    b = oc.OfficeServerPool(2, base_port=None).start()
+    try:
+        assert len(a.ports) == 2 and len(b.ports) == 2
+        assert not set(a.ports) & set(b.ports)
+        assert oc.server_ports() == b.ports
+    finally:
+        b.stop()
+        a.stop()
+    assert oc.server_ports() == []
+
+
+def test_listener_and_uno_ports_differ(monkeypatch):
+    monkeypatch.setattr(oc.subprocess, "Popen", FakeUnoserver)
+    FakeUnoserver.spawned = []
+    pool = oc.OfficeServerPool(3, base_port=None).start()
+    try:
+        used = [p for pair in FakeUnoserver.spawned for p in pair]
+        assert len(used) == 6 and len(set(used)) == 6
+    finally:
+        pool.stop()
+
+
+class StolenSock:
+    def __init__(self, port):
+        self.port = port
+
+    def getsockname(self):
+        return ("127.0.0.1", self.port)
+
+    def close(self):
+        pass
+
+
+def test_server_losing_port_race_is_respawned(monkeypatch):
+    monkeypatch.setattr(oc.subprocess, "Popen", FakeUnoserver)
+    FakeUnoserver.spawned = []
+    thief = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    thief.bind(("127.0.0.1", 0))
+    thief.listen()
+    stolen = thief.getsockname()[1]
+    real = oc._reserve_ports
+    calls = []
+
+    def racy_reserve(n):
+        socks = real(n)
+        if not calls:                      # lần đầu: process khác giành port listener ngay sau khi nhả
+            socks[0].close()
+            socks[0] = StolenSock(stolen)
+        calls.append(n)
+        return socks
+
+    monkeypatch.setattr(oc, "_reserve_ports", racy_reserve)
+    pool = oc.OfficeServerPool(1, base_port=None).start()
+    try:
+        assert len(calls) == 2
+        assert len(pool.ports) == 1 and pool.ports[0] != stolen
+    finally:
+        pool.stop()
+        thief.close()
+
+
+def test_fixed_base_skips_ports_in_use(monkeypatch):
+    monkeypatch.setattr(oc.subprocess, "Popen", FakeUnoserver)
+    busy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    busy.bind(("127.0.0.1", 0))
+    busy.listen()
+    base = busy.getsockname()[1]
+    pool = oc.OfficeServerPool(1, base_port=base)
+    monkeypatch.setattr(oc, "START_TIMEOUT_S", 0)
+    try:
+        pool.start()
+        assert pool.ports == []
+    finally:
+        pool.stop()
+        busy.close()
+
+
+def test_native_doc_tool(monkeypatch):
+    monkeypatch.setattr(oc.shutil, "which", lambda name: "/usr/bin/catdoc" if name == "catdoc" else None)
+    assert oc.native_doc_tool()
+    monkeypatch.setattr(oc.shutil, "which", lambda name: None)
+    assert not oc.native_doc_tool()
@@ -0,0 +1,39 @@
+import random
+
+from src.pipeline.patterns import LEGAL_ID_PATTERNS, find_legal_ids, scan_legal_ids
+
+TEXT = (
+    "Căn cứ Nghị định 260/2025/NĐ-CP và Thông tư 19/2014/TT-BKHCN; Quyết định 187/QĐ-TTg, "
+    "quyết định 12/QĐUBND, Nghị quyết 05/NQ-CP, VBHN 03/VPQH, Thông báo 88/TB-VPCP. "
+    "Lại viện dẫn nghị  định 15/2020/NĐ-CP. Không khớp: Nghị định 260/25/NĐ-CP, Thông tư 1/TT-BTC."
+)
+
+
+def _reference(text):
+    # cách cũ: mỗi pattern quét riêng, nối kết quả theo thứ tự pattern
+    out = []
+    for pat in LEGAL_ID_PATTERNS:
+        for m in pat.finditer(text):
+            out.append({"type": m.group(1).strip(), "code": m.group(2).strip(),
+                        "span": [m.start(), m.end()]})
+    return out
+
+
+def test_single_pass_matches_per_pattern_scan():
+    assert find_legal_ids(TEXT) == _reference(TEXT)
+    codes = [h["code"] for h in find_legal_ids(TEXT)]
+    assert codes == ["260/2025/NĐ-CP", "15/2020/NĐ-CP", "19/2014/TT-BKHCN", "187/QĐ-TTg",
+                     "12/QĐUBND", "05/NQ-CP", "03/VPQH", "88/TB-VPCP"]
+
+
+def test_shuffled_fragments_match_reference():
+    parts = TEXT.split(" ")
+    rng = random.Random(0)
+    for _ in range(50):
+        rng.shuffle(parts)
+        text = " ".join(parts)
+        assert find_legal_ids(text) == _reference(text)
+
+
+def test_hits_carry_kind():
+    assert [h.kind for h in scan_legal_ids("Thông báo 1/TB-UB, Nghị định 2/2024/NĐ-CP")] == ["ND", "TB"]
@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+from src.scripts import reextract_raw as rr
+
+A, B, C, D = ("a" * 40, "b" * 40, "c" * 40, "d" * 40)
+
+
+def crashing_job(local_path, txt_path, timeout_s=None):
+    # chạy trong process con: file "c..." làm worker chết như segfault
+    if Path(local_path).stem == C:
+        os._exit(1)
+    Path(txt_path).write_text("nội dung", encoding="utf-8")
+    return {"text_len": 8, "seconds": 0.01, "error": None}
+
+
+def test_find_stale_skips_non_sha1_names(tmp_path):
+    raw, txt = tmp_path / "raw", tmp_path / "txt"
+    raw.mkdir()
+    txt.mkdir()
+    for name in (f"{A}.pdf", f"{B}.doc", "nghi-dinh.pdf", f"{A.upper()[:-1]}1.pdf", f"{C}.zip"):
+        (raw / name).write_bytes(b"x")
+    (txt / f"{B}.txt").write_text("x", encoding="utf-8")
+    got = {(p.name, r) for p, _, r in rr.find_stale(raw, txt)}
+    assert got == {(f"{A}.pdf", "missing"), (f"{B}.doc", "stale")}
+
+
+def test_crashed_worker_fails_only_its_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(rr, "extract_job", crashing_job)
+    raw, txt = tmp_path / "raw", tmp_path / "txt"
+    raw.mkdir()
+    txt.mkdir()
+    for h in (A, B, C, D):
+        (raw / f"{h}.pdf").write_bytes(b"%PDF-")
+    todo = rr.find_stale(raw, txt)
+    timings, failed = [], []
+    rr.run_pool(todo, txt, 2, 30, timings, failed)
+    assert failed == [(f"{C}.pdf", "worker crashed")]
+    assert sorted(name for _, name, _ in timings) == [f"{h}.pdf" for h in (A, B, D)]
+    assert set(rr.load_manifest(txt)) == {A, B, D}
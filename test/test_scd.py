@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.utils import scd
+from src.utils.scd import read_history, scd2_upsert_many
+
+
+def _doc(url, h, **kw):
+    return {"source_site": "cp", "url": url, "so_hieu": kw.pop("so_hieu", ""), "content_hash": h, **kw}
+
+
+def test_jsonl_closes_previous_version(tmp_path):
+    out = str(tmp_path / "jsonl")
+    scd2_upsert_many([_doc("u1", "a"), _doc("u2", "x")], out_dir=out)
+    scd2_upsert_many([_doc("u1", "a"), _doc("u1", "b")], out_dir=out)
+    rows = list(read_history(out, "cp"))
+    assert [(r["url"], r["content_hash"], r["is_current"]) for r in rows] == [
+        ("u1", "a", False), ("u2", "x", True), ("u1", "b", True)]
+    assert rows[0]["record_valid_to"]
+
+
+def test_jsonl_index_rebuilt_after_external_write(tmp_path):
+    out = str(tmp_path / "jsonl")
+    scd2_upsert_many([_doc("u1", "a")], out_dir=out)
+    with open(tmp_path / "jsonl" / "cp.jsonl", "ab") as f:
+        f.write(b'{"url": "u2", "so_hieu": "", "content_hash": "y"}\n')
+    scd2_upsert_many([_doc("u2", "y")], out_dir=out)      # index lệch size → dựng lại, không thêm bản trùng
+    assert len(list(read_history(out, "cp"))) == 2
+
+
+def test_jsonl_compaction_keeps_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(scd, "COMPACT_MIN_CLOSED", 1)
+    out = str(tmp_path / "jsonl")
+    scd2_upsert_many([_doc("u1", "a")], out_dir=out)
+    scd2_upsert_many([_doc("u1", "b")], out_dir=out)
+    assert not (tmp_path / "jsonl" / "_scd" / "cp.closed.jsonl").exists()
+    rows = list(read_history(out, "cp"))
+    assert [r["is_current"] for r in rows] == [False, True]
+
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+from src.utils.scd_parquet import ParquetSCD2  # noqa: E402
+
+
+def test_parquet_backend_has_its_own_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scd2_upsert_many([_doc("u1", "a")], backend="parquet")
+    assert (tmp_path / "outputs" / "parquet" / "versions" / "source_site=cp").is_dir()
+    assert not (tmp_path / "outputs" / "jsonl").exists()
+
+
+def test_parquet_keeps_columns_missing_from_first_row(tmp_path):
+    store = ParquetSCD2(str(tmp_path))
+    store.upsert_many([_doc("u1", "a"), _doc("u2", "b", title="T2", ngay="2025-01-02")])
+    df = store.query(columns="url, title, ngay").sort_values("url").set_index("url")
+    assert df.loc["u2", "title"] == "T2" and df.loc["u2", "ngay"] == "2025-01-02"
+    assert df.loc["u1", ["title", "ngay"]].isna().all()
+
+
+def test_parquet_as_of_diff_and_compact(tmp_path):
+    store = ParquetSCD2(str(tmp_path))
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.upsert_many([_doc("u1", "a", record_valid_from=t0), _doc("u2", "x", record_valid_from=t0)])
+    mid = datetime.now(timezone.utc)
+    store.upsert_many([_doc("u1", "b"), _doc("u3", "z")])
+    later = datetime.now(timezone.utc) + timedelta(seconds=1)
+
+    before = store.as_of(mid, site="cp").set_index("url")["content_hash"].to_dict()
+    after = store.as_of(later, site="cp").set_index("url")["content_hash"].to_dict()
+    assert before == {"u1": "a", "u2": "x"}
+    assert after == {"u1": "b", "u2": "x", "u3": "z"}
+
+    changes = store.diff(mid, later, site="cp").set_index("url")["change"].to_dict()
+    assert changes == {"u1": "changed", "u3": "added"}
+
+    store.compact("cp")
+    assert not list((tmp_path / "closures").rglob("*.parquet"))
+    cur = store.history("cp", "is_current").set_index("url")["content_hash"].to_dict()
+    assert cur == after
+
+
+def _two_versions(tmp_path):
+    store = ParquetSCD2(str(tmp_path))
+    store.upsert_many([_doc("u1", "a"), _doc("u2", "x")])
+    store.upsert_many([_doc("u1", "b")])
+    return store
+
+
+def test_parquet_compact_crash_after_commit_rolls_forward(tmp_path, monkeypatch):
+    store = _two_versions(tmp_path)
+    monkeypatch.setattr(ParquetSCD2, "_finish_compact", lambda self, marker: (_ for _ in ()).throw(OSError("crash")))
+    with pytest.raises(OSError):
+        store.compact("cp")
+    monkeypatch.undo()
+    # marker đã commit: lần đọc sau xoá part cũ và đưa part gộp vào, không thấy version trùng
+    df = ParquetSCD2(str(tmp_path)).history("cp")
+    assert sorted(df["content_hash"]) == ["a", "b", "x"]
+    assert len(list((tmp_path / "versions").rglob("*.parquet"))) == 1
+    assert not list(tmp_path.rglob("*.compact")) and not list(tmp_path.rglob("_compact.json"))
+
+
+def test_parquet_leftover_compact_file_without_marker_is_ignored(tmp_path):
+    store = _two_versions(tmp_path)
+    site_dir = tmp_path / "versions" / "source_site=cp"
+    part = next(site_dir.glob("*.parquet"))
+    (site_dir / "part-x.parquet.compact").write_bytes(part.read_bytes())   # crash trước commit
+    (site_dir / "part-y.parquet.tmp").write_bytes(b"partial")                   # _write_part bị ngắt
+    df = store.history("cp")
+    assert sorted(df["content_hash"]) == ["a", "b", "x"]
+    assert not (site_dir / "part-x.parquet.compact").exists()
@@ -0,0 +1,79 @@
+import threading
+
+from src.pipeline import search_cache as sc
+from src.pipeline.search_cache import CachedSearcher, SearchCache
+from src.pipeline.searchers import SearchResult, WebSearcher
+
+
+class FakeEngine(WebSearcher):
+    name = "ddg_news"
+
+    def __init__(self):
+        super().__init__(None)
+        self.calls = []
+
+    def search(self, query, max_results=10):
+        self.calls.append(query)
+        return [SearchResult(title=f"{query} {len(self.calls)}", url=f"https://x/{len(self.calls)}",
+                             snippet="", source=self.name, published="2025-01-01", extra={"k": 1})]
+
+
+def test_hit_miss_and_query_normalisation(tmp_path):
+    cache = SearchCache(tmp_path / "c.sqlite")
+    eng = FakeEngine()
+    s = CachedSearcher(eng, cache)
+    first = s.search("Nghị định 15", max_results=5)
+    assert s.search("  nghị định   15 ", max_results=5) == first
+    assert s.search("Nghị định 15", max_results=8) != first        # max_results là một phần của khóa
+    assert eng.calls == ["Nghị định 15", "Nghị định 15"]
+    assert cache.summary() == {"ddg_news.hit": 1, "ddg_news.miss": 2}
+
+
+def test_ttl_expiry_refetches(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sc.time, "time", lambda: now[0])
+    cache = SearchCache(tmp_path / "c.sqlite", ttl_s={"ddg_news": 60})
+    eng = FakeEngine()
+    s = CachedSearcher(eng, cache)
+    s.search("q")
+    now[0] += 59
+    s.search("q")
+    assert len(eng.calls) == 1
+    now[0] += 2
+    fresh = s.search("q")
+    assert len(eng.calls) == 2 and fresh[0].title == "q 2"
+    assert cache.summary()["ddg_news.stale"] == 1
+
+
+def test_offline_serves_only_cached_results_ignoring_ttl(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(sc.time, "time", lambda: now[0])
+    online = SearchCache(tmp_path / "c.sqlite", ttl_s={"ddg_news": 60})
+    cached = CachedSearcher(FakeEngine(), online).search("q")
+    online.close()
+
+    now[0] += 10 * sc.DAY
+    offline = SearchCache(tmp_path / "c.sqlite", ttl_s={"ddg_news": 60}, offline=True)
+    eng = FakeEngine()
+    s = CachedSearcher(eng, offline)
+    assert s.search("q") == cached
+    assert s.search("chưa có") == []
+    assert eng.calls == []
+    assert offline.summary() == {"ddg_news.hit": 1, "ddg_news.offline_miss": 1}
+
+
+def test_stats_are_exact_under_threads(tmp_path):
+    cache = SearchCache(tmp_path / "c.sqlite")
+    s = CachedSearcher(FakeEngine(), cache)
+    s.search("q")
+
+    def worker():
+        for _ in range(500):
+            s.search("q")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.summary()["ddg_news.hit"] == 4000